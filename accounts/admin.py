@@ -1,4 +1,7 @@
-from django.contrib import admin
+import logging
+
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
@@ -6,10 +9,13 @@ from django.utils.html import format_html
 from django import forms
 
 # Import from the accounts app (current app)
-from accounts.models import UserProfile
+from accounts.dedupe import MergeError, keep_and_remove, merge
+from accounts.models import DuplicateCandidate, UserProfile
 # Import from the shop app
 from shop.models import Marketer
 
+logger = logging.getLogger(__name__)
+
 class CustomUserCreationForm(UserCreationForm):
     """Custom user creation form that includes all UserProfile fields"""
     
@@ -28,10 +34,11 @@ class CustomUserCreationForm(UserCreationForm):
         label='סוג משתמש'
     )
     marketer = forms.ModelChoiceField(
-        queryset=Marketer.objects.all(),
+        queryset=Marketer.objects.filter(is_active=True),
         required=False,
         label='משווק',
-        empty_label='בחר משווק...'
+        # חיפוש בשרת במקום רשימה של כל המשווקים
+        widget=AutocompleteSelect(UserProfile._meta.get_field('marketer'), admin.site)
     )
     is_active_profile = forms.BooleanField(
         initial=True, 
@@ -74,6 +81,7 @@ class UserProfileInline(admin.StackedInline):
     can_delete = False
     verbose_name_plural = 'פרופיל משתמש מלא'
     fk_name = 'user'
+    autocomplete_fields = ['marketer']
     
     fieldsets = (
         ('פרטים אישיים', {
@@ -94,7 +102,8 @@ class SimpleUserAdmin(BaseUserAdmin):
     # Main list view - add phone to display
     list_display = ('username', 'first_name', 'last_name', 'email', 'get_phone', 'is_active', 'is_staff', 'date_joined')
     list_filter = ('is_active', 'is_staff', 'date_joined')
-    search_fields = ('username', 'first_name', 'last_name', 'email', 'userprofile__phone')
+    # חיפוש לפי תחילית - נתמך באינדקסים (accounts/migrations/0003_prefix_search_indexes.py)
+    search_fields = ('^username', '^first_name', '^last_name', '^email', '^userprofile__phone')
     list_editable = ('is_active',)
     ordering = ('-date_joined',)
     
@@ -263,24 +272,21 @@ class SimpleUserAdmin(BaseUserAdmin):
     
     def save_model(self, request, obj, form, change):
         """Override to save UserProfile data when creating new user"""
-        print(f"DEBUG - save_model called, change={change}")
-        print(f"DEBUG - Form type: {type(form)}")
-        
+        logger.debug('save_model change=%s form=%s', change, type(form).__name__)
+
         # First save the User object
         super().save_model(request, obj, form, change)
         
         # If this is a new user creation and we have our custom form
         if not change and isinstance(form, CustomUserCreationForm):
-            print(f"DEBUG - Processing new user with custom form")
-            print(f"DEBUG - Form data: {form.cleaned_data}")
-            
+            # field names only - the values are personal details and passwords
+            logger.debug('creating profile for user %s', obj.pk, extra={'fields': sorted(form.cleaned_data)})
+
             # Get or create UserProfile
             try:
                 profile = obj.userprofile
-                print(f"DEBUG - Found existing profile")
             except UserProfile.DoesNotExist:
                 profile = UserProfile.objects.create(user=obj)
-                print(f"DEBUG - Created new profile")
             
             # Update profile fields from form
             profile.phone = form.cleaned_data.get('phone', '')
@@ -294,10 +300,8 @@ class SimpleUserAdmin(BaseUserAdmin):
             # Also update User.is_active to match profile
             obj.is_active = form.cleaned_data.get('is_active_profile', True)
             obj.save()
-            
-            print(f"DEBUG - Profile saved: phone={profile.phone}, user_type={profile.user_type}")
-        else:
-            print(f"DEBUG - Not processing (change={change}, form type={type(form)})")
+
+            logger.info('profile saved for user %s', obj.pk, extra={'user_type': profile.user_type})
 
     def response_add(self, request, obj, post_url_continue=None):
         """Custom response after adding a user"""
@@ -334,8 +338,10 @@ admin.site.register(User, SimpleUserAdmin)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'full_name', 'user_type', 'phone', 'phone2', 'marketer', 'is_active', 'created_at']
     list_filter = ['user_type', 'is_active', 'marketer', 'created_at']
-    search_fields = ['user__username', 'user__first_name', 'user__last_name', 'phone', 'phone2']
+    search_fields = ['^user__username', '^user__first_name', '^user__last_name', '^phone', '^phone2']
     list_editable = ['user_type', 'is_active']
+    autocomplete_fields = ['user', 'marketer']
+    list_select_related = ['user', 'marketer']
     
     fieldsets = (
         ('משתמש', {
@@ -347,4 +353,39 @@ class UserProfileAdmin(admin.ModelAdmin):
         ('הגדרות מכירה', {
             'fields': ('user_type', 'marketer', 'is_active')
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ['user_a', 'user_b', 'score', 'reasons', 'status', 'created_at']
+    list_filter = ['status', 'reasons']
+    search_fields = ['^user_a__username', '^user_b__username', '^user_a__last_name', '^user_b__last_name']
+    list_select_related = ['user_a', 'user_b']
+    ordering = ['-score']
+    actions = ['merge_pairs', 'dismiss_pairs']
+    
+    # זוגות נוצרים רק ב-find_duplicates
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    @admin.action(description='מיזוג (נשמר המשתמש עם יותר הזמנות)')
+    def merge_pairs(self, request, queryset):
+        merged = 0
+        for candidate in queryset.filter(status='pending'):
+            keep, remove = keep_and_remove(candidate)
+            try:
+                moved = merge(keep, remove)
+            except MergeError as e:
+                self.message_user(request, f'{candidate}: {e}', messages.ERROR)
+                continue
+            merged += 1
+            self.message_user(request, f'{candidate}: הועברו {moved["orders"]} הזמנות')
+        self.message_user(request, f'מוזגו {merged} זוגות', messages.SUCCESS)
+    
+    @admin.action(description='סימון כלא כפולים')
+    def dismiss_pairs(self, request, queryset):
+        updated = queryset.filter(status='pending').update(status='dismissed')
+        self.message_user(request, f'{updated} זוגות סומנו כלא כפולים', messages.SUCCESS)
@@ -0,0 +1,213 @@
+# accounts/dedupe.py
+"""
+Duplicate donor detection and merging.
+
+find_duplicates() loads every active user once (names, emails and phones
+from the profile and from their orders) and puts each user in blocks by
+key: every phone, the email, the name with its words sorted, and last name
++ first initial. Only users sharing a block are compared, so the work is
+the sum of the squared block sizes instead of n². A name shared by a few
+users is a signal, a common one is not: name blocks over
+MAX_NAME_BLOCK_SIZE and any block over MAX_BLOCK_SIZE are skipped. Pairs
+scoring at least MIN_SCORE are stored as
+DuplicateCandidate rows; pairs already stored (including dismissed ones)
+are left alone.
+
+Orders a marketer entered (marketer set, or owned by a marketer's login)
+are left out: their contact details are the donor's, not the owner's, and
+would tie the marketer to every donor they served.
+
+merge() moves everything of one user to the other in bulk UPDATEs in one
+transaction and deactivates the duplicate (donation receipts are
+PROTECTed, and a login name should not silently disappear). Users linked
+to a marketer are never merged, nor two users with an annual receipt for
+the same year.
+"""
+import itertools
+import logging
+from difflib import SequenceMatcher
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from shop.lookup import FULL_PHONE_DIGITS
+from shop.models import CartItem, DonationReceipt, Marketer, Order, normalize_email, normalize_name
+
+from .models import DuplicateCandidate, UserProfile
+
+logger = logging.getLogger(__name__)
+
+PHONE_WEIGHT = 0.6
+EMAIL_WEIGHT = 0.6
+NAME_WEIGHT = 0.4
+MIN_SCORE = 0.4
+MAX_BLOCK_SIZE = 50
+MAX_NAME_BLOCK_SIZE = 5
+WRITE_BATCH_SIZE = 2000
+
+
+class MergeError(Exception):
+    pass
+
+
+def load_donors():
+    """{user_id: {'name': str, 'phones': set, 'emails': set}} of the active users"""
+    donors = {}
+    for user_id, first_name, last_name, email in (
+        User.objects.filter(is_active=True).values_list('pk', 'first_name', 'last_name', 'email').iterator(chunk_size=5000)
+    ):
+        donors[user_id] = {
+            'name': normalize_name(first_name, last_name),
+            'phones': set(),
+            'emails': {normalize_email(email)} - {''},
+        }
+    for user_id, phone, phone2 in UserProfile.objects.filter(user_id__in=donors).values_list(
+        'user_id', 'phone_normalized', 'phone2_normalized'
+    ).iterator(chunk_size=5000):
+        donors[user_id]['phones'].update({phone, phone2})
+    marketer_users = Marketer.objects.filter(user__isnull=False).values('user_id')
+    for user_id, phone, email in Order.objects.filter(user__is_active=True, marketer__isnull=True).exclude(
+        user_id__in=marketer_users
+    ).values_list(
+        'user_id', 'phone_normalized', 'email_normalized'
+    ).distinct().order_by().iterator(chunk_size=5000):
+        donors[user_id]['phones'].add(phone)
+        donors[user_id]['emails'].add(email)
+    for donor in donors.values():
+        donor['phones'] = {phone for phone in donor['phones'] if len(phone) >= FULL_PHONE_DIGITS}
+        donor['emails'].discard('')
+    return donors
+
+
+def blocking_keys(donor):
+    keys = {f'phone:{phone}' for phone in donor['phones']}
+    keys.update(f'email:{email}' for email in donor['emails'])
+    words = donor['name'].split()
+    if words:
+        keys.add('name:' + ' '.join(sorted(words)))
+    if len(words) >= 2:
+        keys.add(f'initial:{words[-1]} {words[0][0]}')
+    return keys
+
+
+def name_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split()))).ratio()
+
+
+def score(a, b):
+    """(score, reasons) of two donors"""
+    value, reasons = 0.0, []
+    if a['phones'] & b['phones']:
+        value += PHONE_WEIGHT
+        reasons.append('phone')
+    if a['emails'] & b['emails']:
+        value += EMAIL_WEIGHT
+        reasons.append('email')
+    similarity = name_similarity(a['name'], b['name'])
+    if similarity >= 0.8:
+        value += NAME_WEIGHT * similarity
+        reasons.append('name')
+    return min(value, 1.0), reasons
+
+
+def candidate_pairs(donors):
+    """Set of (user_id, user_id), smaller id first, of the users sharing a block"""
+    blocks = {}
+    for user_id, donor in donors.items():
+        for key in blocking_keys(donor):
+            blocks.setdefault(key, []).append(user_id)
+    pairs, skipped = set(), 0
+    for key, members in blocks.items():
+        limit = MAX_BLOCK_SIZE if key.startswith(('phone:', 'email:')) else MAX_NAME_BLOCK_SIZE
+        if len(members) > limit:
+            skipped += 1
+            continue
+        pairs.update(itertools.combinations(sorted(members), 2))
+    if skipped:
+        logger.info('dedupe: skipped %d oversized blocks', skipped)
+    return pairs
+
+
+def find_duplicates(min_score=MIN_SCORE):
+    """Store new DuplicateCandidate rows; returns (pairs compared, candidates found)"""
+    donors = load_donors()
+    pairs = candidate_pairs(donors)
+    candidates = []
+    for a, b in pairs:
+        value, reasons = score(donors[a], donors[b])
+        if value >= min_score:
+            candidates.append(DuplicateCandidate(user_a_id=a, user_b_id=b, score=round(value, 3), reasons=','.join(reasons)))
+    DuplicateCandidate.objects.bulk_create(candidates, batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True)
+    return len(pairs), len(candidates)
+
+
+def merge(keep_id, remove_id):
+    """
+    Move the orders, cart and receipts of remove_id to keep_id and
+    deactivate remove_id. Returns {what: rows moved}.
+
+    Raises MergeError when either user is linked to a marketer (their POS
+    sales carry the donors' details), or both have an annual receipt for
+    the same year.
+    """
+    if keep_id == remove_id:
+        raise MergeError('cannot merge a user into itself')
+    with transaction.atomic():
+        users = User.objects.select_for_update().in_bulk([keep_id, remove_id])
+        if len(users) != 2:
+            raise MergeError('user not found')
+        if Marketer.objects.filter(user_id__in=[keep_id, remove_id]).exists():
+            raise MergeError('a user linked to a marketer cannot be merged')
+        years = list(
+            DonationReceipt.objects.filter(kind='annual', user_id__in=[keep_id, remove_id])
+            .values('year').annotate(n=Count('pk')).filter(n__gt=1).order_by('year').values_list('year', flat=True)
+        )
+        if years:
+            raise MergeError(f'both users have an annual receipt for {", ".join(map(str, years))}')
+
+        # same product in both carts: add the quantities, then move the rest
+        duplicate_items = CartItem.objects.filter(user_id=remove_id, product_id=OuterRef('product_id'))
+        both = CartItem.objects.filter(user_id=keep_id, product_id__in=duplicate_items.values('product_id'))
+        both.update(quantity=F('quantity') + Subquery(duplicate_items.values('quantity')[:1]))
+        CartItem.objects.filter(
+            user_id=remove_id, product_id__in=CartItem.objects.filter(user_id=keep_id).values('product_id')
+        ).delete()
+
+        moved = {
+            # updated_at too, so the analytics export (shop/export.py) picks the change up
+            'orders': Order.objects.filter(user_id=remove_id).update(user_id=keep_id, updated_at=timezone.now()),
+            'cart_items': CartItem.objects.filter(user_id=remove_id).update(user_id=keep_id),
+            'receipts': DonationReceipt.objects.filter(user_id=remove_id).update(user_id=keep_id),
+        }
+
+        profiles = UserProfile.objects.select_for_update().in_bulk([keep_id, remove_id], field_name='user_id')
+        keep_profile, remove_profile = profiles.get(keep_id), profiles.get(remove_id)
+        if keep_profile and remove_profile:
+            phones = [phone for phone in (keep_profile.phone, keep_profile.phone2, remove_profile.phone, remove_profile.phone2) if phone]
+            phones = list(dict.fromkeys(phones))
+            keep_profile.phone, keep_profile.phone2 = (phones + ['', ''])[:2]
+            keep_profile.address = keep_profile.address or remove_profile.address
+            keep_profile.marketer_id = keep_profile.marketer_id or remove_profile.marketer_id
+            keep_profile.save()
+            remove_profile.is_active = False
+            remove_profile.save(update_fields=['is_active', 'updated_at'])
+        User.objects.filter(pk=remove_id).update(is_active=False)
+
+        low, high = sorted([keep_id, remove_id])
+        DuplicateCandidate.objects.filter(user_a_id=low, user_b_id=high).update(status='merged')
+        DuplicateCandidate.objects.filter(Q(user_a_id=remove_id) | Q(user_b_id=remove_id), status='pending').delete()
+    return moved
+
+
+def keep_and_remove(candidate):
+    """(keep, remove) user ids of a pair - keep the one with more orders, then the older one"""
+    a, b = candidate.user_a_id, candidate.user_b_id
+    counts = dict(
+        Order.objects.filter(user_id__in=[a, b]).values('user_id')
+        .annotate(n=Count('pk')).values_list('user_id', 'n')
+    )
+    return (a, b) if counts.get(a, 0) >= counts.get(b, 0) else (b, a)
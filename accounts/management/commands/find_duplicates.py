@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.dedupe import MIN_SCORE, find_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Find likely duplicate donors (shared phone, email or similar name) for review in the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-score', type=float, default=MIN_SCORE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        compared, found = find_duplicates(options['min_score'])
+        self.stdout.write(f'{compared} pairs compared, {found} candidates in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations
+
+from levshomea.schema import create_index_concurrently
+
+# Prefix indexes for the user search / autocomplete ('^field' in
+# search_fields), same expression as shop/migrations/0007_prefix_search_indexes.py.
+# Built concurrently: every login writes auth_user.last_login.
+INDEXES = [
+    ('auth_user_username_prefix_idx', 'auth_user', 'username'),
+    ('auth_user_first_name_prefix_idx', 'auth_user', 'first_name'),
+    ('auth_user_last_name_prefix_idx', 'auth_user', 'last_name'),
+    ('auth_user_email_prefix_idx', 'auth_user', 'email'),
+    ('accounts_userprofile_phone_prefix_idx', 'accounts_userprofile', 'phone'),
+    ('accounts_userprofile_phone2_prefix_idx', 'accounts_userprofile', 'phone2'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        create_index_concurrently(schema_editor, name, table, f'(UPPER("{column}"::text) text_pattern_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_userprofile_phone2'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
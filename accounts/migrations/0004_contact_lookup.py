@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_prefix_search_indexes'),
+    ]
+
+    # the columns only; 0006 fills them in batches and 0007 indexes them concurrently
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone2_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='טלפון נוסף מנורמל'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='טלפון מנורמל'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0004_contact_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='ציון')),
+                ('reasons', models.CharField(max_length=100, verbose_name='התאמות')),
+                ('status', models.CharField(choices=[('pending', 'ממתין'), ('merged', 'מוזג'), ('dismissed', 'לא כפול')], default='pending', max_length=10, verbose_name='סטטוס')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך זיהוי')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='משתמש א')),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='משתמש ב')),
+            ],
+            options={
+                'verbose_name': 'משתמש כפול אפשרי',
+                'verbose_name_plural': 'משתמשים כפולים אפשריים',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['status', '-score'], name='accounts_duplicate_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='duplicatecandidate',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b'), name='accounts_duplicate_pair_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import re
+
+from django.db import migrations
+
+from levshomea.schema import Backfill
+
+
+# a copy of shop.models.normalize_phone as it was when this migration was
+# written - the migration must not change when it does
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    return digits
+
+
+def normalize_phones(profiles):
+    batch = list(profiles.exclude(phone='', phone2='').only('phone', 'phone2'))
+    for profile in batch:
+        profile.phone_normalized = normalize_phone(profile.phone)
+        profile.phone2_normalized = normalize_phone(profile.phone2)
+    profiles.bulk_update(batch, ['phone_normalized', 'phone2_normalized'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0005_duplicate_candidates'),
+    ]
+
+    operations = [
+        Backfill('userprofile', normalize_phones),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+from levshomea.schema import AddIndexConcurrently, create_index_concurrently
+
+# Trigram indexes for substring search (the last digits of a phone) - see
+# shop/lookup.py. Prefix and exact search use the varchar_pattern_ops
+# indexes below.
+TRIGRAM_INDEXES = [
+    ('accounts_userprofile_phone_trgm_idx', 'accounts_userprofile', 'phone_normalized'),
+    ('accounts_userprofile_phone2_trgm_idx', 'accounts_userprofile', 'phone2_normalized'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        create_index_concurrently(schema_editor, name, table, f'USING gin ("{column}" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0006_contact_lookup_backfill'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='userprofile',
+            index=models.Index(fields=['phone_normalized'], name='accounts_phone_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='userprofile',
+            index=models.Index(fields=['phone2_normalized'], name='accounts_phone2_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -4,6 +4,8 @@ from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from shop.models import normalize_phone
+
 class UserProfile(models.Model):
     """פרופיל משתמש מורחב"""
     
@@ -20,6 +22,10 @@ class UserProfile(models.Model):
     # פרטים נוספים
     phone = models.CharField(max_length=20, blank=True, verbose_name='טלפון')
     phone2 = models.CharField(max_length=20, blank=True, verbose_name='טלפון נוסף')  # NEW FIELD
+    
+    # לחיפוש הזמנות לפי טלפון (shop/lookup.py) - מתעדכנים ב-save
+    phone_normalized = models.CharField(max_length=20, blank=True, editable=False, verbose_name='טלפון מנורמל')
+    phone2_normalized = models.CharField(max_length=20, blank=True, editable=False, verbose_name='טלפון נוסף מנורמל')
     address = models.CharField(max_length=200, blank=True, verbose_name='כתובת')
     
     # סוג משתמש
@@ -38,14 +44,56 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = 'פרופיל משתמש'
         verbose_name_plural = 'פרופילי משתמשים'
+        indexes = [
+            # חיפוש לפי תחילית וערך מדויק (shop/lookup.py); חיפוש בתוך הערך - אינדקסי trigram במיגרציה 0007
+            models.Index(fields=['phone_normalized'], name='accounts_phone_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone2_normalized'], name='accounts_phone2_norm_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name} - {self.get_user_type_display()}'
     
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        self.phone2_normalized = normalize_phone(self.phone2)
+        super().save(*args, **kwargs)
+    
     @property
     def full_name(self):
         return f'{self.user.first_name} {self.user.last_name}'
 
+class DuplicateCandidate(models.Model):
+    """זוג משתמשים שנראים כאותו תורם (accounts/dedupe.py) - ממתין להחלטה בניהול"""
+    STATUS_CHOICES = [
+        ('pending', 'ממתין'),
+        ('merged', 'מוזג'),
+        ('dismissed', 'לא כפול'),
+    ]
+    
+    # תמיד user_a.pk < user_b.pk - זוג נשמר פעם אחת
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='משתמש א')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='משתמש ב')
+    score = models.FloatField(verbose_name='ציון')
+    reasons = models.CharField(max_length=100, verbose_name='התאמות')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='סטטוס')
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך זיהוי')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')
+    
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'משתמש כפול אפשרי'
+        verbose_name_plural = 'משתמשים כפולים אפשריים'
+        constraints = [
+            models.UniqueConstraint(fields=['user_a', 'user_b'], name='accounts_duplicate_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score'], name='accounts_duplicate_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.user_a} / {self.user_b} ({self.score:.2f})'
+
 # Signals remain the same
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+
+from levshomea.testing import TestCase
+from shop.models import DonationReceipt, Marketer, Order
+from .dedupe import MergeError, find_duplicates, load_donors, merge
+from .models import DuplicateCandidate
+
+
+def make_user(username, phone='', **kwargs):
+    user = User.objects.create_user(username, **kwargs)
+    if phone:
+        user.userprofile.phone = phone
+        user.userprofile.save()
+    return user
+
+
+def make_order(user, phone, **kwargs):
+    return Order.objects.create(
+        user=user, first_name='דנה', last_name='לוי', email=f'{user.username}@example.com', phone=phone,
+        total_amount=Decimal(100), **kwargs
+    )
+
+
+def make_receipt(user, number, year):
+    return DonationReceipt.objects.create(
+        number=number, kind='annual', user=user, year=year, donor_name='דנה לוי', amount=Decimal(100),
+        file='receipts/x.html', content_hash='x',
+    )
+
+
+class DedupeTests(TestCase):
+    def setUp(self):
+        self.seller = make_user('seller', first_name='יוסי', last_name='כהן')
+        self.marketer = Marketer.objects.create(first_name='יוסי', user=self.seller)
+        self.donor = make_user('donor', phone='050-1234567', first_name='דנה', last_name='לוי')
+
+    def test_orders_a_marketer_entered_do_not_tie_them_to_the_donor(self):
+        # an old POS sale owned by the marketer, and a new one with the marketer set
+        make_order(self.seller, '050-1234567')
+        make_order(self.donor, '050-1234567', marketer=self.marketer)
+        self.assertEqual(load_donors()[self.seller.pk]['phones'], set())
+
+        find_duplicates()
+        self.assertFalse(DuplicateCandidate.objects.exists())
+
+    def test_a_user_linked_to_a_marketer_is_never_merged(self):
+        with self.assertRaises(MergeError):
+            merge(self.donor.pk, self.seller.pk)
+        with self.assertRaises(MergeError):
+            merge(self.seller.pk, self.donor.pk)
+        self.assertTrue(User.objects.get(pk=self.seller.pk).is_active)
+
+    def test_annual_receipts_for_the_same_year_stop_the_merge(self):
+        duplicate = make_user('donor2', phone='0501234567', first_name='דנה', last_name='לוי')
+        make_receipt(self.donor, 1, 2025)
+        make_receipt(duplicate, 2, 2025)
+        with self.assertRaisesMessage(MergeError, '2025'):
+            merge(self.donor.pk, duplicate.pk)
+        self.assertTrue(User.objects.get(pk=duplicate.pk).is_active)
+
+    def test_annual_receipts_for_different_years_are_moved(self):
+        duplicate = make_user('donor2', phone='0501234567', first_name='דנה', last_name='לוי')
+        make_receipt(self.donor, 1, 2024)
+        make_receipt(duplicate, 2, 2025)
+        make_order(duplicate, '0501234567')
+        moved = merge(self.donor.pk, duplicate.pk)
+        self.assertEqual((moved['orders'], moved['receipts']), (1, 1))
+        self.assertEqual(set(self.donor.donation_receipts.values_list('year', flat=True)), {2024, 2025})
+        self.assertFalse(User.objects.get(pk=duplicate.pk).is_active)
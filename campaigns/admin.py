@@ -1,3 +1,27 @@
 from django.contrib import admin
 
-# Register your models here.
+from .counters import fold
+from .models import Campaign, CampaignShard
+
+
+class CampaignShardInline(admin.TabularInline):
+    model = CampaignShard
+    readonly_fields = ['index', 'amount', 'orders_count']
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'event', 'goal_amount', 'raised_amount', 'orders_count', 'folded_at', 'is_active']
+    list_filter = ['is_active', 'event']
+    search_fields = ['name']
+    readonly_fields = ['raised_amount', 'orders_count', 'folded_at']
+    inlines = [CampaignShardInline]
+    actions = ['fold_counters']
+
+    @admin.action(description='קפל מונים עכשיו')
+    def fold_counters(self, request, queryset):
+        for campaign in queryset:
+            fold(campaign)
+        self.message_user(request, f'{queryset.count()} קמפיינים עודכנו')
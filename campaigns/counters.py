@@ -0,0 +1,137 @@
+# campaigns/counters.py
+"""
+Sharded progress counters for campaigns.
+
+Each order adds its amount to one randomly chosen CampaignShard row, so
+concurrent buyers at the same event update different rows instead of
+queueing on one. fold() moves the shard values into Campaign.raised_amount;
+the exact total at any moment is raised_amount + the sum of the shards.
+
+An order counts towards the active campaigns of its event that existed
+when it was placed, unless it is cancelled. record_order_change() (called
+from the Order post_save/post_delete signals in shop/signals.py) subtracts
+the order's previous contribution and adds its new one when its event,
+status or amount changes, so shards hold signed deltas. Bulk-created POS
+orders skip the signals and are counted by record_orders().
+"""
+import random
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Campaign, CampaignShard
+
+PROGRESS_CACHE_SECONDS = 5
+
+
+def active_campaign_ids(event_id):
+    """
+    (id, shard_count, created_at) of the active campaigns of an event.
+
+    Read from the database, not shop/cache.py: a campaign created or deleted
+    in another process must be counted (or not) right away.
+    """
+    return list(
+        Campaign.objects.filter(event_id=event_id, is_active=True).values_list('pk', 'shard_count', 'created_at')
+    )
+
+
+def increment(campaign_id, shard_count, amount, orders=1):
+    """Add to one random shard of the campaign"""
+    index = random.randrange(shard_count)
+    updated = CampaignShard.objects.filter(campaign_id=campaign_id, index=index).update(
+        amount=F('amount') + amount, orders_count=F('orders_count') + orders
+    )
+    if not updated:
+        # shard_count was raised after the campaign was created; or it was
+        # deleted since it was read, and there is nothing left to count
+        if not Campaign.objects.filter(pk=campaign_id).exists():
+            return
+        CampaignShard.objects.get_or_create(campaign_id=campaign_id, index=index)
+        CampaignShard.objects.filter(campaign_id=campaign_id, index=index).update(
+            amount=F('amount') + amount, orders_count=F('orders_count') + orders
+        )
+
+
+def add(event_id, amount, orders, placed_at):
+    """Add (or with negative values take back) orders placed at placed_at"""
+    for campaign_id, shard_count, created_at in active_campaign_ids(event_id):
+        if created_at <= placed_at:
+            increment(campaign_id, shard_count, amount, orders=orders)
+
+
+def contribution(event_id, status, amount):
+    """(event id, amount) an order in this state counts for, or None"""
+    if event_id is None or status == 'cancelled':
+        return None
+    return event_id, amount
+
+
+def record_order_change(order, before, after):
+    """Move an order's contribution from before to after (contribution() values)"""
+    if before == after:
+        return
+    placed_at = order.created_at or timezone.now()
+    if before is not None:
+        add(before[0], -before[1], -1, placed_at)
+    if after is not None:
+        add(after[0], after[1], 1, placed_at)
+
+
+def record_orders(orders):
+    """Count many new orders (bulk_create skips the signals), one shard update per campaign"""
+    now = timezone.now()
+    per_event = {}
+    for order in orders:
+        if contribution(order.event_id, order.status, order.total_amount):
+            amount, count = per_event.get(order.event_id, (Decimal('0'), 0))
+            per_event[order.event_id] = (amount + order.total_amount, count + 1)
+    for event_id, (amount, count) in per_event.items():
+        add(event_id, amount, count, now)
+
+
+def fold(campaign):
+    """Move the shard values into the campaign total; returns the folded amount"""
+    with transaction.atomic():
+        campaign = Campaign.objects.select_for_update().get(pk=campaign.pk)
+        shards = CampaignShard.objects.select_for_update().filter(campaign=campaign)
+        totals = shards.aggregate(amount=Sum('amount'), orders=Sum('orders_count'))
+        amount = totals['amount'] or Decimal('0')
+        orders = totals['orders'] or 0
+        if amount or orders:
+            shards.update(amount=0, orders_count=0)
+            campaign.raised_amount += amount
+            campaign.orders_count += orders
+        campaign.folded_at = timezone.now()
+        campaign.save(update_fields=['raised_amount', 'orders_count', 'folded_at'])
+    return amount
+
+
+def progress(campaign_id):
+    """
+    Exact progress of a campaign, cached for PROGRESS_CACHE_SECONDS.
+
+    Reads the campaign and its shards only, never Order.
+    """
+    key = f'campaign:progress:{campaign_id}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    campaign = Campaign.objects.select_related('event').get(pk=campaign_id)
+    pending = campaign.shards.aggregate(amount=Sum('amount'), orders=Sum('orders_count'))
+    raised = campaign.raised_amount + (pending['amount'] or 0)
+    data = {
+        'campaign': campaign.name,
+        'event': campaign.event.name,
+        'goal': str(campaign.goal_amount),
+        'raised': str(raised),
+        'orders': campaign.orders_count + (pending['orders'] or 0),
+        'percent': round(float(raised / campaign.goal_amount * 100), 1) if campaign.goal_amount else None,
+        'is_active': campaign.is_active,
+    }
+    cache.set(key, data, PROGRESS_CACHE_SECONDS)
+    return data
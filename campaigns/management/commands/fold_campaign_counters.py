@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaigns.counters import fold
+from campaigns.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Fold the sharded campaign counters into Campaign.raised_amount'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Include inactive campaigns')
+        parser.add_argument(
+            '--loop', type=int, default=0,
+            help='Keep folding every N seconds (0 = fold once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            campaigns = Campaign.objects.all() if options['all'] else Campaign.objects.filter(is_active=True)
+            for campaign in campaigns:
+                amount = fold(campaign)
+                if amount:
+                    self.stdout.write(f'{campaign}: +{amount}')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('shop', '0002_alter_marketer_last_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='שם הקמפיין')),
+                ('goal_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='יעד')),
+                ('raised_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='סכום שגויס')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='כמות הזמנות')),
+                ('shard_count', models.PositiveSmallIntegerField(default=16, verbose_name='מספר מונים')),
+                ('folded_at', models.DateTimeField(blank=True, null=True, verbose_name='קיפול אחרון')),
+                ('is_active', models.BooleanField(default=True, verbose_name='פעיל')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='shop.event', verbose_name='אירוע')),
+            ],
+            options={
+                'verbose_name': 'קמפיין',
+                'verbose_name_plural': 'קמפיינים',
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField(verbose_name='מספר מונה')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='סכום')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='כמות הזמנות')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='campaigns.campaign', verbose_name='קמפיין')),
+            ],
+            options={
+                'verbose_name': 'מונה קמפיין',
+                'verbose_name_plural': 'מוני קמפיין',
+                'unique_together': {('campaign', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='campaignshard',
+            name='orders_count',
+            field=models.IntegerField(default=0, verbose_name='כמות הזמנות'),
+        ),
+    ]
@@ -1,3 +1,50 @@
+# campaigns/models.py
 from django.db import models
 
-# Create your models here.
+
+class Campaign(models.Model):
+    """קמפיין גיוס - מד יעד לאירוע"""
+    name = models.CharField(max_length=100, verbose_name='שם הקמפיין')
+    event = models.ForeignKey('shop.Event', on_delete=models.CASCADE, related_name='campaigns', verbose_name='אירוע')
+    goal_amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='יעד')
+
+    # סכום מקופל - המונים המפוצלים מתווספים אליו בכל קיפול (fold_campaign_counters)
+    raised_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='סכום שגויס')
+    orders_count = models.PositiveIntegerField(default=0, verbose_name='כמות הזמנות')
+    shard_count = models.PositiveSmallIntegerField(default=16, verbose_name='מספר מונים')
+    folded_at = models.DateTimeField(null=True, blank=True, verbose_name='קיפול אחרון')
+
+    is_active = models.BooleanField(default=True, verbose_name='פעיל')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
+
+    class Meta:
+        verbose_name = 'קמפיין'
+        verbose_name_plural = 'קמפיינים'
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        super().save(*args, **kwargs)
+        if creating:
+            CampaignShard.objects.bulk_create(
+                [CampaignShard(campaign=self, index=i) for i in range(self.shard_count)]
+            )
+
+
+class CampaignShard(models.Model):
+    """מונה חלקי של קמפיין - הזמנות מתפזרות בין המונים כדי לא להתחרות על שורה אחת"""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='shards', verbose_name='קמפיין')
+    index = models.PositiveSmallIntegerField(verbose_name='מספר מונה')
+    # שינויים מאז הקיפול האחרון - ביטול הזמנה מוריד, לכן יכולים להיות שליליים
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='סכום')
+    orders_count = models.IntegerField(default=0, verbose_name='כמות הזמנות')
+
+    class Meta:
+        unique_together = ['campaign', 'index']
+        verbose_name = 'מונה קמפיין'
+        verbose_name_plural = 'מוני קמפיין'
+
+    def __str__(self):
+        return f'{self.campaign} #{self.index}'
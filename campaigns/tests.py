@@ -1,3 +1,76 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from levshomea.testing import TestCase
+from shop.models import Event, Order
+from .counters import fold, increment, progress
+from .models import Campaign, CampaignShard
+
+
+class CampaignCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('donor', password='pw')
+        self.event = Event.objects.create(name='ערב התרמה')
+        self.campaign = Campaign.objects.create(name='יעד', event=self.event, goal_amount=1000, shard_count=4)
+
+    def order(self, amount, **kwargs):
+        return Order.objects.create(
+            user=self.user, first_name='א', last_name='ב', email='a@example.com', phone='0501234567',
+            total_amount=Decimal(amount), **kwargs
+        )
+
+    def raised(self):
+        cache.clear()
+        return Decimal(progress(self.campaign.pk)['raised']), progress(self.campaign.pk)['orders']
+
+    def test_orders_of_the_event_are_counted(self):
+        self.order(100, event=self.event)
+        self.order(50)
+        self.assertEqual(self.raised(), (Decimal(100), 1))
+
+    def test_event_assigned_later_is_counted(self):
+        order = Order.objects.get(pk=self.order(80).pk)
+        order.event = self.event
+        order.save()
+        self.assertEqual(self.raised(), (Decimal(80), 1))
+
+    def test_cancel_and_delete_take_the_amount_back(self):
+        kept = self.order(100, event=self.event)
+        cancelled = self.order(40, event=self.event)
+        deleted = self.order(25, event=self.event)
+        cancelled = Order.objects.get(pk=cancelled.pk)
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        deleted.delete()
+        self.assertEqual(self.raised(), (Decimal(100), 1))
+
+        # folding keeps the exact total, and the same order saved twice counts once
+        fold(self.campaign)
+        kept.save()
+        self.assertEqual(self.raised(), (Decimal(100), 1))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.raised_amount, self.campaign.orders_count), (Decimal(100), 1))
+
+    def test_orders_placed_before_the_campaign_are_not_taken_back(self):
+        order = self.order(60, event=self.event)
+        later = Campaign.objects.create(name='יעד 2', event=self.event, goal_amount=500, shard_count=2)
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'cancelled'
+        order.save()
+        cache.clear()
+        self.assertEqual(progress(later.pk)['raised'], '0.00')
+
+    def test_a_new_campaign_counts_the_next_order(self):
+        self.order(10, event=self.event)
+        later = Campaign.objects.create(name='יעד 2', event=self.event, goal_amount=500, shard_count=2)
+        self.order(30, event=self.event)
+        cache.clear()
+        self.assertEqual(progress(later.pk)['raised'], '30.00')
+
+    def test_no_shard_for_a_deleted_campaign(self):
+        campaign_id, shard_count = self.campaign.pk, self.campaign.shard_count
+        self.campaign.delete()
+        increment(campaign_id, shard_count, Decimal(10))
+        self.assertFalse(CampaignShard.objects.filter(campaign_id=campaign_id).exists())
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'campaigns'
+
+urlpatterns = [
+    path('<int:campaign_id>/', views.campaign_meter, name='meter'),
+    path('<int:campaign_id>/progress/', views.campaign_progress, name='progress'),
+]
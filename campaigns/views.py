@@ -1,3 +1,25 @@
-from django.shortcuts import render
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.views.decorators.cache import cache_control
 
-# Create your views here.
+from .counters import progress, PROGRESS_CACHE_SECONDS
+from .models import Campaign
+
+
+@cache_control(public=True, max_age=PROGRESS_CACHE_SECONDS)
+def campaign_progress(request, campaign_id):
+    """JSON progress for the goal meter, polled by attendees during the event"""
+    try:
+        data = progress(campaign_id)
+    except Campaign.DoesNotExist:
+        raise Http404('No Campaign matches the given query.')
+    return JsonResponse(data)
+
+
+def campaign_meter(request, campaign_id):
+    """Goal meter page - polls campaign_progress"""
+    campaign = get_object_or_404(Campaign.objects.select_related('event'), pk=campaign_id)
+    return render(request, 'campaigns/meter.html', {
+        'campaign': campaign,
+        'poll_seconds': PROGRESS_CACHE_SECONDS,
+    })
@@ -0,0 +1,57 @@
+# gunicorn.conf.py - loaded automatically by gunicorn from the working directory
+#
+# SERVER_MODE=wsgi (default): sync workers with a thread pool, one request per thread.
+# SERVER_MODE=asgi: uvicorn workers running levshomea.asgi, with the async views
+#                   from shop/async_views.py (see ASYNC_VIEWS in settings.py).
+import os
+import shutil
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+timeout = 0
+
+if server_mode == 'asgi':
+    wsgi_app = 'levshomea.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif server_mode == 'wsgi':
+    wsgi_app = 'levshomea.wsgi:application'
+    threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+else:
+    raise RuntimeError(f'Unknown SERVER_MODE {server_mode!r}, expected "wsgi" or "asgi"')
+
+# Metrics of all workers are merged from per-process files (levshomea/metrics.py);
+# set before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/levshomea-metrics')
+
+
+def on_starting(server):
+    """Start with empty metrics - the files of a previous run would be merged in"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def post_worker_init(worker):
+    """Warm the worker up (URLconf, DB, templates, caches) before it accepts requests"""
+    if os.environ.get('WARMUP_ON_START', '1') != '1':
+        return
+    from levshomea.warmup import warmup
+    report = warmup()
+    worker.log.info('warmup: %s', ', '.join(f'{name}={step["ms"]}ms' for name, step in report.items()))
+
+
+def worker_exit(server, worker):
+    """Write the popularity counts still held in memory (shop/popularity.py)"""
+    from shop.popularity import counter
+    try:
+        counter.flush()
+    except Exception as e:
+        worker.log.warning('popularity flush on exit failed: %s', e)
+
+
+def child_exit(server, worker):
+    """Stop counting a dead worker's live gauges (its counters stay in the totals)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,209 @@
+"""
+Structured, non-blocking logging (wired up by LOGGING in settings.py).
+
+Request threads only put records on an in-memory queue
+(BackgroundQueueHandler); one listener thread per process formats them as
+JSON and writes them to stdout, so a slow stdout or log collector never
+adds latency to a request. When the queue is full, records are dropped
+rather than blocking.
+
+Every record carries the id of the request that produced it (taken from
+X-Request-ID / X-Cloud-Trace-Context or generated by
+request_log_middleware, and echoed in the response's X-Request-ID), and the
+middleware logs one access record per request with its duration. DEBUG
+records are sampled per request (LOG_DEBUG_SAMPLE_RATE), so turning DEBUG
+on under load keeps whole requests' worth of detail without logging them
+all. PII is redacted on the listener thread: extra fields with a personal
+key (phone, email, names, address, passwords, tokens) and email addresses /
+phone numbers inside messages.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+LOG_QUEUE_SIZE = 10000
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+access_logger = logging.getLogger('levshomea.access')
+
+# attributes every LogRecord has - everything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+REDACTED = '[redacted]'
+PII_KEYS = re.compile(r'pass|token|secret|authorization|cookie|phone|email|first_name|last_name|address|postal_code', re.I)
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+# Israeli numbers: 0 or +972 and 8-9 more digits, optionally split by spaces or dashes
+PHONE_PATTERN = re.compile(r'(?<![\d+])(?:\+?972[\s-]?|0)(?:\d[\s-]?){7,8}\d(?!\d)')
+
+
+def redact(value, key=''):
+    """value with PII removed - by key for mappings, by pattern for strings"""
+    if key and PII_KEYS.search(key):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return PHONE_PATTERN.sub('[phone]', EMAIL_PATTERN.sub('[email]', value))
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id, the extra fields, exc"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact(record.getMessage()),
+        }
+        if getattr(record, 'request_id', None):
+            data['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = redact(value, key)
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc_text:
+            data['exc'] = redact(exc_text)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the record with the current request id (runs before the record is queued)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep rate of the DEBUG records - all or none of a request's"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None) or request_id_var.get()
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < self.rate * 10000
+        return random.random() < self.rate
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler feeding a QueueListener that writes to stream with this
+    handler's formatter. The listener starts with the first record of a
+    process (so a forked gunicorn worker gets its own) and is stopped at
+    exit, after draining the queue.
+    """
+
+    def __init__(self, stream=None, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+
+    def _start_listener(self):
+        self.target.setFormatter(self.formatter or JsonFormatter())
+        self._listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self._listener.start()
+        self._pid = os.getpid()
+        atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        """Write out what is queued and stop the listener thread"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = self._pid = None
+
+    def prepare(self, record):
+        # only what must happen now: the message args and traceback may not outlive the call
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _request_id(request):
+    return (
+        request.headers.get('X-Request-ID')
+        or request.headers.get('X-Cloud-Trace-Context', '').split('/')[0]
+        or uuid.uuid4().hex
+    )[:64]
+
+
+def _log_access(request, response, started):
+    match = request.resolver_match
+    access_logger.info(
+        '%s %s %s', request.method, request.path, response.status_code,
+        extra={
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'user_id': request.user.pk if getattr(request, 'user', None) is not None else None,
+        },
+    )
+
+
+@sync_and_async_middleware
+def request_log_middleware(get_response):
+    """Bind a request id to the request's log records and log its access line"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.id = _request_id(request)
+            token = request_id_var.set(request.id)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+                _log_access(request, response, started)
+            finally:
+                request_id_var.reset(token)
+            response['X-Request-ID'] = request.id
+            return response
+    else:
+        def middleware(request):
+            request.id = _request_id(request)
+            token = request_id_var.set(request.id)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+                _log_access(request, response, started)
+            finally:
+                request_id_var.reset(token)
+            response['X-Request-ID'] = request.id
+            return response
+    return middleware
@@ -0,0 +1,142 @@
+"""
+Business and request metrics in Prometheus format, served at /metrics.
+
+Counters and histograms are prometheus_client objects: an increment is a
+lock and an add in process memory. With several gunicorn workers,
+gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR before the workers start;
+prometheus_client then keeps every value in a per-process mmap file there,
+and a scrape of any worker merges the files of all of them (dead workers
+are marked in the child_exit hook). Without it (runserver, one worker)
+the values live in the default registry.
+
+metrics_middleware times every request and the DB time inside it (an
+execute_wrapper around each query), labelled by URL name. The bench_metrics
+command measures what all of this adds to a request and scrapes the
+endpoint locally.
+"""
+import os
+import secrets
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from shop.inventory import OutOfStock
+
+# request latencies - sub-millisecond cache hits up to slow admin pages
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CART_ADDS = Counter('shop_cart_adds_total', 'Add-to-cart requests', ['result'])
+CHECKOUTS = Counter('shop_checkouts_total', 'Checkout attempts', ['result'])
+CHECKOUT_SECONDS = Histogram('shop_checkout_seconds', 'Time to place an order', buckets=LATENCY_BUCKETS)
+POS_ORDERS = Counter('shop_pos_orders_total', 'Orders entered through the POS batch API', ['result'])
+ORDER_STATUS_CHANGES = Counter('shop_order_status_changes_total', 'Order status changes', ['from_status', 'to_status'])
+STOCK_OUTS = Counter('shop_stock_outs_total', 'Requests refused for lack of stock', ['where'])
+
+REQUEST_SECONDS = Histogram('http_request_seconds', 'Request latency', ['view', 'method'], buckets=LATENCY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('http_request_db_seconds', 'DB time per request', ['view'], buckets=LATENCY_BUCKETS)
+REQUEST_DB_QUERIES = Counter('http_request_db_queries_total', 'DB queries', ['view'])
+
+
+class _DBTimer:
+    """execute_wrapper that adds up the time spent in queries"""
+
+    __slots__ = ('seconds', 'queries')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def track_checkout(place_order):
+    """Count and time the calls of place_order by outcome"""
+    @wraps(place_order)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            order = place_order(*args, **kwargs)
+            result = 'success'
+            return order
+        except OutOfStock:
+            result = 'out_of_stock'
+            STOCK_OUTS.labels('checkout').inc()
+            raise
+        except ValueError:
+            result = 'rejected'
+            raise
+        finally:
+            CHECKOUTS.labels(result).inc()
+            CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def _view_name(request):
+    match = request.resolver_match
+    return match.view_name if match else 'unmatched'
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Request latency per URL name, and under WSGI the DB time and queries.
+
+    Async views run their queries in sync_to_async threads with their own
+    connections, so under ASGI only the latency is recorded.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            REQUEST_SECONDS.labels(_view_name(request), request.method).observe(time.perf_counter() - start)
+            return response
+    else:
+        def middleware(request):
+            timer = _DBTimer()
+            start = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                response = get_response(request)
+            view = _view_name(request)
+            REQUEST_SECONDS.labels(view, request.method).observe(time.perf_counter() - start)
+            if timer.queries:
+                REQUEST_DB_SECONDS.labels(view).observe(timer.seconds)
+                REQUEST_DB_QUERIES.labels(view).inc(timer.queries)
+            return response
+    return middleware
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    return merged
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+
+    Open to staff sessions, and to "Authorization: Bearer <METRICS_TOKEN>"
+    when METRICS_TOKEN is set.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if not (token and secrets.compare_digest(header, f'Bearer {token}')) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,343 @@
+"""
+Migration operations for changing big tables (orders, order items, carts,
+products, users and their profiles) without blocking checkout or logins.
+
+On PostgreSQL, CREATE INDEX blocks writes to the table until the index is
+built, and a data migration in the same transaction as a schema change
+keeps that change's lock until the last row is updated. Even a change that
+only needs a lock for a moment (ADD COLUMN) blocks checkout while it waits
+in the queue behind a long transaction. So in migrations of big tables:
+
+- AddIndexConcurrently instead of AddIndex (and db_index/unique fields
+  without the index, added separately): CREATE INDEX CONCURRENTLY.
+- Backfill instead of a RunPython loop: pk batches committed one by one
+  with a pause between them.
+- create_index_concurrently for indexes AddIndex cannot express
+  (expressions, GIN, unique indexes turned into constraints) in RunPython.
+- All of them need `atomic = False` on the migration, and are best in a
+  migration of their own.
+- migrate sets lock_timeout to MIGRATION_LOCK_TIMEOUT (see
+  set_migration_lock_timeout), so a DDL statement that cannot get its lock
+  fails quickly instead of queueing. Just run migrate again.
+
+check_migration_locks flags the operations that lock big tables in the
+migrations not applied yet, including index DDL in RunSQL and in RunPython
+functions (and the module constants and helpers they use); run it before
+deploying. To rehearse a migration, seed a local PostgreSQL with
+seed_large_dataset, then run migrate while bench_concurrency is running
+against the site.
+
+Other databases (SQLite in development) run the operations as plain
+AddIndex / RunPython.
+"""
+import inspect
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import NotSupportedError, migrations, router, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+BACKFILL_PAUSE = 0.1
+# tables with more (estimated) rows count as big too, on PostgreSQL
+LARGE_TABLE_ROWS = 100000
+
+CREATE_INDEX = re.compile(r'CREATE\s+(UNIQUE\s+)?INDEX(?!\s+CONCURRENTLY)', re.I)
+CONCURRENTLY = re.compile(r'concurrently', re.I)
+
+
+def set_migration_lock_timeout(connection):
+    if connection.vendor == 'postgresql' and settings.MIGRATION_LOCK_TIMEOUT:
+        with connection.cursor() as cursor:
+            cursor.execute('SET lock_timeout = %s', [settings.MIGRATION_LOCK_TIMEOUT])
+
+
+def reset_lock_timeout(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('RESET lock_timeout')
+
+
+def _require_non_atomic(schema_editor, operation):
+    if schema_editor.connection.in_atomic_block:
+        raise NotSupportedError(f'{operation} cannot run inside a transaction; set atomic = False on the migration.')
+
+
+def _drop_invalid_index(schema_editor, name):
+    # an interrupted build leaves an invalid index with this name behind
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid',
+            [name],
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def create_index_concurrently(schema_editor, name, table, definition, unique=False):
+    """
+    CREATE [UNIQUE] INDEX CONCURRENTLY name ON table <definition>, e.g.
+    definition='USING gin ("phone" gin_trgm_ops)'. For RunPython functions
+    of atomic = False migrations, on PostgreSQL; safe to run again.
+    """
+    _require_non_atomic(schema_editor, 'create_index_concurrently')
+    _drop_invalid_index(schema_editor, name)
+    # the build waits for running transactions; that wait must not time out
+    schema_editor.execute('SET lock_timeout = 0')
+    try:
+        schema_editor.execute(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" {definition}'
+        )
+    finally:
+        set_migration_lock_timeout(schema_editor.connection)
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex with CREATE INDEX CONCURRENTLY on PostgreSQL (atomic = False migrations only)"""
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        _require_non_atomic(schema_editor, 'AddIndexConcurrently')
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        _drop_invalid_index(schema_editor, self.index.name)
+        # the build waits for running transactions; that wait must not time out
+        schema_editor.execute('SET lock_timeout = 0')
+        try:
+            schema_editor.add_index(model, self.index, concurrently=True)
+        finally:
+            set_migration_lock_timeout(schema_editor.connection)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        _require_non_atomic(schema_editor, 'AddIndexConcurrently')
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Backfill(migrations.RunPython):
+    """
+    Call update(queryset) for consecutive pk ranges of a model, each batch in
+    its own transaction, pausing between batches.
+
+    update gets a queryset of the historical model limited to the batch (and
+    typically calls .filter(...).update(...) or bulk_update on it). It must
+    be a module level function of the migration, and safe to run twice on a
+    batch: an interrupted backfill starts again from the first batch.
+    """
+
+    def __init__(self, model_name, update, batch_size=BACKFILL_BATCH_SIZE, pause=BACKFILL_PAUSE, hints=None):
+        self.model_name = model_name
+        self.update = update
+        self.batch_size = batch_size
+        self.pause = pause
+        super().__init__(self._run, migrations.RunPython.noop, atomic=False, hints=hints)
+
+    def deconstruct(self):
+        kwargs = {'model_name': self.model_name, 'update': self.update}
+        if self.batch_size != BACKFILL_BATCH_SIZE:
+            kwargs['batch_size'] = self.batch_size
+        if self.pause != BACKFILL_PAUSE:
+            kwargs['pause'] = self.pause
+        if self.hints:
+            kwargs['hints'] = self.hints
+        return self.__class__.__qualname__, [], kwargs
+
+    def describe(self):
+        return f'Backfill {self.model_name} in batches of {self.batch_size}'
+
+    def _run(self, apps, schema_editor):
+        _require_non_atomic(schema_editor, 'Backfill')
+        alias = schema_editor.connection.alias
+        model = apps.get_model(self.app_label, self.model_name)
+        if not router.allow_migrate_model(alias, model):
+            return
+        objects = model._base_manager.using(alias)
+        last_pk, batches = None, 0
+        while True:
+            rows = objects.order_by('pk') if last_pk is None else objects.filter(pk__gt=last_pk).order_by('pk')
+            upper = rows.values_list('pk', flat=True)[self.batch_size - 1:self.batch_size].first()
+            batch = rows if upper is None else rows.filter(pk__lte=upper)
+            with transaction.atomic(using=alias):
+                self.update(batch)
+            batches += 1
+            if upper is None:
+                break
+            last_pk = upper
+            if batches % 100 == 0:
+                logger.info('backfill %s: %s batches, up to pk %s', self.model_name, batches, last_pk)
+            time.sleep(self.pause)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self.app_label = app_label
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+@dataclass
+class Finding:
+    migration: str
+    operation: str
+    level: str  # 'error' - locks a big table, 'warning' - review it
+    message: str
+
+
+def large_tables(connection):
+    """Tables of LARGE_MODELS, and on PostgreSQL of any table estimated at LARGE_TABLE_ROWS rows or more"""
+    from django.apps import apps
+
+    tables = {apps.get_model(label)._meta.db_table for label in settings.LARGE_MODELS}
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s", [LARGE_TABLE_ROWS]
+            )
+            tables.update(row[0] for row in cursor.fetchall())
+    return tables
+
+
+def pending_migrations(connection, include_applied=False):
+    """The migrations migrate would apply, in order (or all of them)"""
+    executor = MigrationExecutor(connection)
+    graph = executor.loader.graph
+    if not include_applied:
+        return executor, [migration for migration, backwards in executor.migration_plan(graph.leaf_nodes()) if not backwards]
+    keys = []
+    for leaf in graph.leaf_nodes():
+        keys.extend(key for key in graph.forwards_plan(leaf) if key not in keys)
+    return executor, [graph.nodes[key] for key in keys]
+
+
+def _table(state, app_label, model_name):
+    model = state.models.get((app_label, model_name.lower()))
+    if model is None:
+        return None
+    return model.options.get('db_table') or f'{app_label}_{model_name.lower()}'
+
+
+def _adds_index(old, new):
+    return (new.db_index or new.unique) and not (old and (old.db_index or old.unique))
+
+
+def _python_source(function, depth=1):
+    """Source of a RunPython function, with the module constants and (one level of) module functions it uses"""
+    code = getattr(function, '__code__', None)
+    try:
+        parts = [inspect.getsource(function)]
+    except (OSError, TypeError):
+        return ''
+    module = getattr(function, '__globals__', {})
+    for name in code.co_names if code else ():
+        value = module.get(name)
+        if isinstance(value, (str, list, tuple, dict)):
+            parts.append(repr(value))
+        elif depth and inspect.isfunction(value) and value.__module__ == function.__module__:
+            parts.append(_python_source(value, depth - 1))
+    return '\n'.join(parts)
+
+
+def _index_ddl_findings(sql, touched, atomic):
+    if touched and CREATE_INDEX.search(sql):
+        yield 'error', f'CREATE INDEX without CONCURRENTLY on {", ".join(touched)} - blocks writes until it is built'
+    elif atomic and CONCURRENTLY.search(sql):
+        yield 'error', 'builds or drops an index concurrently, which cannot run in a transaction - needs atomic = False on the migration'
+
+
+def _operation_findings(migration, operation, state, big):
+    """(level, message) for one operation; state is the project state before it"""
+    app_label = migration.app_label
+    model_name = getattr(operation, 'model_name', None) or getattr(operation, 'name', '')
+    table = _table(state, app_label, model_name) if model_name else None
+    on_big = table in big
+
+    if isinstance(operation, (AddIndexConcurrently, Backfill)):
+        if migration.atomic:
+            yield 'error', 'needs atomic = False on the migration'
+    elif isinstance(operation, migrations.AddIndex) and on_big:
+        yield 'error', f'CREATE INDEX blocks writes to {table} until it is built - use AddIndexConcurrently'
+    elif isinstance(operation, migrations.AddConstraint) and on_big:
+        yield 'error', f'builds or validates the constraint while locking {table} - add a unique index concurrently first, or the check as NOT VALID in RunSQL'
+    elif isinstance(operation, migrations.AddField) and on_big:
+        if operation.field.is_relation:
+            yield 'error', f'the foreign key is validated and indexed while {table} is locked - add it with db_constraint=False and db_index=False, then index it concurrently'
+        elif _adds_index(None, operation.field):
+            yield 'error', f'the index on the new column is built while {table} is locked - add the field without db_index/unique, then AddIndexConcurrently (create_index_concurrently for unique)'
+    elif isinstance(operation, migrations.AlterField) and on_big:
+        old = state.models[app_label, model_name.lower()].fields[operation.name]
+        new = operation.field
+        old_path, _, old_kwargs = old.deconstruct()[1:]
+        new_path, _, new_kwargs = new.deconstruct()[1:]
+        if old_path != new_path or any(
+            old_kwargs.get(key) != new_kwargs.get(key) for key in ('max_digits', 'decimal_places')
+        ) or (new_kwargs.get('max_length') or 0) < (old_kwargs.get('max_length') or 0):
+            yield 'error', f'changes the column type - {table} is rewritten under an exclusive lock'
+        if old.null and not new.null:
+            yield 'error', f'SET NOT NULL scans {table} under an exclusive lock - add a CHECK (... IS NOT NULL) NOT VALID constraint and validate it first'
+        if _adds_index(old, new):
+            yield 'error', f'the index is built while {table} is locked - use AddIndexConcurrently'
+    elif isinstance(operation, (migrations.RemoveField, migrations.RenameField, migrations.RenameModel, migrations.DeleteModel, migrations.AlterModelTable)):
+        yield 'warning', 'the running version of the site still uses the old name during the deploy - stop using it in one deploy, change the schema in the next'
+    elif isinstance(operation, (migrations.RunSQL, migrations.RunPython)):
+        is_sql = isinstance(operation, migrations.RunSQL)
+        sql = str(operation.sql) if is_sql else _python_source(operation.code)
+        # as Migration.apply decides it; RunSQL defaults to atomic=True even in an atomic = False migration
+        atomic = bool(operation.atomic or (migration.atomic and operation.atomic is not False))
+        touched = sorted(name for name in big if re.search(rf'\b{re.escape(name)}\b', sql))
+        ddl = list(_index_ddl_findings(sql, touched, atomic))
+        if ddl:
+            yield from ddl
+        elif is_sql and touched:
+            yield 'warning', f'raw SQL on {", ".join(touched)} - check the locks it takes'
+        elif not is_sql and atomic:
+            yield 'warning', 'runs in the migration\'s transaction, holding the locks of its schema changes until it ends - use Backfill in a migration with atomic = False'
+
+
+def _database_operations(operation):
+    """The operation, or the database side of a SeparateDatabaseAndState"""
+    if isinstance(operation, migrations.SeparateDatabaseAndState):
+        for database_operation in operation.database_operations:
+            yield from _database_operations(database_operation)
+    else:
+        yield operation
+
+
+def check_migrations(connection, include_applied=False):
+    """[Finding] for the operations of the pending migrations that lock big tables"""
+    big = large_tables(connection)
+    executor, plan = pending_migrations(connection, include_applied)
+    findings = []
+    for migration in plan:
+        state = executor.loader.project_state((migration.app_label, migration.name), at_end=False)
+        results, touches_big, migration_big = [], False, set(big)
+        for operation in migration.operations:
+            for database_operation in _database_operations(operation):
+                model_name = getattr(database_operation, 'model_name', None) or getattr(database_operation, 'name', '')
+                if isinstance(database_operation, migrations.CreateModel):
+                    # nothing to lock in a table created by this migration
+                    migration_big.discard(f'{migration.app_label}_{model_name.lower()}')
+                    migration_big.discard(database_operation.options.get('db_table'))
+                touches_big = touches_big or (bool(model_name) and _table(state, migration.app_label, model_name) in migration_big)
+                results.extend(
+                    (database_operation, level, message)
+                    for level, message in _operation_findings(migration, database_operation, state, migration_big)
+                )
+            operation.state_forwards(migration.app_label, state)
+        for operation, level, message in results:
+            # a data migration only holds locks worth flagging next to schema changes of big tables
+            if type(operation) is migrations.RunPython and level == 'warning' and not touches_big:
+                continue
+            findings.append(Finding(f'{migration.app_label}.{migration.name}', operation.describe(), level, message))
+    return findings
@@ -1,7 +1,8 @@
 # levshomea/settings.py - Updated with cart context processor
-import os
 from pathlib import Path
 
+from decouple import config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-local-dev-key-change-in-production'
@@ -22,12 +23,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'shop',
     'accounts',
     'campaigns',
 ]
 
 MIDDLEWARE = [
+    'levshomea.log.request_log_middleware',
+    'shop.slow_queries.slow_query_middleware',
+    'levshomea.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -57,6 +62,11 @@ TEMPLATES = [
     },
 ]
 
+# Deployment mode: 'wsgi' (gunicorn threads) or 'asgi' (uvicorn workers), see gunicorn.conf.py
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+# Serve the read-heavy storefront views from shop/async_views.py
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=SERVER_MODE == 'asgi', cast=bool)
+
 # Database - SQLite for local development
 # DATABASES = {
 #     'default': {
@@ -65,7 +75,6 @@ TEMPLATES = [
 #     }
 # }
 
-from decouple import config
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -74,11 +83,65 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Keep connections open across requests in the thread pool, so only the
+        # first request on each thread pays for the connect. ASGI runs each
+        # request in a fresh thread, where persistent connections would leak.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0 if SERVER_MODE == 'asgi' else 60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
-import os
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Cache - CACHE_BACKEND=locmem|file|db|redis, no Redis needed by default.
+# The db backend needs `python manage.py createcachetable` once.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_LOCATIONS = {
+    'locmem': 'levshomea',
+    'file': '/tmp/levshomea-cache',
+    'db': 'django_cache',
+    'redis': 'redis://localhost:6379/0',
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_LOCATIONS[CACHE_BACKEND]),
+    }
+}
+
+# Reference data cache (shop/cache.py). Also the longest a process keeps
+# its local copy. locmem is private to each process, so a change made in
+# another process is only seen when the copy expires: keep that short there.
+REFERENCE_CACHE_TIMEOUT = config(
+    'REFERENCE_CACHE_TIMEOUT', default=30 if CACHE_BACKEND == 'locmem' else 60 * 60, cast=int
+)
+REFERENCE_CACHE_LOCAL_TTL = 5
+REFERENCE_CACHE_LOCAL_SIZE = 256
+
+# Sessions - SESSION_STRATEGY=db|cached_db|signed_cookies (compare with bench_sessions)
+# cached_db reads sessions from the cache above and goes to the DB only on a
+# miss. It needs a cache shared by all workers (file/db/redis): with locmem a
+# logout in one worker would not end the session cached in the others, so the
+# default falls back to db there. signed_cookies keeps the session in the
+# cookie itself - no storage at all, but an old cookie stays valid after logout.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_STRATEGY = config('SESSION_STRATEGY', default='db' if CACHE_BACKEND == 'locmem' else 'cached_db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STRATEGY]
+# write the session only when it changed
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Flash messages in a cookie, so showing one doesn't read or write the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Static files
 STATIC_URL = '/static/'
@@ -104,6 +167,103 @@ LOGOUT_REDIRECT_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Live sales dashboard (shop/live.py): under WSGI each open stream holds a
+# gunicorn thread - dashboards beyond this many per process poll instead
+LIVE_MAX_WSGI_STREAMS = config('LIVE_MAX_WSGI_STREAMS', default=2, cast=int)
+# under ASGI a stream is cheap, but Django does not notice a closed tab
+LIVE_MAX_ASGI_STREAMS = config('LIVE_MAX_ASGI_STREAMS', default=50, cast=int)
+# a stream ends after this long and the dashboard reconnects, so one left
+# behind by a closed tab is dropped in the end
+LIVE_MAX_STREAM_SECONDS = config('LIVE_MAX_STREAM_SECONDS', default=600, cast=int)
+
+# POS sales (place_bulk_orders in shop/orders.py) belong to the donor's own
+# account; donors without one are recorded under this inactive user
+POS_WALK_IN_USERNAME = config('POS_WALK_IN_USERNAME', default='pos-walk-in')
+
+# Cold start (see levshomea/warmup.py and the profile_startup command)
+# Dotted paths of callables run by warmup() to fill caches before traffic arrives
+WARMUP_CACHE_PRIMERS = [
+    'shop.cache.prime_reference_data',
+]
+# Target for time-to-first-byte of a fresh process, checked by profile_startup --check
+COLD_START_TARGET_MS = config('COLD_START_TARGET_MS', default=2000, cast=int)
+# Startup probes call /_warmup/ with "Authorization: Bearer <WARMUP_TOKEN>"
+WARMUP_TOKEN = config('WARMUP_TOKEN', default='')
+
+# Donation receipts (see shop/receipts.py)
+RECEIPT_ORGANIZATION_NAME = config('RECEIPT_ORGANIZATION_NAME', default='לב שומע')
+RECEIPT_ORGANIZATION_NUMBER = config('RECEIPT_ORGANIZATION_NUMBER', default='')
+
+# Prometheus metrics at /metrics (see levshomea/metrics.py); scrapers send
+# "Authorization: Bearer <METRICS_TOKEN>", staff sessions need no token
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Analytics export - Parquet files for offline analysis (see shop/export.py)
+ANALYTICS_EXPORT_DIR = config('ANALYTICS_EXPORT_DIR', default=str(BASE_DIR / 'exports'))
+
+# Slow-query capture (see shop/slow_queries.py); 0 turns it off
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=500, cast=int)
+# share of captured SELECTs re-run under EXPLAIN ANALYZE (PostgreSQL only)
+SLOW_QUERY_EXPLAIN_RATE = config('SLOW_QUERY_EXPLAIN_RATE', default=0.1, cast=float)
+SLOW_QUERY_KEEP = config('SLOW_QUERY_KEEP', default=1000, cast=int)
+
+# Zero-downtime migrations (see levshomea/schema.py): migrate gives up on a
+# lock it cannot get within this time instead of blocking checkout behind it
+MIGRATION_LOCK_TIMEOUT = config('MIGRATION_LOCK_TIMEOUT', default='5s')
+# tables check_migration_locks treats as big (plus any with 100k+ rows on PostgreSQL);
+# users and profiles too, since every login and checkout writes them
+LARGE_MODELS = [
+    'shop.Order', 'shop.OrderItem', 'shop.CartItem', 'shop.Product', 'shop.StockMovement',
+    'auth.User', 'accounts.UserProfile',
+]
+
+# Logging - JSON lines on stdout, written by a background thread (see levshomea/log.py)
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+# share of requests whose DEBUG records are kept when LOG_LEVEL is DEBUG
+LOG_DEBUG_SAMPLE_RATE = config('LOG_DEBUG_SAMPLE_RATE', default=0.1, cast=float)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request': {'()': 'levshomea.log.RequestContextFilter'},
+        'sample_debug': {'()': 'levshomea.log.DebugSamplingFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'levshomea.log.JsonFormatter'},
+    },
+    'handlers': {
+        'queue': {
+            'class': 'levshomea.log.BackgroundQueueHandler',
+            'filters': ['request', 'sample_debug'],
+            'formatter': 'json',
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        # every SQL statement at DEBUG - far too much even sampled
+        'django.db.backends': {'level': 'INFO'},
+        # the access line of request_log_middleware replaces Django's
+        'django.server': {'level': 'WARNING'},
+    },
+}
+
+# REST API (/api/v1/)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+    ],
+}
+
 # Optional: Support both Hebrew and English
 from django.utils.translation import gettext_lazy as _
 
@@ -113,7 +273,6 @@ LANGUAGES = [
 ]
 
 # Locale paths (add this to enable Hebrew translations)
-import os
 LOCALE_PATHS = [
-    os.path.join(BASE_DIR, 'locale'),
+    BASE_DIR / 'locale',
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+Test case classes for the project's tests.
+
+The reference data cache (shop/cache.py) keeps a copy per process and is
+invalidated on commit, which a TestCase never reaches; ids repeat from test
+to test, so one test's cached marketers or products would show up in the
+next. These classes empty both tiers before and after every test.
+"""
+from django import test
+from django.core.cache import cache
+
+
+def clear_caches():
+    from shop.cache import local_cache
+
+    cache.clear()
+    local_cache.clear()
+
+
+class CacheIsolationMixin:
+    def _pre_setup(self):
+        clear_caches()
+        super()._pre_setup()
+
+    def _post_teardown(self):
+        try:
+            super()._post_teardown()
+        finally:
+            clear_caches()
+
+
+class SimpleTestCase(CacheIsolationMixin, test.SimpleTestCase):
+    pass
+
+
+class TestCase(CacheIsolationMixin, test.TestCase):
+    pass
+
+
+class TransactionTestCase(CacheIsolationMixin, test.TransactionTestCase):
+    pass
@@ -0,0 +1,174 @@
+import importlib
+import unittest
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import NotSupportedError, connection, migrations, models, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import override_settings
+from prometheus_client.parser import text_string_to_metric_families
+
+from levshomea import warmup
+from levshomea.log import REDACTED, redact
+from levshomea.schema import (
+    AddIndexConcurrently, Backfill, _operation_findings, check_migrations, create_index_concurrently, large_tables,
+)
+from levshomea.testing import SimpleTestCase, TestCase, TransactionTestCase
+from shop.models import Order
+
+INDEXED_TABLE = 'shop_order'
+
+
+def blocking_index(apps, schema_editor):
+    schema_editor.execute(f'CREATE INDEX "shop_order_test_idx" ON "{INDEXED_TABLE}" ("phone")')
+
+
+def concurrent_index(apps, schema_editor):
+    create_index_concurrently(schema_editor, 'shop_order_test_idx', INDEXED_TABLE, '("phone")')
+
+
+def run_python_findings(code, atomic):
+    migration = migrations.Migration('0099_test', 'shop')
+    migration.atomic = atomic
+    return list(_operation_findings(migration, migrations.RunPython(code), None, {'shop_order'}))
+
+
+@override_settings(WARMUP_TOKEN='warm')
+class WarmupViewTests(TestCase):
+    def setUp(self):
+        warmup._last_report = None
+
+    def test_anonymous_request_is_refused(self):
+        self.assertEqual(self.client.get('/_warmup/').status_code, 403)
+        self.assertEqual(self.client.get('/_warmup/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_token_runs_the_warmup_once(self):
+        response = self.client.get('/_warmup/', HTTP_AUTHORIZATION='Bearer warm')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'urlconf', 'db', 'templates', 'caches'})
+        report = warmup._last_report
+        self.client.get('/_warmup/', HTTP_AUTHORIZATION='Bearer warm')
+        self.assertIs(warmup._last_report, report)
+
+    @override_settings(WARMUP_TOKEN='')
+    def test_staff_without_token(self):
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get('/_warmup/').status_code, 200)
+
+
+@override_settings(METRICS_TOKEN='scrape')
+class MetricsViewTests(TestCase):
+    def scrape(self, **headers):
+        return self.client.get('/metrics', **headers)
+
+    def test_token_or_staff_required(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.scrape().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_configured_means_no_token_access(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_output_parses_and_counts_requests(self):
+        self.client.get('/_warmup/')
+        response = self.scrape(HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        families = {family.name: family for family in text_string_to_metric_families(response.content.decode())}
+        self.assertIn('shop_checkouts', families)
+        self.assertIn('shop_cart_adds', families)
+        counts = [
+            sample.value for sample in families['http_request_seconds'].samples
+            if sample.name == 'http_request_seconds_count' and sample.labels == {'view': 'warmup', 'method': 'GET'}
+        ]
+        self.assertEqual(len(counts), 1)
+        self.assertGreaterEqual(counts[0], 1)
+
+
+class RedactTests(SimpleTestCase):
+    def test_phone_numbers(self):
+        for phone in ('0501234567', '050-1234567', '050 123 4567', '02-1234567', '+972-50-123-4567', '+972501234567', '972 2 123 4567'):
+            with self.subTest(phone=phone):
+                self.assertEqual(redact(f'call {phone} now'), 'call [phone] now')
+
+    def test_dates_times_and_ids_are_kept(self):
+        for text in ('2026-10-19 17:30:00', 'took 1234567890 ns', 'order 40123456', 'ORD-1A2B3C4D', 'pk 123456789012'):
+            with self.subTest(text=text):
+                self.assertEqual(redact(text), text)
+
+    def test_emails_and_personal_keys(self):
+        self.assertEqual(redact('from dana.levi+x@example.co.il'), 'from [email]')
+        self.assertEqual(
+            redact({'phone': '1', 'nested': {'email': 'x'}, 'items': ['050-1234567', 3], 'count': 2}),
+            {'phone': REDACTED, 'nested': {'email': REDACTED}, 'items': ['[phone]', 3], 'count': 2},
+        )
+
+
+class CheckMigrationLocksTests(TestCase):
+    def test_index_ddl_in_run_python_is_found(self):
+        [(level, message)] = run_python_findings(blocking_index, atomic=False)
+        self.assertEqual(level, 'error')
+        self.assertIn('shop_order', message)
+
+    def test_concurrent_build_needs_a_non_atomic_migration(self):
+        self.assertEqual([level for level, _ in run_python_findings(concurrent_index, atomic=True)], ['error'])
+        self.assertEqual(run_python_findings(concurrent_index, atomic=False), [])
+
+    def test_the_migrations_do_not_lock_big_tables(self):
+        self.assertLessEqual({'shop_order', 'auth_user', 'accounts_userprofile'}, large_tables(connection))
+        errors = [finding for finding in check_migrations(connection, include_applied=True) if finding.level == 'error']
+        self.assertEqual(errors, [])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'CREATE INDEX CONCURRENTLY needs PostgreSQL')
+class ConcurrentMigrationTests(TransactionTestCase):
+    def setUp(self):
+        self.state = MigrationExecutor(connection).loader.project_state()
+
+    def index_valid(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+                'WHERE pg_class.relname = %s', [name],
+            )
+            row = cursor.fetchone()
+        return row and row[0]
+
+    def test_add_index_concurrently(self):
+        operation = AddIndexConcurrently('order', models.Index(fields=['first_name'], name='shop_order_test_idx'))
+        new_state = self.state.clone()
+        operation.state_forwards('shop', new_state)
+        with self.assertRaises(NotSupportedError), transaction.atomic():
+            with connection.schema_editor() as editor:
+                operation.database_forwards('shop', editor, self.state, new_state)
+
+        with connection.schema_editor(atomic=False) as editor:
+            operation.database_forwards('shop', editor, self.state, new_state)
+        self.assertTrue(self.index_valid('shop_order_test_idx'))
+        with connection.schema_editor(atomic=False) as editor:
+            operation.database_backwards('shop', editor, new_state, self.state)
+        self.assertIsNone(self.index_valid('shop_order_test_idx'))
+
+    def test_backfill_in_batches(self):
+        user = User.objects.create_user('donor')
+        for phone in ('050-1234567', '052-7654321', '+972-54-1112222'):
+            Order.objects.create(
+                user=user, first_name='דנה', last_name='לוי', email='Dana@Example.com', phone=phone, total_amount=Decimal(10)
+            )
+        Order.objects.update(phone_normalized='', email_normalized='', name_normalized='')
+        normalize_contact = importlib.import_module('shop.migrations.0015_contact_lookup_backfill').normalize_contact
+        batches = []
+
+        def update(orders):
+            batches.append(orders.count())
+            normalize_contact(orders)
+
+        operation = Backfill('order', update, batch_size=2, pause=0)
+        with connection.schema_editor(atomic=False) as editor:
+            operation.database_forwards('shop', editor, self.state, self.state)
+        self.assertEqual(batches, [2, 1])
+        self.assertEqual(
+            sorted(Order.objects.values_list('phone_normalized', flat=True)), ['0501234567', '0527654321', '0541112222']
+        )
+        self.assertEqual(set(Order.objects.values_list('email_normalized', 'name_normalized')), {('dana@example.com', 'דנה לוי')})
@@ -3,9 +3,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+from .warmup import warmup_view
+
 urlpatterns = [
+    path('_warmup/', warmup_view, name='warmup'),
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
+    path('api/v1/', include('shop.api_urls')),
+    path('campaigns/', include('campaigns.urls')),
     path('', include('shop.urls')),
 ]
 
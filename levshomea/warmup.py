@@ -0,0 +1,110 @@
+"""
+Warm a fresh process up before it takes traffic.
+
+On Cloud Run every new instance pays for loading the URLconf (and the
+views/API modules it imports), the first DB connection, template
+compilation and empty caches on its first request. warmup() does that work
+up front; it runs from gunicorn's post_worker_init hook (gunicorn.conf.py)
+and is also exposed at /_warmup/ for startup probes, which must send
+"Authorization: Bearer <WARMUP_TOKEN>". Once a warmup has succeeded, the
+endpoint returns its report without running it again.
+"""
+import logging
+import secrets
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponseForbidden, JsonResponse
+from django.template import engines
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# report of the last warmup of this process that succeeded
+_last_report = None
+
+
+def load_urlconf():
+    """Import the URLconf and every view module it references"""
+    return len(get_resolver().url_patterns)
+
+
+def open_db_connection():
+    """
+    Connect and run a trivial query.
+
+    Connections are per thread, so this mainly surfaces DB problems before
+    traffic arrives; request threads then keep their own connection open
+    for CONN_MAX_AGE.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return connection.vendor
+
+
+def compile_templates():
+    """Compile the project templates into the cached template loader"""
+    engine = engines['django']
+    compiled = 0
+    for directory in engine.engine.dirs:
+        directory = Path(directory)
+        for path in directory.rglob('*.html'):
+            engine.get_template(path.relative_to(directory).as_posix())
+            compiled += 1
+    return compiled
+
+
+def prime_caches():
+    """Run the callables listed in settings.WARMUP_CACHE_PRIMERS"""
+    for dotted_path in settings.WARMUP_CACHE_PRIMERS:
+        import_string(dotted_path)()
+    return len(settings.WARMUP_CACHE_PRIMERS)
+
+
+STEPS = [
+    ('urlconf', load_urlconf),
+    ('db', open_db_connection),
+    ('templates', compile_templates),
+    ('caches', prime_caches),
+]
+
+
+def warmup():
+    """Run every warmup step; a failing step is reported, not raised"""
+    global _last_report
+    report = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            result = step()
+            ok = True
+        except Exception as e:
+            logger.warning('warmup step %s failed: %s', name, e)
+            result, ok = str(e), False
+        report[name] = {
+            'ok': ok,
+            'result': result,
+            'ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+    if all(step['ok'] for step in report.values()):
+        _last_report = report
+    return report
+
+
+def warmup_view(request):
+    """
+    GET /_warmup/ - run the warmup (once per process) and return the step timings.
+
+    Open to staff sessions and to "Authorization: Bearer <WARMUP_TOKEN>";
+    anyone else could use it to make every instance redo the work.
+    """
+    token = settings.WARMUP_TOKEN
+    header = request.headers.get('Authorization', '')
+    if not (token and secrets.compare_digest(header, f'Bearer {token}')) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    report = _last_report or warmup()
+    status = 200 if all(step['ok'] for step in report.values()) else 503
+    return JsonResponse(report, status=status)
@@ -1,20 +1,36 @@
 # shop/admin.py
-from django.contrib import admin
-from .models import Category, Product, CartItem, Order, OrderItem, Marketer, Event, Kashrut
+from django.contrib import admin, messages
+from django.utils.html import format_html
+from django.shortcuts import redirect
+from django.urls import reverse
+from .inventory import record
+from .lookup import order_filter
+from .models import Category, Product, CartItem, Order, OrderItem, Marketer, Event, Kashrut, Promotion, StockMovement, DonationReceipt, SlowQuery
 
 @admin.register(Marketer)
 class MarketerAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
-    search_fields = ['first_name', 'last_name']
+    # חיפוש לפי תחילית - נתמך באינדקסים (migrations/0007_prefix_search_indexes.py)
+    search_fields = ['^first_name', '^last_name', '^phone']
+    ordering = ['first_name', 'last_name']
     list_editable = ['is_active']
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
-    search_fields = ['name']
+    search_fields = ['^name']
+    ordering = ['name']
     list_editable = ['is_active']
+    actions = ['download_fulfillment']
+
+    @admin.action(description='הורדת הזמנות רכש ורשימות ליקוט')
+    def download_fulfillment(self, request, queryset):
+        if len(queryset) != 1:
+            self.message_user(request, 'יש לבחור אירוע אחד', messages.WARNING)
+            return None
+        return redirect(reverse('shop:fulfillment_documents', args=[queryset[0].pk]))
 
 @admin.register(Kashrut)
 class KashrutAdmin(admin.ModelAdmin):
@@ -27,48 +43,175 @@ class KashrutAdmin(admin.ModelAdmin):
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
-    search_fields = ['name']
+    search_fields = ['^name']
+    ordering = ['name']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active']
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'kashrut', 'supplier', 'price', 'stock', 'is_active', 'total_orders', 'created_at']
+    list_display = ['name', 'sku', 'category', 'kashrut', 'supplier', 'price', 'stock', 'on_hand', 'is_active', 'total_orders', 'created_at']
     list_filter = ['is_active', 'category', 'kashrut', 'created_at', 'unlimited_stock']
-    search_fields = ['name', 'supplier']
+    search_fields = ['^name', '^supplier', '=sku']
+    ordering = ['name']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active', 'price', 'stock']
-    readonly_fields = ['total_orders']
+    readonly_fields = ['total_orders', 'popularity', 'on_hand']
     
     fieldsets = (
         ('מידע בסיסי', {
-            'fields': ('name', 'slug', 'description')
+            'fields': ('name', 'slug', 'sku', 'description')
         }),
         ('קטגוריזציה', {
             'fields': ('category', 'kashrut', 'supplier')
         }),
         ('מחיר ומלאי', {
-            'fields': ('price', 'unlimited_stock', 'stock')
+            'fields': ('price', 'unlimited_stock', 'stock', 'on_hand'),
+            'description': 'שינוי המלאי נרשם כתנועת מלאי (תיקון) בגובה ההפרש'
         }),
         ('מידע נוסף', {
-            'fields': ('image', 'is_active', 'total_orders')
+            'fields': ('image', 'is_active', 'total_orders', 'popularity')
+        }),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_on_hand()
+    
+    @admin.display(description='מלאי בפועל')
+    def on_hand(self, obj):
+        return obj.on_hand
+    
+    def save_model(self, request, obj, form, change):
+        # עריכת המלאי הופכת לתנועת תיקון; עמודת stock מתעדכנת רק בקיפול
+        delta = 0
+        if change and 'stock' in form.changed_data:
+            delta = obj.stock - form.initial['stock']
+            obj.stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=obj.pk)
+        super().save_model(request, obj, form, change)
+        if delta:
+            record(obj, 'adjustment', delta, user=request.user, note='עריכה בממשק הניהול')
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'product', 'kind', 'quantity', 'order', 'user', 'note', 'compacted']
+    list_filter = ['kind', 'compacted', 'created_at']
+    search_fields = ['product__name', 'order__order_number', 'note']
+    list_select_related = ['product', 'order', 'user']
+    fields = ['product', 'kind', 'quantity', 'note']
+    autocomplete_fields = ['product']
+    
+    # יומן בלבד - תנועה שגויה מתקנים בתנועה נגדית
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        obj.user = request.user
+        super().save_model(request, obj, form, change)
+
+@admin.register(DonationReceipt)
+class DonationReceiptAdmin(admin.ModelAdmin):
+    list_display = ['number', 'kind', 'donor_name', 'amount', 'year', 'order', 'created_at']
+    list_filter = ['kind', 'year']
+    search_fields = ['=number', '^donor_name', 'order__order_number']
+    list_select_related = ['order']
+    ordering = ['-number']
+    
+    # קבלות מופקות רק ב-issue_receipts ולא נמחקות (מספור רץ)
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'duration_ms', 'view', 'location', 'short_sql', 'has_plan']
+    list_filter = ['view', 'created_at']
+    search_fields = ['=fingerprint', 'sql', 'view', 'location', '=request_id']
+    fields = ['created_at', 'duration_ms', 'view', 'location', 'request_id', 'fingerprint', 'sql_display', 'params', 'plan_display']
+    readonly_fields = fields
+    
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    
+    @admin.display(description='תוכנית', boolean=True)
+    def has_plan(self, obj):
+        return bool(obj.plan)
+    
+    @admin.display(description='SQL')
+    def sql_display(self, obj):
+        return format_html('<pre style="white-space: pre-wrap" dir="ltr">{}</pre>', obj.sql)
+    
+    @admin.display(description='תוכנית ביצוע')
+    def plan_display(self, obj):
+        return format_html('<pre dir="ltr">{}</pre>', obj.plan) if obj.plan else '-'
+    
+    # נאסף אוטומטית (shop/slow_queries.py); מחיקה מותרת לניקוי
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'percent_off', 'amount_off', 'min_quantity', 'product', 'category', 'event', 'marketer', 'code', 'is_active', 'starts_at', 'ends_at']
+    list_filter = ['kind', 'is_active', 'event', 'marketer']
+    search_fields = ['name', 'code']
+    list_editable = ['is_active']
+    autocomplete_fields = ['product', 'category', 'event', 'marketer']
+    
+    fieldsets = (
+        ('מבצע', {
+            'fields': ('name', 'kind', 'is_active')
+        }),
+        ('גובה ההנחה', {
+            'fields': ('percent_off', 'amount_off'),
+            'description': 'אחוז מסכום השורה, או סכום קבוע ליחידה'
+        }),
+        ('תנאים', {
+            'fields': ('min_quantity', 'product', 'category', 'event', 'marketer', 'code')
+        }),
+        ('תוקף', {
+            'fields': ('starts_at', 'ends_at')
         }),
     )
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
-    readonly_fields = ['product', 'quantity', 'price']
+    readonly_fields = ['product', 'quantity', 'price', 'discount_amount', 'promotion_name']
     extra = 0
+    
+    # המוצר לקריאה בלבד - טוענים אותו יחד עם השורות במקום שאילתה לכל שורה
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'first_name', 'last_name', 'email', 'total_amount', 'status', 'payment_status', 'marketer', 'event', 'created_at']
     list_filter = ['status', 'payment_status', 'marketer', 'event', 'created_at', 'updated_at']
-    search_fields = ['order_number', 'first_name', 'last_name', 'email']
-    readonly_fields = ['order_number', 'total_amount', 'total_items', 'created_at', 'updated_at']
+    # מציג את תיבת החיפוש; החיפוש עצמו ב-get_search_results (שם פרטי ומשפחה דרך name_normalized)
+    search_fields = ['order_number', 'first_name', 'last_name', 'email', 'phone']
+    autocomplete_fields = ['user', 'marketer', 'event']
+    list_select_related = ['marketer', 'event']
+    readonly_fields = ['order_number', 'subtotal_amount', 'discount_amount', 'coupon_code', 'total_amount', 'total_items', 'created_at', 'updated_at']
     list_editable = ['status', 'payment_status']
     inlines = [OrderItemInline]
     
+    def get_search_results(self, request, queryset, search_term):
+        # החיפוש עובר לעמודות המנורמלות והאינדקסים של shop/lookup.py
+        if not search_term.strip():
+            return queryset, False
+        condition = order_filter(search_term)
+        return (queryset.filter(condition) if condition is not None else queryset.none()), False
+    
     fieldsets = (
         ('מידע הזמנה', {
             'fields': ('order_number', 'user', 'status', 'payment_status')
@@ -84,7 +227,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('marketer', 'event')
         }),
         ('סיכום הזמנה', {
-            'fields': ('total_amount', 'total_items')
+            'fields': ('subtotal_amount', 'discount_amount', 'coupon_code', 'total_amount', 'total_items')
         }),
         ('תאריכים', {
             'fields': ('created_at', 'updated_at'),
@@ -96,7 +239,9 @@ class OrderAdmin(admin.ModelAdmin):
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'quantity', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['user__username', 'product__name']
+    search_fields = ['^user__username', '^product__name']
+    autocomplete_fields = ['user', 'product']
+    list_select_related = ['user', 'product']
 
 # OrderItem רק יופיע כ-inline, לא צריך admin נפרד
 # אבל אם תרצה, אפשר להוסיף:
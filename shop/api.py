@@ -0,0 +1,311 @@
+# shop/api.py
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Prefetch, Subquery
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics, permissions, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Product, CartItem, Order, OrderItem, StockMovement
+from .barcodes import lookup, scan_to_cart
+from .marketers import marketer_for_user
+from levshomea.metrics import CART_ADDS, STOCK_OUTS
+from .lookup import search_orders
+from .orders import place_bulk_orders, place_order
+from .serializers import (
+    ProductSerializer, CartItemSerializer, OrderSerializer, CheckoutSerializer,
+    OrderLookupSerializer, PosBatchSerializer, PosOrderSerializer, ScanSerializer,
+)
+
+
+class CreatedCursorPagination(CursorPagination):
+    """Stable cursor pagination, newest first"""
+    page_size = 24
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-id')
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified for GET requests based on an updated_at column.
+
+    The validators come from one aggregate query, so a 304 costs a single
+    query and no serialization. The ETag also covers the query string
+    (cursor, fields) and the user, since those change the body.
+    """
+
+    def get_validators(self):
+        """Return (last_modified datetime or None, version string)"""
+        aggregate = self.filter_queryset(self.get_queryset()).aggregate(
+            last_modified=Max('updated_at'), count=Count('pk')
+        )
+        return aggregate['last_modified'], f'{aggregate["last_modified"]}:{aggregate["count"]}'
+
+    def get(self, request, *args, **kwargs):
+        last_modified, version = self.get_validators()
+        key = f'{version}:{request.get_full_path()}:{request.user.pk}'
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class StockVersionMixin:
+    """
+    Sales are stock movements and do not touch Product.updated_at, so the
+    product ETags also carry the latest movement id.
+    """
+
+    def get_validators(self):
+        last_modified, version = super().get_validators()
+        last_movement = StockMovement.objects.aggregate(last=Max('pk'))['last']
+        return last_modified, f'{version}:{last_movement}'
+
+
+class ProductListView(StockVersionMixin, ConditionalGetMixin, generics.ListAPIView):
+    """GET /api/v1/products/?category=<slug>&fields=id,name,price"""
+    serializer_class = ProductSerializer
+    pagination_class = CreatedCursorPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        return Product.objects.filter(is_active=True).select_related('category', 'kashrut').with_on_hand()
+
+    def filter_queryset(self, queryset):
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category__slug=category)
+        return queryset
+
+
+class ProductDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """GET /api/v1/products/<id>/"""
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        return Product.objects.filter(is_active=True).select_related('category', 'kashrut').with_on_hand()
+
+    def get_validators(self):
+        """The product's updated_at and its latest stock movement, so a sale changes the ETag"""
+        last_movement = StockMovement.objects.filter(product=OuterRef('pk')).order_by('-pk')
+        product = get_object_or_404(
+            Product.objects.filter(is_active=True).annotate(
+                last_movement=Subquery(last_movement.values('pk')[:1]),
+                last_moved=Subquery(last_movement.values('created_at')[:1]),
+            ).values('updated_at', 'last_movement', 'last_moved'),
+            pk=self.kwargs['pk'],
+        )
+        last_modified = max(filter(None, (product['updated_at'], product['last_moved'])))
+        return last_modified, f'{product["updated_at"]}:{product["last_movement"]}'
+
+
+class CartItemListView(generics.ListCreateAPIView):
+    """GET/POST /api/v1/cart/ - adding an existing product adds to its quantity"""
+    serializer_class = CartItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return CartItem.objects.filter(user=self.request.user).select_related('product')
+
+    def list(self, request, *args, **kwargs):
+        cart_items = list(self.get_queryset())
+        total = sum(item.get_total_price() for item in cart_items)
+        return Response({
+            'items': self.get_serializer(cart_items, many=True).data,
+            'total': str(total),
+        })
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data['quantity']
+
+        cart_item, created = CartItem.objects.get_or_create(
+            user=request.user, product=product, defaults={'quantity': quantity}
+        )
+        if not created:
+            if cart_item.quantity + quantity > product.on_hand:
+                CART_ADDS.labels('out_of_stock').inc()
+                STOCK_OUTS.labels('cart').inc()
+                return Response({'detail': 'אין מספיק מלאי'}, status=status.HTTP_400_BAD_REQUEST)
+            cart_item.quantity += quantity
+            cart_item.save(update_fields=['quantity'])
+        CART_ADDS.labels('added').inc()
+
+        return Response(
+            self.get_serializer(cart_item).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """GET/PATCH/DELETE /api/v1/cart/<id>/"""
+    serializer_class = CartItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return CartItem.objects.filter(user=self.request.user).select_related('product')
+
+
+class CheckoutView(APIView):
+    """POST /api/v1/checkout/ - create an order from the cart"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = place_order(
+                request.user, serializer.validated_data,
+                coupon_code=serializer.validated_data.get('coupon_code', ''),
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        order = _order_queryset().get(pk=order.pk)
+        return Response(
+            OrderSerializer(order, context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class ScanView(APIView):
+    """
+    GET /api/v1/scan/<code>/ - the product with this SKU/barcode (no query).
+    POST /api/v1/scan/<code>/ {"quantity": n} - add it to the cart (one query when already in the cart).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_product(self, code):
+        product = lookup(code)
+        if product is None:
+            raise Http404('No Product matches the given query.')
+        return product
+
+    def get(self, request, code):
+        return Response(self.get_product(code))
+
+    def post(self, request, code):
+        product = self.get_product(code)
+        serializer = ScanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = scan_to_cart(request.user, product['id'], serializer.validated_data['quantity'])
+        return Response(
+            {'product': product, 'quantity': serializer.validated_data['quantity']},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+def _order_queryset():
+    return Order.objects.select_related('marketer', 'event').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+
+
+class OrderListView(ConditionalGetMixin, generics.ListAPIView):
+    """GET /api/v1/orders/ - the user's order history"""
+    serializer_class = OrderSerializer
+    pagination_class = CreatedCursorPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return _order_queryset().donated_by(self.request.user)
+
+
+class OrderDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """GET /api/v1/orders/<order_number>/"""
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'order_number'
+
+    def get_queryset(self):
+        return _order_queryset().donated_by(self.request.user)
+
+    def get_validators(self):
+        updated_at = get_object_or_404(
+            Order.objects.donated_by(self.request.user).values_list('updated_at', flat=True),
+            order_number=self.kwargs['order_number'],
+        )
+        return updated_at, str(updated_at)
+
+
+class OrderLookupView(APIView):
+    """GET /api/v1/staff/order-lookup/?q=<phone | email | name | order number> - newest matching orders"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        orders = search_orders(request.query_params.get('q', ''))
+        return Response(OrderLookupSerializer(orders, many=True).data)
+
+
+class IsMarketer(permissions.BasePermission):
+    """Staff, or a login linked to an active marketer"""
+
+    def has_permission(self, request, view):
+        return request.user.is_staff or marketer_for_user(request.user) is not None
+
+
+class PosOrderBatchView(APIView):
+    """
+    POST /api/v1/pos/orders/ - bulk order entry for marketers at events.
+
+    {"event": id, "orders": [{"first_name": ..., "phone": ..., "items": [{"product": id, "quantity": n}]}]}
+
+    Staff may also pass "marketer"; everyone else sells as their own
+    marketer. Returns one result per order, in order; valid orders are
+    created even when others in the batch fail.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsMarketer]
+
+    def post(self, request):
+        batch = PosBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        marketer = marketer_for_user(request.user)
+        if request.user.is_staff and batch.validated_data.get('marketer'):
+            marketer = batch.validated_data['marketer']
+
+        results = [None] * len(batch.validated_data['orders'])
+        valid = []
+        for index, data in enumerate(batch.validated_data['orders']):
+            serializer = PosOrderSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'ok': False, 'errors': serializer.errors}
+
+        placed = place_bulk_orders(
+            [data for _, data in valid],
+            event=batch.validated_data.get('event'), marketer=marketer,
+        )
+        for (index, _), (order, error) in zip(valid, placed):
+            if order is None:
+                results[index] = {'index': index, 'ok': False, 'errors': {'detail': error}}
+            else:
+                results[index] = {
+                    'index': index, 'ok': True,
+                    'order_number': order.order_number, 'total_amount': str(order.total_amount),
+                }
+
+        created = sum(result['ok'] for result in results)
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
@@ -0,0 +1,17 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('products/', api.ProductListView.as_view(), name='product_list'),
+    path('products/<int:pk>/', api.ProductDetailView.as_view(), name='product_detail'),
+    path('cart/', api.CartItemListView.as_view(), name='cart'),
+    path('cart/<int:pk>/', api.CartItemDetailView.as_view(), name='cart_item'),
+    path('scan/<str:code>/', api.ScanView.as_view(), name='scan'),
+    path('checkout/', api.CheckoutView.as_view(), name='checkout'),
+    path('orders/', api.OrderListView.as_view(), name='order_list'),
+    path('orders/<str:order_number>/', api.OrderDetailView.as_view(), name='order_detail'),
+    path('pos/orders/', api.PosOrderBatchView.as_view(), name='pos_orders'),
+    path('staff/order-lookup/', api.OrderLookupView.as_view(), name='order_lookup'),
+]
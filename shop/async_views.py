@@ -0,0 +1,115 @@
+# shop/async_views.py
+"""
+Async versions of the read-heavy storefront views.
+
+Used instead of the matching views in shop/views.py when ASYNC_VIEWS is on
+(the default under SERVER_MODE=asgi, see gunicorn.conf.py). All queries go
+through Django's async ORM, and everything the templates touch is loaded
+before render(), since templates can't await.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import Prefetch
+from django.http import Http404
+from django.shortcuts import render
+
+from .context_processors import acart_count
+from .marketers import marketer_for_user
+from .recommendations import related_products
+from .models import Product, Category, CartItem, DonationReceipt, Order
+
+
+def _load_user(request):
+    # Touching the lazy user loads the session and the user row
+    request.user.is_authenticated
+    return request.user
+
+
+async def aget_user(request):
+    """Resolve request.user without blocking the event loop"""
+    return await sync_to_async(_load_user)(request)
+
+
+async def _prepare(request):
+    """Load the user and the cart count used by base.html"""
+    user = await aget_user(request)
+    request.cart_count = await acart_count(user) if user.is_authenticated else 0
+    return user
+
+
+def async_login_required(view):
+    """login_required for async views (Django 4.2's decorator is sync only)"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def product_list(request):
+    await _prepare(request)
+    products = [
+        product async for product in Product.objects.filter(is_active=True).with_on_hand()
+    ]
+    categories = await sync_to_async(Category.objects.active)()
+
+    return render(request, 'shop/product_list.html', {
+        'products': products,
+        'categories': categories,
+    })
+
+
+async def product_detail(request, id, slug):
+    await _prepare(request)
+    try:
+        product = await Product.objects.with_on_hand().aget(id=id, slug=slug, is_active=True)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    return render(request, 'shop/product_detail.html', {
+        'product': product,
+        'related_products': await sync_to_async(related_products)(product),
+    })
+
+
+@async_login_required
+async def cart_detail(request):
+    user = await _prepare(request)
+    # on_hand for the quantity limits; prefetch_related is not supported with async iteration in Django 4.2
+    cart_items = await sync_to_async(list)(
+        CartItem.objects.filter(user=user).prefetch_related(
+            Prefetch('product', queryset=Product.objects.with_on_hand())
+        )
+    )
+    total = sum(item.quantity * item.product.price for item in cart_items)
+    return render(request, 'shop/cart_detail.html', {
+        'cart_items': cart_items,
+        'total': total
+    })
+
+
+@async_login_required
+async def user_profile(request):
+    """Display user profile with order history"""
+    user = await _prepare(request)
+    # prefetch_related is not supported with async iteration in Django 4.2
+    orders = await sync_to_async(list)(
+        Order.objects.donated_by(user).prefetch_related('items__product').order_by('-created_at')
+    )
+
+    # Calculate total donations for stats
+    total_amount = sum(order.total_amount for order in orders)
+
+    context = {
+        'orders': orders,
+        'total_donations': total_amount,
+        'marketer': await sync_to_async(marketer_for_user)(user),
+        'receipts': [
+            receipt async for receipt in
+            DonationReceipt.objects.filter(user=user).only('number', 'kind', 'year', 'amount', 'created_at')
+        ],
+    }
+    return render(request, 'shop/user_profile.html', context)
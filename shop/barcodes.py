@@ -0,0 +1,49 @@
+# shop/barcodes.py
+"""
+SKU / barcode lookups for scanner checkout.
+
+sku_map() is the whole active catalog as {code: product data}, held in the
+two-tier reference cache (shop/cache.py) and rebuilt when a product is
+saved or deleted (shop/signals.py). A scan is then a dict lookup; adding
+the scanned product to a cart is one UPDATE when the line already exists
+and one INSERT when it doesn't.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .cache import cached
+from .models import CartItem, Product, normalize_code
+
+
+def sku_map():
+    """{sku: {'id', 'name', 'price', 'unlimited_stock'}} of the active products (cached)"""
+    return cached(Product, 'sku_map', lambda: {
+        sku: {'id': pk, 'name': name, 'price': str(price), 'unlimited_stock': unlimited_stock}
+        for sku, pk, name, price, unlimited_stock in Product.objects.filter(
+            is_active=True, sku__isnull=False
+        ).values_list('sku', 'id', 'name', 'price', 'unlimited_stock')
+    })
+
+
+def lookup(code):
+    """Product data for a scanned code, or None"""
+    return sku_map().get(normalize_code(code))
+
+
+def scan_to_cart(user, product_id, quantity=1):
+    """
+    Add quantity of a product to the user's cart; returns True if a new line was created.
+
+    Stock is not checked here - place_order() checks it at checkout.
+    """
+    lines = CartItem.objects.filter(user=user, product_id=product_id)
+    if lines.update(quantity=F('quantity') + quantity):
+        return False
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(user=user, product_id=product_id, quantity=quantity)
+        return True
+    except IntegrityError:
+        # a concurrent scan created the line first
+        lines.update(quantity=F('quantity') + quantity)
+        return False
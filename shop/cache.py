@@ -0,0 +1,139 @@
+# shop/cache.py
+"""
+Two-tier cache for the small reference tables (Category, Kashrut, Event, Marketer).
+
+Tier 1 is a per-process LRU, tier 2 the shared Django cache (CACHES). Every
+model has a version number in the shared cache; saving or deleting a row
+bumps it (see shop/signals.py), which makes all cached entries for that
+model stale at once. A process trusts its local copy for
+REFERENCE_CACHE_LOCAL_TTL seconds before checking the version again, so
+most lookups cost neither a query nor a cache round trip. After that it
+keeps the copy only while the version is unchanged and the tier 2 entry it
+came from still exists, and never longer than REFERENCE_CACHE_TIMEOUT.
+
+Works with any cache backend (locmem, file, db, redis). With locmem each
+process has its own tier 2 and its own versions, so a change made in
+another process shows up only when the entries expire: at most twice
+REFERENCE_CACHE_TIMEOUT, which defaults to 30 seconds there.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+
+class LocalLRU:
+    """Thread-safe LRU of key -> (version, value, checked_at, stored_at)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, version, value, stored_at=None):
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = (version, value, now, now if stored_at is None else stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRU(settings.REFERENCE_CACHE_LOCAL_SIZE)
+
+
+def _prefix(model):
+    return f'refdata:{model._meta.label_lower}:'
+
+
+def _version_key(model):
+    return _prefix(model) + 'version'
+
+
+def get_version(model):
+    version = cache.get(_version_key(model))
+    if version is None:
+        # add() so concurrent first readers agree on the starting version
+        cache.add(_version_key(model), 1, None)
+        version = cache.get(_version_key(model), 1)
+    return version
+
+
+def invalidate(model):
+    """Make every cached entry of this model stale, here and in other processes"""
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.add(_version_key(model), 2, None)
+    local_cache.discard_prefix(_prefix(model))
+
+
+def cached(model, name, builder):
+    """Return builder() for this model, from the local LRU, the shared cache or the DB"""
+    key = _prefix(model) + name
+    entry = local_cache.get(key)
+    if entry is not None:
+        version, value, checked_at, stored_at = entry
+        now = time.monotonic()
+        if now - stored_at < settings.REFERENCE_CACHE_TIMEOUT:
+            if now - checked_at < settings.REFERENCE_CACHE_LOCAL_TTL:
+                return value
+            # one round trip for both: the version, and whether the shared copy has expired
+            current = cache.get_many([_version_key(model), f'{key}:v{version}'])
+            if current.get(_version_key(model)) == version and f'{key}:v{version}' in current:
+                local_cache.set(key, version, value, stored_at)
+                return value
+
+    version = get_version(model)
+    shared_key = f'{key}:v{version}'
+    value = cache.get(shared_key)
+    if value is None:
+        value = builder()
+        cache.set(shared_key, value, settings.REFERENCE_CACHE_TIMEOUT)
+    local_cache.set(key, version, value)
+    return value
+
+
+class ReferenceManager(models.Manager):
+    """Manager for reference tables with cached listings"""
+
+    def active(self):
+        """Active rows, in default order (cached list)"""
+        return cached(self.model, 'active', lambda: list(self.filter(is_active=True)))
+
+    def id_map(self):
+        """All rows, active or not, as {id: object} (cached dict)"""
+        return cached(self.model, 'id_map', lambda: {obj.pk: obj for obj in self.all()})
+
+    def get_cached(self, pk):
+        """Row by id from id_map(), or None"""
+        return self.id_map().get(pk)
+
+
+def prime_reference_data():
+    """Fill the cache for all reference tables (used by warmup)"""
+    from .models import Category, Event, Kashrut, Marketer
+
+    for model in (Category, Event, Kashrut, Marketer):
+        model.objects.active()
+        model.objects.id_map()
+
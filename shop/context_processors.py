@@ -1,10 +1,28 @@
+from .models import CartItem
+
+
+def cart_count(user):
+    """Number of items in the user's cart"""
+    return CartItem.objects.filter(user=user).count()
+
+
+async def acart_count(user):
+    """Async version of cart_count for async views"""
+    return await CartItem.objects.filter(user=user).acount()
+
+
 def cart_context(request):
     """Simple context processor for cart count"""
-    cart_count = 0
+    # Async views look the count up before rendering (see shop.async_views),
+    # since a context processor can't await the ORM.
+    precomputed = getattr(request, 'cart_count', None)
+    if precomputed is not None:
+        return {'cart_count': precomputed}
+
+    count = 0
     if hasattr(request, 'user') and request.user.is_authenticated:
         try:
-            from .models import CartItem
-            cart_count = CartItem.objects.filter(user=request.user).count()
-        except:
-            cart_count = 0
-    return {'cart_count': cart_count}
\ No newline at end of file
+            count = cart_count(request.user)
+        except Exception:
+            count = 0
+    return {'cart_count': count}
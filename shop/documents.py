@@ -0,0 +1,75 @@
+# shop/documents.py
+"""
+Renders tabular documents (CSV, printable HTML) from plain data.
+
+Nothing here imports Django, so process pool workers (shop/fulfillment.py)
+start without setting it up, whatever the multiprocessing start method.
+A document is a dict: filename, title, subtitle, columns and rows (lists of
+str/int/Decimal).
+"""
+import csv
+import html
+import io
+
+HTML_PAGE = """<!DOCTYPE html>
+<html lang="he" dir="rtl">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 20px; }}
+table {{ width: 100%; border-collapse: collapse; }}
+th, td {{ border: 1px solid #999; padding: 4px 8px; text-align: right; }}
+th {{ background: #eee; }}
+tfoot td {{ font-weight: bold; }}
+@media print {{ thead {{ display: table-header-group; }} }}
+</style>
+</head>
+<body>
+<h2>{title}</h2>
+<p>{subtitle}</p>
+<table>
+<thead><tr>{head}</tr></thead>
+<tbody>
+{body}
+</tbody>
+<tfoot><tr>{foot}</tr></tfoot>
+</table>
+</body>
+</html>
+"""
+
+
+def render_csv(document):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(document['columns'])
+    writer.writerows(document['rows'])
+    # BOM so Excel opens the Hebrew as UTF-8
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def render_html(document):
+    def cells(values, tag='td'):
+        return ''.join(f'<{tag}>{html.escape(str(value))}</{tag}>' for value in values)
+
+    totals = document.get('totals') or []
+    return HTML_PAGE.format(
+        title=html.escape(document['title']),
+        subtitle=html.escape(document.get('subtitle', '')),
+        head=cells(document['columns'], 'th'),
+        body='\n'.join(f'<tr>{cells(row)}</tr>' for row in document['rows']),
+        foot=cells(totals),
+    ).encode('utf-8')
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'html': render_html,
+}
+
+
+def render(document):
+    """(filename, bytes) - the document in the format of its filename extension"""
+    filename = document['filename']
+    return filename, RENDERERS[filename.rsplit('.', 1)[1]](document)
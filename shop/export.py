@@ -0,0 +1,269 @@
+# shop/export.py
+"""
+Incremental analytics export to Parquet, so analysts scan local files
+instead of the production database.
+
+Layout under ANALYTICS_EXPORT_DIR:
+
+    orders/day=YYYY-MM-DD/part-<run>-<n>.parquet
+    order_items/day=YYYY-MM-DD/part-<run>-<n>.parquet
+    dimensions/{products,marketers,events}.parquet
+
+Partitions are by the order's created_at date (Hive style, so pyarrow,
+DuckDB, pandas and Spark read the day as a column). Orders are exported by
+a high-water mark on updated_at (JobState 'export:orders'), so an order
+that changes after its export appears again in a later part file - readers
+keep the row with the latest updated_at per id. Order items never change
+and are exported by id (JobState 'export:order_items'). The small
+dimension tables are rewritten on every run.
+
+Rows are read with chunked server-side cursors (.iterator()) and written
+chunk by chunk; nothing holds a whole table in memory. Only rows older
+than EXPORT_LAG are exported, so transactions still in flight are picked
+up by the next run. Files are written to a temporary directory and moved
+into place before the high-water marks are saved, so a crashed run is
+simply repeated (a crash while moving can leave rows exported twice,
+which the keep-the-latest-row-per-id rule absorbs). A full run swaps its
+orders/ and order_items/ directories in whole and deletes the old ones
+only once the new ones are in place, so a crash keeps the old history.
+
+PII (names, email, phone, address) is not exported.
+"""
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Event, JobState, Marketer, Order, OrderItem, Product
+
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_LAG = timedelta(minutes=1)
+# partitions written to at once; the least recently used one is closed beyond this
+MAX_OPEN_WRITERS = 32
+
+MONEY = pa.decimal128(12, 2)
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+ORDER_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('order_number', pa.string()),
+    ('user_id', pa.int64()),
+    ('status', pa.string()),
+    ('payment_status', pa.string()),
+    ('subtotal_amount', MONEY),
+    ('discount_amount', MONEY),
+    ('total_amount', MONEY),
+    ('total_items', pa.int64()),
+    ('coupon_code', pa.string()),
+    ('city', pa.string()),
+    ('postal_code', pa.string()),
+    ('marketer_id', pa.int64()),
+    ('event_id', pa.int64()),
+    ('created_at', TIMESTAMP),
+    ('updated_at', TIMESTAMP),
+])
+
+ORDER_ITEM_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('order_id', pa.int64()),
+    ('product_id', pa.int64()),
+    ('quantity', pa.int64()),
+    ('price', MONEY),
+    ('discount_amount', MONEY),
+    ('promotion_name', pa.string()),
+    ('order_created_at', TIMESTAMP),
+])
+
+# name: (model, {column: (field lookup, type)})
+DIMENSIONS = {
+    'products': (Product, {
+        'id': ('pk', pa.int64()),
+        'name': ('name', pa.string()),
+        'sku': ('sku', pa.string()),
+        'category_id': ('category_id', pa.int64()),
+        'category': ('category__name', pa.string()),
+        'kashrut': ('kashrut__name', pa.string()),
+        'supplier': ('supplier', pa.string()),
+        'price': ('price', MONEY),
+        'unlimited_stock': ('unlimited_stock', pa.bool_()),
+        'is_active': ('is_active', pa.bool_()),
+        'total_orders': ('total_orders', pa.int64()),
+        'created_at': ('created_at', TIMESTAMP),
+    }),
+    'marketers': (Marketer, {
+        'id': ('pk', pa.int64()),
+        'first_name': ('first_name', pa.string()),
+        'last_name': ('last_name', pa.string()),
+        'is_active': ('is_active', pa.bool_()),
+        'created_at': ('created_at', TIMESTAMP),
+    }),
+    'events': (Event, {
+        'id': ('pk', pa.int64()),
+        'name': ('name', pa.string()),
+        'is_active': ('is_active', pa.bool_()),
+        'created_at': ('created_at', TIMESTAMP),
+    }),
+}
+
+
+class PartitionWriter:
+    """One ParquetWriter per day partition, at most MAX_OPEN_WRITERS open at once"""
+
+    def __init__(self, root, table, schema, run_id):
+        self.root = Path(root) / table
+        self.schema = schema
+        self.run_id = run_id
+        self.rows = 0
+        self._writers = {}
+        self._parts = 0
+
+    def write(self, day, rows):
+        writer = self._writers.pop(day, None)
+        if writer is None:
+            if len(self._writers) >= MAX_OPEN_WRITERS:
+                self._writers.pop(next(iter(self._writers))).close()
+            directory = self.root / f'day={day.isoformat()}'
+            directory.mkdir(parents=True, exist_ok=True)
+            self._parts += 1
+            writer = pq.ParquetWriter(directory / f'part-{self.run_id}-{self._parts}.parquet', self.schema)
+        self._writers[day] = writer  # most recently used last
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        self.rows += len(rows)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def _export_partitioned(rows, writer, created_at_index):
+    """Write rows (tuples in schema order) to the day partition of their created_at"""
+    local = timezone.get_current_timezone()
+    batch, pending = {}, 0
+    for row in rows:
+        day = row[created_at_index].astimezone(local).date()
+        batch.setdefault(day, []).append(row)
+        pending += 1
+        if pending >= EXPORT_CHUNK_SIZE:
+            for day, day_rows in batch.items():
+                writer.write(day, day_rows)
+            batch, pending = {}, 0
+    for day, day_rows in batch.items():
+        writer.write(day, day_rows)
+
+
+def export_orders(staging, run_id, since, until):
+    fields = [name if name != 'id' else 'pk' for name in ORDER_SCHEMA.names]
+    rows = (
+        Order.objects.filter(updated_at__lte=until, **({'updated_at__gt': since} if since else {}))
+        .order_by('updated_at').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    writer = PartitionWriter(staging, 'orders', ORDER_SCHEMA, run_id)
+    try:
+        _export_partitioned(rows, writer, ORDER_SCHEMA.names.index('created_at'))
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def export_order_items(staging, run_id, last_id, until):
+    """Returns (rows written, highest id written)"""
+    rows = (
+        OrderItem.objects.filter(pk__gt=last_id, order__created_at__lte=until).order_by('pk')
+        .values_list('pk', 'order_id', 'product_id', 'quantity', 'price', 'discount_amount', 'promotion_name', 'order__created_at')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    highest = last_id
+
+    def tracked():
+        nonlocal highest
+        for row in rows:
+            highest = row[0]
+            yield row
+
+    writer = PartitionWriter(staging, 'order_items', ORDER_ITEM_SCHEMA, run_id)
+    try:
+        _export_partitioned(tracked(), writer, ORDER_ITEM_SCHEMA.names.index('order_created_at'))
+    finally:
+        writer.close()
+    return writer.rows, highest
+
+
+def export_dimensions(staging):
+    directory = Path(staging) / 'dimensions'
+    directory.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for name, (model, columns) in DIMENSIONS.items():
+        schema = pa.schema([(column, type_) for column, (_, type_) in columns.items()])
+        rows = list(model.objects.order_by('pk').values_list(*[lookup for lookup, _ in columns.values()]))
+        arrays = list(zip(*rows)) or [[] for _ in columns]
+        pq.write_table(
+            pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(arrays, schema)], schema=schema),
+            directory / f'{name}.parquet',
+        )
+        counts[name] = len(rows)
+    return counts
+
+
+def _publish(staging, root):
+    """Move the staged files into root (dimensions replace the old files)"""
+    for path in sorted(Path(staging).rglob('*.parquet')):
+        target = Path(root) / path.relative_to(staging)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+
+def _replace_tables(staging, root, run_id):
+    """Swap the staged orders/order_items directories in whole; returns where the old ones went"""
+    old = Path(root) / f'.replaced-{run_id}'
+    for table in ('orders', 'order_items'):
+        (Path(staging) / table).mkdir(parents=True, exist_ok=True)
+        if (Path(root) / table).exists():
+            old.mkdir(parents=True, exist_ok=True)
+            os.replace(Path(root) / table, old / table)
+        os.replace(Path(staging) / table, Path(root) / table)
+    return old
+
+
+def run(root=None, full=False):
+    """Export everything new since the last run; returns {table: rows}"""
+    root = Path(root or settings.ANALYTICS_EXPORT_DIR)
+    run_id = timezone.now().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+    staging = root / f'.staging-{run_id}'
+    until = timezone.now() - EXPORT_LAG
+
+    orders_state, _ = JobState.objects.get_or_create(name='export:orders')
+    items_state, _ = JobState.objects.get_or_create(name='export:order_items')
+    if full:
+        orders_state.last_timestamp, items_state.last_id = None, 0
+
+    replaced = None
+    try:
+        counts = {'orders': export_orders(staging, run_id, orders_state.last_timestamp, until)}
+        counts['order_items'], last_item_id = export_order_items(staging, run_id, items_state.last_id, until)
+        counts.update(export_dimensions(staging))
+        if full:
+            replaced = _replace_tables(staging, root, run_id)
+        _publish(staging, root)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    with transaction.atomic():
+        orders_state.last_timestamp = until
+        orders_state.save(update_fields=['last_timestamp', 'updated_at'])
+        items_state.last_id = last_item_id
+        items_state.save(update_fields=['last_id', 'updated_at'])
+    if replaced:
+        shutil.rmtree(replaced, ignore_errors=True)
+    return counts
@@ -0,0 +1,146 @@
+# shop/forecasting.py
+"""
+Demand forecasting and restock suggestions for finite-stock products.
+
+Daily sales per product come from one aggregate query over OrderItem and
+are split into regular sales and event sales (orders with an Event). Regular
+demand is forecast with exponential smoothing, computed for the whole
+catalog at once as a matrix-vector product; event demand is the average a
+product sold per day an event ran, added for each event the caller plans to
+hold in the horizon. Suggestions cover the horizon plus the supplier lead
+time and a safety stock, minus what is on hand, grouped by Product.supplier.
+"""
+import math
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Event, OrderItem, Product
+
+HISTORY_DAYS = 90
+SMOOTHING = 0.3
+SAFETY_Z = 1.65  # ~95% service level
+
+
+@dataclass
+class Suggestion:
+    product: Product
+    on_hand: int
+    daily_rate: float
+    event_demand: float
+    forecast: float
+    safety_stock: float
+    quantity: int
+
+
+@dataclass
+class SupplierPlan:
+    supplier: str
+    suggestions: list = field(default_factory=list)
+
+    @property
+    def total_quantity(self):
+        return sum(suggestion.quantity for suggestion in self.suggestions)
+
+
+def sales_matrix(product_ids, days=HISTORY_DAYS, today=None):
+    """
+    (regular, per_event) daily sales of these products.
+
+    regular: products x days array of units sold without an event.
+    per_event: {event_id: (units per product array, number of days the event sold)}.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    index = {product_id: i for i, product_id in enumerate(product_ids)}
+    regular = np.zeros((len(product_ids), days))
+    per_event = {}
+
+    rows = (
+        OrderItem.objects.filter(
+            product_id__in=product_ids,
+            order__created_at__date__gte=start,
+            order__created_at__date__lte=today,
+        )
+        .exclude(order__status='cancelled')
+        .annotate(day=TruncDate('order__created_at'))
+        .values('product_id', 'day', 'order__event_id')
+        .annotate(units=Sum('quantity'))
+        .order_by()
+    )
+    event_days = {}
+    for row in rows:
+        i, d = index[row['product_id']], (row['day'] - start).days
+        event_id = row['order__event_id']
+        if event_id is None:
+            regular[i, d] += row['units']
+        else:
+            units, _ = per_event.setdefault(event_id, (np.zeros(len(product_ids)), 0))
+            units[i] += row['units']
+            event_days.setdefault(event_id, set()).add(d)
+
+    return regular, {
+        event_id: (units, len(event_days[event_id])) for event_id, (units, _) in per_event.items()
+    }
+
+
+def smooth(regular, alpha=SMOOTHING):
+    """Exponentially smoothed daily rate of every row, as one matrix-vector product"""
+    days = regular.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    # the oldest day also carries the initial level
+    weights[0] = (1 - alpha) ** (days - 1)
+    return regular @ weights
+
+
+def restock_plan(horizon_days=14, lead_time_days=7, event_ids=(), history_days=HISTORY_DAYS):
+    """[SupplierPlan] with a Suggestion for every product that needs restocking"""
+    products = list(
+        Product.objects.filter(is_active=True, unlimited_stock=False).with_on_hand().order_by('supplier', 'name')
+    )
+    if not products:
+        return []
+    regular, per_event = sales_matrix([product.pk for product in products], history_days)
+
+    daily_rate = smooth(regular)
+    daily_std = regular.std(axis=1)
+    event_demand = np.zeros(len(products))
+    for event_id in event_ids:
+        if event_id in per_event:
+            units, days = per_event[event_id]
+            event_demand += units / days
+
+    cover_days = horizon_days + lead_time_days
+    forecast = daily_rate * cover_days + event_demand
+    safety_stock = SAFETY_Z * daily_std * math.sqrt(lead_time_days)
+    on_hand = np.array([product.on_hand for product in products])
+    quantity = np.ceil(np.maximum(forecast + safety_stock - on_hand, 0)).astype(int)
+
+    plans = {}
+    for i in np.flatnonzero(quantity):
+        product = products[i]
+        supplier = product.supplier.strip() or '-'
+        plans.setdefault(supplier, SupplierPlan(supplier)).suggestions.append(Suggestion(
+            product=product,
+            on_hand=int(on_hand[i]),
+            daily_rate=round(float(daily_rate[i]), 2),
+            event_demand=round(float(event_demand[i]), 1),
+            forecast=round(float(forecast[i]), 1),
+            safety_stock=round(float(safety_stock[i]), 1),
+            quantity=int(quantity[i]),
+        ))
+    return sorted(plans.values(), key=lambda plan: plan.supplier)
+
+
+def events_with_sales(days=HISTORY_DAYS):
+    """Events that sold in the history window, for choosing which to plan for"""
+    since = timezone.now() - timedelta(days=days)
+    return (
+        Event.objects.filter(order__created_at__gte=since)
+        .annotate(orders=Count('order'))
+        .order_by('name')
+    )
@@ -0,0 +1,137 @@
+# shop/fulfillment.py
+"""
+Purchase orders and pick lists of an event.
+
+Everything comes from two grouped queries over the event's OrderItem rows:
+quantities per (supplier, product) for the purchase orders, and per (city,
+postal code, product) for the pick lists. The documents are rendered by
+shop/documents.py and written one by one into a zip that is streamed to
+the client while the rest are still rendering. The web view renders in its
+own process; the fulfillment_documents command renders in a process pool.
+"""
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Count, Sum
+
+from . import documents
+from .models import OrderItem
+
+FORMATS = ('csv', 'html')
+# below this many documents a pool costs more than it saves
+POOL_MIN_DOCUMENTS = 8
+
+
+def event_lines(event_id):
+    return OrderItem.objects.filter(order__event_id=event_id).exclude(order__status='cancelled').order_by()
+
+
+def supplier_totals(event_id):
+    """{supplier: [row]} - quantity and orders per product"""
+    rows = (
+        event_lines(event_id)
+        .values('product__supplier', 'product_id', 'product__sku', 'product__name')
+        .annotate(quantity=Sum('quantity'), orders=Count('order_id', distinct=True))
+        .order_by('product__supplier', 'product__name')
+    )
+    by_supplier = {}
+    for row in rows:
+        by_supplier.setdefault(row['product__supplier'].strip() or '-', []).append(row)
+    return by_supplier
+
+
+def city_totals(event_id):
+    """{city: [row]} - quantity and orders per postal code and product"""
+    rows = (
+        event_lines(event_id)
+        .values('order__city', 'order__postal_code', 'product_id', 'product__sku', 'product__name')
+        .annotate(quantity=Sum('quantity'), orders=Count('order_id', distinct=True))
+        .order_by('order__city', 'order__postal_code', 'product__name')
+    )
+    by_city = {}
+    for row in rows:
+        by_city.setdefault(row['order__city'].strip() or 'ללא עיר', []).append(row)
+    return by_city
+
+
+def _filename(name, used):
+    """name made safe for a zip entry, with -2, -3... when another name already came out the same"""
+    base = re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or '-'
+    filename, n = base, 1
+    while filename.casefold() in used:
+        n += 1
+        filename = f'{base}-{n}'
+    used.add(filename.casefold())
+    return filename
+
+
+def build_documents(event, formats=FORMATS):
+    """The documents of an event as plain dicts (see shop/documents.py)"""
+    result = []
+    used = set()
+    for supplier, rows in supplier_totals(event.pk).items():
+        document = {
+            'title': f'הזמנת רכש - {supplier}',
+            'subtitle': event.name,
+            'columns': ['מק"ט', 'מוצר', 'כמות', 'הזמנות'],
+            'rows': [[row['product__sku'] or '', row['product__name'], row['quantity'], row['orders']] for row in rows],
+            'totals': ['', 'סה"כ', sum(row['quantity'] for row in rows), ''],
+        }
+        filename = _filename(supplier, used)
+        for fmt in formats:
+            result.append({**document, 'filename': f'purchase-orders/{filename}.{fmt}'})
+
+    used = set()
+    for city, rows in city_totals(event.pk).items():
+        document = {
+            'title': f'רשימת ליקוט - {city}',
+            'subtitle': event.name,
+            'columns': ['מיקוד', 'מק"ט', 'מוצר', 'כמות', 'הזמנות'],
+            'rows': [
+                [row['order__postal_code'], row['product__sku'] or '', row['product__name'], row['quantity'], row['orders']]
+                for row in rows
+            ],
+            'totals': ['', '', 'סה"כ', sum(row['quantity'] for row in rows), ''],
+        }
+        filename = _filename(city, used)
+        for fmt in formats:
+            result.append({**document, 'filename': f'pick-lists/{filename}.{fmt}'})
+    return result
+
+
+def rendered(docs, workers=1):
+    """Yields (filename, bytes) of every document, in order; workers > 1 renders in a process pool"""
+    if workers <= 1 or len(docs) < POOL_MIN_DOCUMENTS:
+        yield from map(documents.render, docs)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(docs))) as pool:
+        yield from pool.map(documents.render, docs, chunksize=max(1, len(docs) // (workers * 4)))
+
+
+class _Chunks:
+    """Write-only file for zipfile; the written bytes are taken with take()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def zip_stream(docs, workers=1):
+    """Yields a zip of the rendered documents chunk by chunk"""
+    out = _Chunks()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in rendered(docs, workers):
+            archive.writestr(filename, content)
+            yield out.take()
+    yield out.take()
@@ -0,0 +1,119 @@
+# shop/inventory.py
+"""
+Append-only inventory ledger.
+
+Stock changes are StockMovement inserts (sale, cancel, restock, adjustment)
+instead of updates of the Product.stock column, so concurrent checkouts of a
+best seller no longer queue on one row. Product.stock is the compacted
+balance; compact() periodically folds pending movements into it, and the
+on-hand quantity is stock + pending movements (Product.on_hand,
+Product.objects.with_on_hand()). Only products with unlimited_stock=False
+get movements.
+
+Checks against on_hand are not locked, so two checkouts racing for the last
+units can both pass; compact() then clamps the balance at zero and logs the
+oversold products.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Product, StockMovement
+
+logger = logging.getLogger(__name__)
+
+COMPACT_BATCH_SIZE = 5000
+
+
+class OutOfStock(ValueError):
+    """An order line asks for more than is on hand"""
+
+
+def on_hand_map(product_ids):
+    """{product_id: on-hand quantity} in one query"""
+    return {
+        product.pk: product.on_hand
+        for product in Product.objects.filter(pk__in=product_ids).with_on_hand().only('pk', 'stock')
+    }
+
+
+def record(product, kind, quantity, order=None, user=None, note=''):
+    """Append one movement"""
+    return StockMovement.objects.create(
+        product=product, kind=kind, quantity=quantity, order=order, user=user, note=note
+    )
+
+
+def record_sale(order, lines):
+    """
+    One sale movement per finite-stock line of a new order.
+
+    lines: iterable of (product, quantity).
+    """
+    record_sales([(order, lines)])
+
+
+def record_sales(orders):
+    """record_sale() for many orders in one INSERT; orders: iterable of (order, lines)"""
+    StockMovement.objects.bulk_create([
+        StockMovement(product=product, kind='sale', quantity=-quantity, order=order)
+        for order, lines in orders
+        for product, quantity in lines
+        if not product.unlimited_stock
+    ])
+
+
+def record_cancel(order, user=None):
+    """Return the stock of a cancelled order, once"""
+    if order.stock_movements.filter(kind='cancel').exists():
+        return
+    sold = order.stock_movements.filter(kind='sale').values_list('product_id', 'quantity')
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, kind='cancel', quantity=-quantity, order=order, user=user)
+        for product_id, quantity in sold
+    ])
+
+
+def compact(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Fold pending movements into Product.stock, batch by batch.
+
+    Each batch is one transaction: lock the pending movements, add their
+    sums to Product.stock in one UPDATE and mark exactly those movements as
+    compacted. Movements locked by an overlapping run are skipped, so two
+    runs never fold the same movement twice. Returns the number of
+    movements folded.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            movements = list(
+                StockMovement.objects.select_for_update(skip_locked=True).filter(compacted=False)
+                .order_by('pk').values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not movements:
+                return folded
+
+            deltas = {}
+            for _, product_id, quantity in movements:
+                deltas[product_id] = deltas.get(product_id, 0) + quantity
+
+            # lock the products in pk order, so overlapping runs cannot deadlock on them
+            oversold = list(
+                Product.objects.select_for_update().filter(pk__in=deltas).order_by('pk').values_list('pk', 'stock')
+            )
+            oversold = [pk for pk, stock in oversold if stock + deltas[pk] < 0]
+            if oversold:
+                logger.warning('stock went below zero for products %s, clamped at 0', oversold)
+
+            Product.objects.filter(pk__in=deltas).update(stock=Greatest(
+                F('stock') + Case(
+                    *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+                    default=Value(0), output_field=IntegerField(),
+                ),
+                Value(0),
+            ))
+            StockMovement.objects.filter(pk__in=[pk for pk, _, _ in movements]).update(compacted=True)
+            folded += len(movements)
@@ -0,0 +1,184 @@
+# shop/live.py
+"""
+Shared change feed of new orders for the live sales dashboard.
+
+One background thread per process polls Order for rows newer than the last
+one it has seen and fans each new order out to every connected dashboard
+(Server-Sent Events), so N staff watching costs one query per
+LIVE_POLL_SECONDS instead of N changelist refreshes. The thread starts with
+the first subscriber and stops after the last one leaves.
+
+The cursor is the order id: ids only grow, and unlike created_at they have
+no ties. An order whose transaction commits after a higher id was already
+read is missed by the feed (it is still in the totals of the next snapshot).
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, connection
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+LIVE_POLL_SECONDS = 2
+LIVE_BATCH_SIZE = 500
+
+
+def sse_message(event, data, id=None):
+    """Format one Server-Sent Events message"""
+    message = f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
+    return message if id is None else f'id: {id}\n' + message
+
+
+class Subscriber:
+    """Queue of SSE messages for one blocking (WSGI) connection"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=1000)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass  # a stalled client loses messages, not the feed
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscriber:
+    """Queue of SSE messages for one connection served from the event loop (ASGI)"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=1000)
+
+    def _put(self, message):
+        if not self.queue.full():
+            self.queue.put_nowait(message)
+
+    def put(self, message):
+        # called from the feed thread
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def order_payload(order):
+    return {
+        'id': order.pk,
+        'order_number': order.order_number,
+        'name': f'{order.first_name} {order.last_name}',
+        'total_amount': order.total_amount,
+        'total_items': order.total_items,
+        'event_id': order.event_id,
+        'event': order.event.name if order.event else None,
+        'marketer_id': order.marketer_id,
+        'marketer': str(order.marketer) if order.marketer else None,
+        'created_at': timezone.localtime(order.created_at).strftime('%H:%M:%S'),
+    }
+
+
+class OrderFeed:
+    def __init__(self, interval=LIVE_POLL_SECONDS):
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+
+    def subscribe(self, subscriber):
+        """Register a subscriber and return the current snapshot for it"""
+        snapshot = self.snapshot()
+        with self._lock:
+            if self._last_id is None or self._thread is None:
+                self._last_id = snapshot['last_id']
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='order-feed', daemon=True)
+                self._thread.start()
+        return snapshot
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def snapshot(self):
+        """Today's totals per event and per marketer, two grouped queries"""
+        today = Order.objects.filter(
+            created_at__gte=timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        ).exclude(status='cancelled')
+        by_event = today.values('event_id', 'event__name').annotate(
+            amount=Sum('total_amount'), orders=Count('id')
+        ).order_by('-amount')
+        by_marketer = today.values('marketer_id', 'marketer__first_name', 'marketer__last_name').annotate(
+            amount=Sum('total_amount'), orders=Count('id')
+        ).order_by('-amount')
+        return {
+            'last_id': Order.objects.aggregate(last_id=Max('id'))['last_id'] or 0,
+            'events': [
+                {'id': row['event_id'], 'name': row['event__name'], 'amount': row['amount'], 'orders': row['orders']}
+                for row in by_event
+            ],
+            'marketers': [
+                {
+                    'id': row['marketer_id'],
+                    'name': f"{row['marketer__first_name'] or ''} {row['marketer__last_name'] or ''}".strip() or None,
+                    'amount': row['amount'],
+                    'orders': row['orders'],
+                }
+                for row in by_marketer
+            ],
+        }
+
+    def poll(self):
+        """New orders since the last poll"""
+        orders = list(
+            Order.objects.filter(pk__gt=self._last_id).exclude(status='cancelled')
+            .select_related('event', 'marketer').order_by('pk')[:LIVE_BATCH_SIZE]
+        )
+        if orders:
+            self._last_id = orders[-1].pk
+        return orders
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                close_old_connections()
+                try:
+                    messages = [sse_message('order', order_payload(order), id=order.pk) for order in self.poll()]
+                except Exception as e:
+                    logger.warning('order feed poll failed: %s', e)
+                    continue
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for message in messages:
+                    for subscriber in subscribers:
+                        subscriber.put(message)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            connection.close()
+
+
+feed = OrderFeed()
@@ -0,0 +1,70 @@
+# shop/lookup.py
+"""
+Staff order lookup by phone, email, name or order number.
+
+Searches the normalized columns kept by Order.save() / UserProfile.save()
+(digits-only phone, lowercase email and name), so every branch is an index
+scan: prefix terms use the varchar_pattern_ops indexes (Order.Meta.indexes,
+UserProfile.Meta.indexes), substring terms (the last digits of a phone,
+part of a name) the pg_trgm GIN indexes from migrations 0016 / accounts
+0007. A phone also matches orders of users whose profile has that
+phone or phone2 (up to MAX_PROFILE_MATCHES users, looked up first).
+"""
+import re
+
+from django.db.models import Q
+
+from accounts.models import UserProfile
+
+from .models import Order, normalize_email, normalize_name, normalize_phone
+
+LOOKUP_LIMIT = 20
+# a full phone number - shorter digit strings are matched anywhere in the phone
+FULL_PHONE_DIGITS = 9
+# pg_trgm needs 3 characters to use the index
+MIN_CONTAINS_LENGTH = 3
+# users whose profile phone matches; a short phone fragment can match many
+MAX_PROFILE_MATCHES = 100
+
+_PHONE_CHARS = re.compile(r'^[\d\s()+\-]+$')
+
+
+def _phone_filter(digits):
+    lookup = 'startswith' if len(digits) >= FULL_PHONE_DIGITS else 'contains'
+    # a list, not a subquery: PostgreSQL cannot index-scan an IN (SELECT ...)
+    # under an OR, and would filter every order with it
+    user_ids = list(UserProfile.objects.filter(
+        Q(**{f'phone_normalized__{lookup}': digits}) | Q(**{f'phone2_normalized__{lookup}': digits})
+    ).values_list('user_id', flat=True)[:MAX_PROFILE_MATCHES])
+    condition = Q(**{f'phone_normalized__{lookup}': digits})
+    return condition | Q(user_id__in=user_ids) if user_ids else condition
+
+
+def order_filter(query):
+    """Q matching the orders of a search term, or None for a term too short to search"""
+    term = query.strip()
+    if term.upper().startswith('ORD-'):
+        return Q(order_number__startswith=term.upper())
+    if '@' in term:
+        return Q(email_normalized__startswith=normalize_email(term))
+    if _PHONE_CHARS.match(term):
+        digits = normalize_phone(term)
+        return _phone_filter(digits) if len(digits) >= MIN_CONTAINS_LENGTH else None
+
+    name = normalize_name(term)
+    if not name:
+        return None
+    if len(name) < MIN_CONTAINS_LENGTH:
+        return Q(name_normalized__startswith=name)
+    condition = Q(name_normalized__contains=name)
+    if ' ' not in name:
+        condition |= Q(email_normalized__startswith=name)
+    return condition
+
+
+def search_orders(query, limit=LOOKUP_LIMIT):
+    """The newest orders matching query (see order_filter)"""
+    condition = order_filter(query)
+    if condition is None:
+        return Order.objects.none()
+    return Order.objects.filter(condition).select_related('event', 'marketer').order_by('-created_at')[:limit]
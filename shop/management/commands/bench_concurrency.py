@@ -0,0 +1,65 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how many concurrent requests one running instance sustains. '
+        'Run it once against SERVER_MODE=wsgi and once against SERVER_MODE=asgi '
+        '(same instance size, same database) and compare the tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+        parser.add_argument(
+            '--paths', default='/products/',
+            help='Comma separated paths, requested round robin'
+        )
+        parser.add_argument(
+            '--concurrency', default='1,8,16,32,64',
+            help='Comma separated client concurrency levels'
+        )
+        parser.add_argument('--requests', type=int, default=400, help='Requests per level')
+        parser.add_argument('--cookie', default='', help='Cookie header, e.g. sessionid=... for cart/profile')
+        parser.add_argument('--label', default='', help='Shown in the header, e.g. "wsgi" or "asgi"')
+
+    def handle(self, *args, **options):
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        headers = {'Cookie': options['cookie']} if options['cookie'] else {}
+
+        def fetch(i):
+            url = options['base_url'].rstrip('/') + paths[i % len(paths)]
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers), timeout=60) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (URLError, OSError):
+                ok = False
+            return time.perf_counter() - start, ok
+
+        self.stdout.write(f'{options["label"] or options["base_url"]}  paths={",".join(paths)}')
+        self.stdout.write(f'{"clients":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+
+        for level in levels:
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                started = time.perf_counter()
+                results = list(pool.map(fetch, range(options['requests'])))
+                elapsed = time.perf_counter() - started
+
+            latencies = sorted(duration * 1000 for duration, ok in results if ok)
+            errors = sum(1 for _, ok in results if not ok)
+            if len(latencies) < 2:
+                self.stdout.write(f'{level:>8} {"-":>8} {"-":>8} {"-":>8} {"-":>8} {errors:>7}')
+                continue
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{level:>8} {len(latencies) / elapsed:>8.1f} {quantiles[49]:>8.1f} '
+                f'{quantiles[94]:>8.1f} {quantiles[98]:>8.1f} {errors:>7}'
+            )
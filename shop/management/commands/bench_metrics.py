@@ -0,0 +1,104 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from prometheus_client.parser import text_string_to_metric_families
+
+from levshomea.metrics import CART_ADDS, CHECKOUT_SECONDS, _DBTimer
+from shop.models import Product
+
+METRICS_MIDDLEWARE = 'levshomea.metrics.metrics_middleware'
+EXPECTED_FAMILIES = ['shop_cart_adds', 'http_request_seconds', 'http_request_db_seconds']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the overhead of the metrics instrumentation (per operation and '
+        'per add_to_cart request) and scrape /metrics in process. Everything the '
+        'benchmark writes is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000, help='Iterations of the micro benchmarks')
+        parser.add_argument('--requests', type=int, default=200, help='add_to_cart requests with and without the middleware')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(is_active=True, unlimited_stock=True).first()
+        if product is None:
+            raise CommandError('No active unlimited-stock product to add to the cart')
+
+        n = options['iterations']
+        self.stdout.write(f'{"operation":<32} {"ns/op":>10}')
+        for name, operation in [
+            ('counter.labels().inc()', lambda: CART_ADDS.labels('bench').inc()),
+            ('histogram.observe()', lambda: CHECKOUT_SECONDS.observe(0.01)),
+        ]:
+            self.stdout.write(f'{name:<32} {self.per_call(operation, n) * 1e9:>10.0f}')
+
+        queries = max(n // 100, 100)
+        with connection.cursor() as cursor:
+            plain = self.per_call(lambda: cursor.execute('SELECT 1'), queries)
+            with connection.execute_wrapper(_DBTimer()):
+                wrapped = self.per_call(lambda: cursor.execute('SELECT 1'), queries)
+        self.stdout.write(f'{"execute_wrapper per query":<32} {(wrapped - plain) * 1e9:>10.0f}')
+
+        without, with_metrics, scrape = self.run_requests(product, options['requests'])
+        self.stdout.write(
+            f'\nadd_to_cart median: {statistics.median(without) * 1000:.2f} ms without metrics, '
+            f'{statistics.median(with_metrics) * 1000:.2f} ms with'
+        )
+
+        families = {family.name: family for family in text_string_to_metric_families(scrape)}
+        missing = [name for name in EXPECTED_FAMILIES if name not in families]
+        if missing:
+            raise CommandError(f'/metrics is missing {", ".join(missing)}')
+        samples = sum(len(family.samples) for family in families.values())
+        self.stdout.write(f'/metrics: {len(families)} metric families, {samples} samples, parsed OK')
+
+    def per_call(self, operation, n):
+        start = time.perf_counter()
+        for _ in range(n):
+            operation()
+        return (time.perf_counter() - start) / n
+
+    def run_requests(self, product, rounds):
+        middleware = [name for name in settings.MIDDLEWARE if name != METRICS_MIDDLEWARE]
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        url, data = reverse('shop:add_to_cart'), {'product_id': product.pk, 'quantity': 1}
+        timings = ([], [])
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=hosts):
+                user = User.objects.create_user('bench-metrics', password=None)
+                # a client builds its middleware chain on its first request
+                clients = []
+                for stack in (middleware, [METRICS_MIDDLEWARE, *middleware]):
+                    with override_settings(MIDDLEWARE=stack):
+                        client = Client()
+                        client.force_login(user)
+                        client.post(url, data)
+                    clients.append(client)
+                # alternate so both variants see the same cache and DB state
+                for _ in range(rounds):
+                    for durations, client in zip(timings, clients):
+                        start = time.perf_counter()
+                        client.post(url, data)
+                        durations.append(time.perf_counter() - start)
+                staff = Client()
+                staff.force_login(User.objects.create_user('bench-metrics-staff', password=None, is_staff=True))
+                response = staff.get(reverse('metrics'))
+                if response.status_code != 200:
+                    raise CommandError(f'/metrics answered {response.status_code}')
+                scrape = response.content.decode()
+                raise _Rollback
+        except _Rollback:
+            pass
+        return timings[0], timings[1], scrape
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Product
+
+MESSAGE_STORAGES = {
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the DB round trips per request for each session/message storage '
+        'strategy, in process against the configured database. Everything the '
+        'benchmark writes is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strategies', default='db:session,db:cookie,cached_db:cookie,signed_cookies:cookie',
+            help='Comma separated <session strategy>:<message storage> pairs (see SESSION_ENGINES)'
+        )
+        parser.add_argument('--requests', type=int, default=20, help='Rounds of the scenario per strategy')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(is_active=True).first()
+        if product is None:
+            raise CommandError('No active product to add to the cart')
+
+        strategies = []
+        for pair in options['strategies'].split(','):
+            engine, _, messages = pair.strip().partition(':')
+            if engine not in settings.SESSION_ENGINES or messages not in MESSAGE_STORAGES:
+                raise CommandError(f'Unknown strategy {pair!r}')
+            strategies.append((engine, messages))
+
+        self.stdout.write(
+            f'{"strategy":<24} {"step":<22} {"queries":>8} {"session":>8} {"ms":>8}'
+        )
+        for engine, messages in strategies:
+            with override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[engine],
+                MESSAGE_STORAGE=MESSAGE_STORAGES[messages],
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                results = self.run_scenario(product, options['requests'])
+            for step, (queries, session_queries, durations) in results.items():
+                self.stdout.write(
+                    f'{engine + ":" + messages:<24} {step:<22} '
+                    f'{statistics.mean(queries):>8.1f} {statistics.mean(session_queries):>8.1f} '
+                    f'{statistics.median(durations) * 1000:>8.1f}'
+                )
+
+    def run_scenario(self, product, rounds):
+        """Anonymous catalog hit, then a logged-in add_to_cart with its flash message"""
+        results = {}
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user('bench-sessions', password=None)
+                anonymous, customer = Client(), Client()
+                customer.force_login(user)
+                steps = [
+                    ('anonymous catalog', anonymous, 'get', reverse('shop:product_list'), None),
+                    ('catalog', customer, 'get', reverse('shop:product_list'), None),
+                    ('add to cart', customer, 'post', reverse('shop:add_to_cart'),
+                     {'product_id': product.pk, 'quantity': 1}),
+                    ('cart + message', customer, 'get', reverse('shop:cart_detail'), None),
+                ]
+                for _ in range(rounds):
+                    for step, client, method, url, data in steps:
+                        with CaptureQueriesContext(connection) as captured:
+                            start = time.perf_counter()
+                            getattr(client, method)(url, data)
+                            duration = time.perf_counter() - start
+                        queries, session_queries, durations = results.setdefault(step, ([], [], []))
+                        queries.append(len(captured))
+                        session_queries.append(
+                            sum('django_session' in query['sql'] for query in captured.captured_queries)
+                        )
+                        durations.append(duration)
+                    user.cartitem_set.all().delete()
+                raise _Rollback
+        except _Rollback:
+            pass
+        return results
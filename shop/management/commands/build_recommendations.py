@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import MIN_COUNT, TOP_K, refresh
+
+
+class Command(BaseCommand):
+    help = 'Compute "frequently bought together" products from the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild everything instead of only products in new orders')
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--min-count', type=int, default=MIN_COUNT, help='Minimum orders a pair must share')
+        parser.add_argument(
+            '--loop', type=int, default=0,
+            help='Keep refreshing every N seconds (0 = run once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.perf_counter()
+            products = refresh(full=full, top_k=options['top_k'], min_count=options['min_count'])
+            if products or full:
+                self.stdout.write(f'{products} products recomputed in {time.perf_counter() - started:.1f}s')
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['loop'])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from levshomea.schema import check_migrations
+
+
+class Command(BaseCommand):
+    help = (
+        'Flag operations in the unapplied migrations that would lock big tables '
+        '(orders, order items, carts, products, users) and block checkout. Run before deploying; '
+        'exits with an error when something would lock.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Check every migration, applied or not')
+        parser.add_argument('--database', default='default', help='Database to check against (default: default)')
+
+    def handle(self, *args, **options):
+        findings = check_migrations(connections[options['database']], include_applied=options['all'])
+        for finding in findings:
+            style = self.style.ERROR if finding.level == 'error' else self.style.WARNING
+            self.stdout.write(style(f'{finding.level.upper():8}{finding.migration}: {finding.operation}'))
+            self.stdout.write(f'        {finding.message}')
+        errors = sum(finding.level == 'error' for finding in findings)
+        if errors:
+            raise CommandError(f'{errors} operation(s) would lock big tables')
+        self.stdout.write(self.style.SUCCESS(f'No locking operations ({len(findings)} warnings)'))
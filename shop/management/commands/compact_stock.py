@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.inventory import COMPACT_BATCH_SIZE, compact
+
+
+class Command(BaseCommand):
+    help = 'Fold pending stock movements into Product.stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE)
+        parser.add_argument(
+            '--loop', type=int, default=0,
+            help='Keep compacting every N seconds (0 = compact once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            folded = compact(options['batch_size'])
+            if folded:
+                self.stdout.write(f'{folded} stock movements compacted')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
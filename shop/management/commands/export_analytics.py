@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.export import run
+
+
+class Command(BaseCommand):
+    help = 'Export orders, order items and dimension tables to Parquet for offline analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Export directory (default: ANALYTICS_EXPORT_DIR)')
+        parser.add_argument('--full', action='store_true', help='Drop the exported orders/items and export everything again')
+        parser.add_argument(
+            '--loop', type=int, default=0,
+            help='Keep exporting every N seconds (0 = export once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.perf_counter()
+            counts = run(options['output'], full=full)
+            self.stdout.write(
+                ', '.join(f'{table}: {rows}' for table, rows in counts.items())
+                + f' ({time.perf_counter() - started:.2f}s)'
+            )
+            full = False
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.fulfillment import FORMATS, build_documents, zip_stream
+from shop.models import Event
+
+
+class Command(BaseCommand):
+    help = "Write a zip of an event's purchase orders (per supplier) and pick lists (per city)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('--output', help='Zip path (default fulfillment-<event>.zip)')
+        parser.add_argument('--format', action='append', choices=FORMATS, help='Only this format (repeatable)')
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+        output = options['output'] or f'fulfillment-{event.pk}.zip'
+
+        started = time.perf_counter()
+        docs = build_documents(event, options['format'] or FORMATS)
+        queried = time.perf_counter()
+        with open(output, 'wb') as f:
+            for chunk in zip_stream(docs, options['workers'] or os.cpu_count() or 1):
+                f.write(chunk)
+        self.stdout.write(
+            f'{len(docs)} documents -> {output} '
+            f'(queries {queried - started:.2f}s, rendering {time.perf_counter() - queried:.2f}s)'
+        )
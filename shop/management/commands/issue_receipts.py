@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.receipts import RECEIPT_BATCH_SIZE, issue_annual_receipts, issue_order_receipts
+
+
+class Command(BaseCommand):
+    help = 'Issue donation receipts for paid orders that have none (or annual summaries with --year)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Issue the annual summary of this year for every donor')
+        parser.add_argument('--batch-size', type=int, default=RECEIPT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+        parser.add_argument(
+            '--loop', type=int, default=0,
+            help='Keep issuing order receipts every N seconds (0 = issue once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            if options['year']:
+                issued = issue_annual_receipts(options['year'], options['batch_size'], options['workers'])
+            else:
+                issued = issue_order_receipts(options['batch_size'], options['workers'])
+            self.stdout.write(f'issued {issued} receipts in {time.perf_counter() - started:.2f}s')
+            if not options['loop'] or options['year']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,101 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter; prints the timestamps of each startup phase
+COLD_START_SCRIPT = '''
+import json, sys, time
+started = float(sys.argv[1])
+marks = {"interpreter": time.time()}
+import django
+django.setup()
+marks["django_setup"] = time.time()
+if sys.argv[3] == "1":
+    from levshomea.warmup import warmup
+    warmup()
+    marks["warmup"] = time.time()
+from django.test import Client
+response = Client(HTTP_HOST="localhost").get(sys.argv[2])
+marks["first_response"] = time.time()
+print(json.dumps({"status": response.status_code,
+                  "marks": {k: round((v - started) * 1000, 1) for k, v in marks.items()}}))
+'''
+
+IMPORT_SCRIPT = '''
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile cold start: the slowest imports during setup and URLconf loading '
+        '(python -X importtime), and the time to first response of a fresh process '
+        'with and without warmup, compared against COLD_START_TARGET_MS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/products/', help='Path of the first request')
+        parser.add_argument('--top', type=int, default=20, help='Number of imports to list')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh processes per scenario')
+        parser.add_argument('--check', action='store_true', help='Fail when over COLD_START_TARGET_MS')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'levshomea.settings'))
+        self.report_imports(env, options['top'])
+
+        target = settings.COLD_START_TARGET_MS
+        self.stdout.write(f'\nTime to first response of a fresh process (target {target} ms):')
+        results = {}
+        for label, with_warmup in (('cold', '0'), ('warmed', '1')):
+            runs = [self.cold_start(env, options['path'], with_warmup) for _ in range(options['runs'])]
+            best = min(runs, key=lambda run: run['marks']['first_response'])
+            results[label] = best['marks']['first_response']
+            phases = ', '.join(f'{name}={ms}' for name, ms in best['marks'].items())
+            self.stdout.write(f'  {label:<7} status={best["status"]} {phases}')
+
+        if options['check'] and results['cold'] > target:
+            raise CommandError(f'Cold start {results["cold"]} ms is over the {target} ms target')
+
+    def report_imports(self, env, top):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT],
+            env=env, capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr[-2000:])
+
+        imports = []
+        for line in completed.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                own, cumulative, indent, module = match.groups()
+                # top-level imports only, nested ones are already in their parent's total
+                if len(indent) == 1:
+                    imports.append((int(cumulative), int(own), module))
+
+        total = sum(cumulative for cumulative, _, _ in imports)
+        self.stdout.write(f'Imports during setup + URLconf: {total / 1000:.0f} ms')
+        self.stdout.write(f'{"cumulative ms":>14} {"self ms":>8}  module')
+        for cumulative, own, module in sorted(imports, reverse=True)[:top]:
+            self.stdout.write(f'{cumulative / 1000:>14.1f} {own / 1000:>8.1f}  {module}')
+
+    def cold_start(self, env, path, with_warmup):
+        started = time.time()
+        completed = subprocess.run(
+            [sys.executable, '-c', COLD_START_SCRIPT, str(started), path, with_warmup],
+            env=env, capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr[-2000:])
+        return json.loads(completed.stdout.strip().splitlines()[-1])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.popularity import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Product.total_orders and the popularity score from the order history. '
+        'Needed once to backfill, and after bulk changes to past orders; new orders are '
+        'counted by the running web processes.'
+    )
+
+    def handle(self, *args, **options):
+        products = rebuild()
+        self.stdout.write(f'{products} products with orders updated')
@@ -0,0 +1,97 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from shop.slow_queries import LOCKING_READ, has_redacted, is_select, paused, top_offenders
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the slowest captured queries (SlowQuery) against a database to check an index fix. '
+        'Use --dump on the server to write them to a file, then replay the file against a local copy. '
+        'Queries with redacted parameters (emails, phones) are timed but reported as not comparable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='Queries written by --dump (default: this database\'s SlowQuery rows)')
+        parser.add_argument('--dump', metavar='FILE', help='Write the top offenders to FILE and exit')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints, by total time (default 10)')
+        parser.add_argument('--days', type=int, default=7, help='Only queries captured in the last N days (default 7)')
+        parser.add_argument('--runs', type=int, default=3, help='Runs of each query; the median is reported (default 3)')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE of each query on the target database')
+        parser.add_argument('--database', default='default', help='Database to replay against (default: default)')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                offenders = json.load(f)
+        else:
+            since = timezone.now() - timedelta(days=options['days'])
+            offenders = [
+                {
+                    'fingerprint': offender['fingerprint'], 'count': offender['count'],
+                    'total_ms': offender['total_ms'], 'avg_ms': offender['avg_ms'],
+                    'view': offender['sample'].view, 'location': offender['sample'].location,
+                    'sql': offender['sample'].sql, 'params': offender['sample'].params,
+                }
+                for offender in top_offenders(options['top'], since)
+            ]
+
+        if options['dump']:
+            with open(options['dump'], 'w', encoding='utf-8') as f:
+                json.dump(offenders, f, ensure_ascii=False, indent=1)
+            self.stdout.write(f'{len(offenders)} queries written to {options["dump"]}')
+            return
+        if not offenders:
+            raise CommandError('No slow queries captured')
+
+        connection = connections[options['database']]
+        for offender in offenders[:options['top']]:
+            self.stdout.write(
+                f'\n{offender["fingerprint"][:8]}  {offender["count"]}x, avg {offender["avg_ms"]}ms  '
+                f'{offender["view"] or "-"}  {offender["location"]}'
+            )
+            self.stdout.write(f'  {offender["sql"][:200]}')
+            if not is_select(offender['sql']):
+                self.stdout.write('  skipped: not a SELECT')
+                continue
+            if LOCKING_READ.search(offender['sql']):
+                self.stdout.write('  skipped: locks rows (FOR UPDATE / FOR SHARE)')
+                continue
+            try:
+                timings, plan = self.replay(connection, offender['sql'], offender['params'], options)
+            except DatabaseError as e:
+                self.stdout.write(self.style.ERROR(f'  failed: {e}'))
+                continue
+            median = statistics.median(timings)
+            if has_redacted(offender['params']):
+                # an email or phone replaced by [email] / [phone] finds other rows than the captured query did
+                self.stdout.write(self.style.WARNING(
+                    f'  now {median:.1f}ms (was {offender["avg_ms"]}ms) - not comparable: its parameters were redacted'
+                ))
+            else:
+                style = self.style.SUCCESS if median < offender['avg_ms'] / 2 else self.style.WARNING
+                self.stdout.write(style(f'  now {median:.1f}ms (was {offender["avg_ms"]}ms)'))
+            if plan:
+                self.stdout.write('\n'.join('    ' + line for line in plan))
+
+    def replay(self, connection, sql, params, options):
+        """(run times in ms, EXPLAIN lines) - inside a transaction that is rolled back"""
+        timings, plan = [], []
+        with paused(), transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            if options['explain']:
+                prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+                cursor.execute(prefix + sql, params)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            transaction.set_rollback(True, using=connection.alias)
+        return timings, plan
@@ -0,0 +1,116 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import CartItem, Category, Order, OrderItem, Product
+
+LOCAL_HOSTS = ('', 'localhost', '127.0.0.1', '::1')
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill a local database with synthetic users, products, orders and carts, '
+        'to rehearse migrations of big tables (see levshomea/schema.py). '
+        'Adds to what is there; every run gets its own names.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--items-per-order', type=int, default=3, help='Average lines per order (default 3)')
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--carts', type=int, default=5000, help='Users with an open cart (default 5000)')
+        parser.add_argument('--days', type=int, default=365, help='Spread the orders over the last N days (default 365)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+        parser.add_argument('--force', action='store_true', help='Also seed a database that is not on this machine')
+
+    def handle(self, *args, **options):
+        host = settings.DATABASES['default'].get('HOST', '')
+        if host not in LOCAL_HOSTS and not options['force']:
+            raise CommandError(f'The database is on {host}, not local - use --force if you really mean it')
+        if options['products'] < options['items_per_order'] or not options['users']:
+            raise CommandError('Need at least --items-per-order products and one user')
+
+        rng = random.Random(options['seed'])
+        run = uuid.uuid4().hex[:6]
+        batch_size = options['batch_size']
+
+        category = Category.objects.create(name=f'נתוני בדיקה {run}', slug=f'seed-{run}')
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    name=f'מוצר {run}-{i}', slug=f'seed-{run}-{i}', description='-', category=category,
+                    supplier=f'ספק {i % 40}', price=Decimal(rng.randrange(500, 50000)) / 100,
+                    unlimited_stock=i % 3 != 0, stock=rng.randrange(0, 500),
+                )
+                for i in range(options['products'])
+            ],
+            batch_size=batch_size,
+        )
+        product_prices = [(product.pk, product.price) for product in products]
+        self.stdout.write(f'{len(products)} products')
+
+        user_ids = []
+        for start in range(0, options['users'], batch_size):
+            users = User.objects.bulk_create([
+                User(username=f'seed-{run}-{i}', password='!', first_name=f'פרטי{i % 997}', last_name=f'משפחה{i % 1999}')
+                for i in range(start, min(start + batch_size, options['users']))
+            ])
+            user_ids.extend(user.pk for user in users)
+        self.stdout.write(f'{len(user_ids)} users')
+
+        self.seed_orders(rng, run, user_ids, product_prices, options)
+
+        carts = []
+        for user_id in rng.sample(user_ids, min(options['carts'], len(user_ids))):
+            carts.extend(
+                CartItem(user_id=user_id, product_id=product_id, quantity=rng.randint(1, 4))
+                for product_id, _ in rng.sample(product_prices, rng.randint(1, 5))
+            )
+        CartItem.objects.bulk_create(carts, batch_size=batch_size)
+        self.stdout.write(f'{len(carts)} cart items')
+
+    def seed_orders(self, rng, run, user_ids, product_prices, options):
+        total, batch_size = options['orders'], options['batch_size']
+        batches = max(1, -(-total // batch_size))
+        now = timezone.now()
+        started = time.perf_counter()
+        lines = 0
+        for batch in range(batches):
+            with transaction.atomic():
+                orders, items = [], []
+                for n in range(batch * batch_size, min((batch + 1) * batch_size, total)):
+                    order = Order(
+                        order_number=f'SEED-{run}-{n}', user_id=rng.choice(user_ids),
+                        first_name=f'פרטי{n % 997}', last_name=f'משפחה{n % 1999}',
+                        email=f'seed{n}@example.com', phone=f'05{rng.randrange(10 ** 8):08d}',
+                        city=f'עיר {n % 60}', total_amount=0,
+                        status=rng.choices(['delivered', 'pending', 'cancelled'], [85, 10, 5])[0],
+                        payment_status='paid',
+                    )
+                    count = max(1, round(rng.expovariate(1 / options['items_per_order'])))
+                    for product_id, price in rng.sample(product_prices, min(count, len(product_prices))):
+                        quantity = rng.randint(1, 3)
+                        items.append(OrderItem(order=order, product_id=product_id, quantity=quantity, price=price))
+                        order.total_items += quantity
+                        order.total_amount += price * quantity
+                    order.subtotal_amount = order.total_amount
+                    order.normalize_contact()
+                    orders.append(order)
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(items)
+                # oldest batch first, so ids and dates grow together like in production
+                day = now - timedelta(days=options['days'] * (batches - 1 - batch) / batches)
+                Order.objects.filter(pk__gte=orders[0].pk, pk__lte=orders[-1].pk).update(created_at=day, updated_at=day)
+            lines += len(items)
+            done = min((batch + 1) * batch_size, total)
+            self.stdout.write(f'{done} orders, {lines} lines ({done / (time.perf_counter() - started):.0f} orders/s)')
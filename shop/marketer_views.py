@@ -0,0 +1,63 @@
+# shop/marketer_views.py
+"""Marketer portal - a marketer's own orders, customers and totals"""
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.shortcuts import render
+
+from .marketers import marketer_for_user, marketer_orders, marketer_summary
+from .models import Event, Marketer, Product
+
+MARKETER_ORDERS_PER_PAGE = 50
+
+
+def marketer_required(view):
+    """
+    Give the view request.marketer - the marketer linked to the login.
+
+    Staff may look at any marketer with ?marketer=<id>.
+    """
+    @login_required
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        marketer = None
+        if request.user.is_staff and request.GET.get('marketer', '').isdigit():
+            marketer = Marketer.objects.get_cached(int(request.GET['marketer']))
+        if marketer is None:
+            marketer = marketer_for_user(request.user)
+        if marketer is None:
+            raise PermissionDenied
+        request.marketer = marketer
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@marketer_required
+def marketer_portal(request):
+    """Totals per event, customers and recent orders of the marketer"""
+    summary = marketer_summary(request.marketer.pk)
+    orders = marketer_orders(request.marketer.pk).select_related('event').only(
+        'order_number', 'first_name', 'last_name', 'phone', 'total_amount', 'total_items',
+        'status', 'payment_status', 'created_at', 'event__name',
+    )
+    page = Paginator(orders, MARKETER_ORDERS_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'shop/marketer_portal.html', {
+        'marketer': request.marketer,
+        'summary': summary,
+        'page': page,
+    })
+
+
+@marketer_required
+def marketer_pos(request):
+    """Bulk order entry screen - posts batches to api:pos_orders"""
+    products = Product.objects.filter(is_active=True).with_on_hand().only(
+        'name', 'sku', 'price', 'stock', 'unlimited_stock'
+    ).order_by('name')
+    return render(request, 'shop/marketer_pos.html', {
+        'marketer': request.marketer,
+        'events': Event.objects.active(),
+        'products': products,
+    })
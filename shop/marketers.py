@@ -0,0 +1,84 @@
+# shop/marketers.py
+"""
+Sales numbers for the marketer portal.
+
+Every query is scoped by Order.marketer and walks the (marketer, created_at)
+index. The per-marketer aggregates (totals, per event, customers) are kept in
+the shared cache until one of the marketer's orders changes (see
+shop/signals.py) or MARKETER_SUMMARY_SECONDS pass, so a marketer refreshing
+the portal during a campaign costs a cache hit, not three GROUP BYs.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from .cache import cached
+from .models import Marketer, Order
+
+MARKETER_SUMMARY_SECONDS = 300
+MARKETER_CUSTOMERS_LIMIT = 200
+
+
+def marketer_for_user(user):
+    """The active Marketer linked to this login, or None (cached, see shop/cache.py)"""
+    if not user.is_authenticated:
+        return None
+    by_user = cached(
+        Marketer, 'by_user',
+        lambda: dict(Marketer.objects.filter(user__isnull=False, is_active=True).values_list('user_id', 'pk')),
+    )
+    marketer_id = by_user.get(user.pk)
+    return Marketer.objects.get_cached(marketer_id) if marketer_id else None
+
+
+def marketer_orders(marketer_id):
+    """The marketer's orders, newest first"""
+    return Order.objects.filter(marketer_id=marketer_id).order_by('-created_at')
+
+
+def _summary_key(marketer_id):
+    return f'marketer-summary:{marketer_id}'
+
+
+def invalidate_summary(*marketer_ids):
+    cache.delete_many([_summary_key(marketer_id) for marketer_id in marketer_ids if marketer_id])
+
+
+def build_summary(marketer_id):
+    """Totals, per-event totals and customers of a marketer; cancelled orders are left out"""
+    orders = marketer_orders(marketer_id).exclude(status='cancelled').order_by()
+
+    totals = orders.aggregate(
+        orders=Count('pk'), amount=Sum('total_amount'), items=Sum('total_items'),
+        customers=Count('email', distinct=True),
+    )
+    by_event = list(
+        orders.values('event_id', 'event__name')
+        .annotate(orders=Count('pk'), amount=Sum('total_amount'), items=Sum('total_items'))
+        .order_by('-amount')
+    )
+    customers = list(
+        orders.values('email')
+        .annotate(
+            first_name=Max('first_name'), last_name=Max('last_name'), phone=Max('phone'),
+            orders=Count('pk'), amount=Sum('total_amount'), last_order=Max('created_at'),
+        )
+        .order_by('-last_order')[:MARKETER_CUSTOMERS_LIMIT]
+    )
+    return {
+        'orders': totals['orders'],
+        'amount': totals['amount'] or 0,
+        'items': totals['items'] or 0,
+        'customers_count': totals['customers'],
+        'by_event': by_event,
+        'customers': customers,
+    }
+
+
+def marketer_summary(marketer_id):
+    """build_summary() through the shared cache"""
+    key = _summary_key(marketer_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_summary(marketer_id)
+        cache.set(key, summary, MARKETER_SUMMARY_SECONDS)
+    return summary
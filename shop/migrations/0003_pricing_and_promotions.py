@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_alter_marketer_last_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='coupon_code',
+            field=models.CharField(blank=True, max_length=30, verbose_name='קוד קופון'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='הנחה'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='סכום לפני הנחות'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='הנחה'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='promotion_name',
+            field=models.CharField(blank=True, max_length=100, verbose_name='מבצע'),
+        ),
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='שם המבצע')),
+                ('kind', models.CharField(choices=[('quantity', 'הנחת כמות'), ('event', 'הנחת אירוע'), ('marketer', 'הנחת משווק'), ('coupon', 'קופון')], max_length=20, verbose_name='סוג')),
+                ('percent_off', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='אחוז הנחה')),
+                ('amount_off', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='הנחה ליחידה')),
+                ('min_quantity', models.PositiveIntegerField(default=1, verbose_name='כמות מינימלית בשורה')),
+                ('code', models.CharField(blank=True, db_index=True, max_length=30, verbose_name='קוד קופון')),
+                ('is_active', models.BooleanField(default=True, verbose_name='פעיל')),
+                ('starts_at', models.DateTimeField(blank=True, null=True, verbose_name='מתחיל')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='מסתיים')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')),
+                ('category', models.ForeignKey(blank=True, help_text='ריק: כל הקטגוריות', null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.category', verbose_name='קטגוריה')),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.event', verbose_name='אירוע')),
+                ('marketer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.marketer', verbose_name='משווק')),
+                ('product', models.ForeignKey(blank=True, help_text='ריק: כל המוצרים', null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='מוצר')),
+            ],
+            options={
+                'verbose_name': 'מבצע',
+                'verbose_name_plural': 'מבצעים',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0003_pricing_and_promotions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'מכירה'), ('cancel', 'ביטול הזמנה'), ('restock', 'חידוש מלאי'), ('adjustment', 'תיקון מלאי')], max_length=20, verbose_name='סוג')),
+                ('quantity', models.IntegerField(help_text='חיובי: כניסה למלאי, שלילי: יציאה', verbose_name='כמות')),
+                ('note', models.CharField(blank=True, max_length=200, verbose_name='הערה')),
+                ('compacted', models.BooleanField(default=False, verbose_name='קופל')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='shop.order', verbose_name='הזמנה')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='shop.product', verbose_name='מוצר')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='בוצע על ידי')),
+            ],
+            options={
+                'verbose_name': 'תנועת מלאי',
+                'verbose_name_plural': 'תנועות מלאי',
+                'indexes': [models.Index(condition=models.Q(('compacted', False)), fields=['product'], name='shop_stock_pending_idx')],
+            },
+        ),
+    ]
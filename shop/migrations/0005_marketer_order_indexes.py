@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+from levshomea.schema import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0004_inventory_ledger'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['marketer', '-created_at'], name='shop_order_marketer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['marketer', 'event'], name='shop_order_marketer_event_idx'),
+        ),
+    ]
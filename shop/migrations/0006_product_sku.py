@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:07
+
+from django.db import migrations, models
+
+from levshomea.schema import create_index_concurrently
+
+# The unique index is built concurrently and then attached as the
+# constraint Django would have created ("<table>_<column>_key"), so later
+# AlterFields find it. Other databases get it from alter_field.
+SKU_CONSTRAINT = 'shop_product_sku_key'
+
+
+def _sku_fields(apps, unique):
+    Product = apps.get_model('shop', 'Product')
+    old = Product._meta.get_field('sku')
+    new = models.CharField(blank=True, max_length=32, null=True, unique=unique, verbose_name='מק"ט / ברקוד')
+    new.set_attributes_from_name('sku')
+    new.model = Product
+    return Product, old, new
+
+
+def add_sku_unique(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.alter_field(*_sku_fields(apps, unique=True))
+        return
+    create_index_concurrently(schema_editor, SKU_CONSTRAINT, 'shop_product', '("sku")', unique=True)
+    schema_editor.execute(
+        f'ALTER TABLE "shop_product" ADD CONSTRAINT "{SKU_CONSTRAINT}" UNIQUE USING INDEX "{SKU_CONSTRAINT}"'
+    )
+
+
+def remove_sku_unique(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        Product, old, new = _sku_fields(apps, unique=True)
+        schema_editor.alter_field(Product, new, old)
+        return
+    schema_editor.execute(f'ALTER TABLE "shop_product" DROP CONSTRAINT IF EXISTS "{SKU_CONSTRAINT}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0005_marketer_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=32, null=True, verbose_name='מק"ט / ברקוד'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_sku_unique, remove_sku_unique),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='product',
+                    name='sku',
+                    field=models.CharField(blank=True, max_length=32, null=True, unique=True, verbose_name='מק"ט / ברקוד'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+from levshomea.schema import create_index_concurrently
+
+# Prefix indexes for the admin search / autocomplete fields ('^field' in
+# search_fields). Django compiles an istartswith lookup on PostgreSQL to
+# UPPER("col"::text) LIKE UPPER('term%'), so the index is on that
+# expression with text_pattern_ops. Other databases are skipped. Order
+# search goes through the normalized columns instead (0016, shop/lookup.py).
+INDEXES = [
+    ('shop_product_name_prefix_idx', 'shop_product', 'name'),
+    ('shop_product_supplier_prefix_idx', 'shop_product', 'supplier'),
+    ('shop_product_sku_prefix_idx', 'shop_product', 'sku'),
+    ('shop_marketer_first_name_prefix_idx', 'shop_marketer', 'first_name'),
+    ('shop_marketer_last_name_prefix_idx', 'shop_marketer', 'last_name'),
+    ('shop_marketer_phone_prefix_idx', 'shop_marketer', 'phone'),
+    ('shop_event_name_prefix_idx', 'shop_event', 'name'),
+    ('shop_category_name_prefix_idx', 'shop_category', 'name'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        create_index_concurrently(schema_editor, name, table, f'(UPPER("{column}"::text) text_pattern_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0006_product_sku'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
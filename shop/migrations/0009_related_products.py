@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='משימה')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='מזהה אחרון שעובד')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')),
+            ],
+            options={
+                'verbose_name': 'מצב משימה',
+                'verbose_name_plural': 'מצב משימות',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='דירוג')),
+                ('score', models.FloatField(verbose_name='ציון')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='shop.product', verbose_name='מוצר')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='מוצר קשור')),
+            ],
+            options={
+                'verbose_name': 'מוצר קשור',
+                'verbose_name_plural': 'מוצרים קשורים',
+                'ordering': ['product', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='shop_relatedproduct_rank_uniq'),
+        ),
+    ]
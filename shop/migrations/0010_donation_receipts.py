@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0009_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(unique=True, verbose_name='מספר קבלה')),
+                ('kind', models.CharField(choices=[('order', 'הזמנה'), ('annual', 'סיכום שנתי')], max_length=10, verbose_name='סוג')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='שנה')),
+                ('donor_name', models.CharField(max_length=101, verbose_name='שם התורם')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='סכום')),
+                ('file', models.FileField(upload_to='receipts/', verbose_name='קובץ')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='גיבוב התוכן')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך הפקה')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='receipts', to='shop.order', verbose_name='הזמנה')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='donation_receipts', to=settings.AUTH_USER_MODEL, verbose_name='תורם')),
+            ],
+            options={
+                'verbose_name': 'קבלה על תרומה',
+                'verbose_name_plural': 'קבלות על תרומות',
+                'ordering': ['-number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='donationreceipt',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'order')), fields=('order',), name='shop_receipt_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='donationreceipt',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'annual')), fields=('user', 'year'), name='shop_receipt_annual_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The columns only - the backfill is in 0015 and the indexes are built
+    # concurrently in 0016, so shop_order is locked just for the ADD COLUMNs.
+
+    dependencies = [
+        ('shop', '0010_donation_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254, verbose_name='אימייל מנורמל'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='name_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=101, verbose_name='שם מנורמל'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='טלפון מנורמל'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+from levshomea.schema import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0011_contact_lookup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobstate',
+            name='last_timestamp',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='זמן עדכון אחרון שעובד'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='shop_order_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_export_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(db_index=True, max_length=32, verbose_name='טביעת אצבע')),
+                ('sql', models.TextField(verbose_name='SQL')),
+                ('params', models.JSONField(blank=True, null=True, verbose_name='פרמטרים')),
+                ('duration_ms', models.FloatField(verbose_name='משך (מ"ש)')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='תצוגה')),
+                ('location', models.CharField(blank=True, max_length=300, verbose_name='מיקום בקוד')),
+                ('request_id', models.CharField(blank=True, max_length=64, verbose_name='מזהה בקשה')),
+                ('plan', models.TextField(blank=True, verbose_name='תוכנית ביצוע')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='תאריך')),
+            ],
+            options={
+                'verbose_name': 'שאילתה איטית',
+                'verbose_name_plural': 'שאילתות איטיות',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def unlink_pos_receipts(apps, schema_editor):
+    # קבלות על מכירות קופה ישנות שנרשמו על שם המשווק - על שם איש הקשר בהזמנה, לא על המשווק
+    DonationReceipt = apps.get_model('shop', 'DonationReceipt')
+    DonationReceipt.objects.filter(kind='order', order__marketer__user=models.F('user')).update(user=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0013_slow_queries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donationreceipt',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='donation_receipts', to=settings.AUTH_USER_MODEL, verbose_name='תורם'),
+        ),
+        migrations.RunPython(unlink_pos_receipts, migrations.RunPython.noop),
+    ]
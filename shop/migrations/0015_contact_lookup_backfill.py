@@ -0,0 +1,43 @@
+import re
+
+from django.db import migrations
+
+from levshomea.schema import Backfill
+
+
+# Copies of the helpers in shop/models.py as they were when this migration
+# was written - the migration must not change when they do.
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    return digits
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_name(*parts):
+    return ' '.join(' '.join(parts).split()).lower()
+
+
+def normalize_contact(orders):
+    batch = list(orders.only('phone', 'email', 'first_name', 'last_name'))
+    for order in batch:
+        order.phone_normalized = normalize_phone(order.phone)
+        order.email_normalized = normalize_email(order.email)
+        order.name_normalized = normalize_name(order.first_name, order.last_name)
+    orders.bulk_update(batch, ['phone_normalized', 'email_normalized', 'name_normalized'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0014_receipt_contact_donor'),
+    ]
+
+    operations = [
+        Backfill('order', normalize_contact),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+from levshomea.schema import AddIndexConcurrently, create_index_concurrently
+
+# Trigram indexes for substring search (last digits of a phone, part of a
+# name or email) - LIKE '%term%' on PostgreSQL with pg_trgm. Prefix and exact
+# search use the varchar_pattern_ops indexes below.
+TRIGRAM_INDEXES = [
+    ('shop_order_phone_trgm_idx', 'shop_order', 'phone_normalized'),
+    ('shop_order_email_trgm_idx', 'shop_order', 'email_normalized'),
+    ('shop_order_name_trgm_idx', 'shop_order', 'name_normalized'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        create_index_concurrently(schema_editor, name, table, f'USING gin ("{column}" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0015_contact_lookup_backfill'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['phone_normalized'], name='shop_order_phone_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['email_normalized'], name='shop_order_email_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['name_normalized'], name='shop_order_name_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        # order_number__startswith is a LIKE prefix search, which the unique index cannot serve outside the C collation
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['order_number'], name='shop_order_number_pattern_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
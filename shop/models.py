@@ -1,8 +1,14 @@
 # shop/models.py - Updated version with all required fields
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+import re
 import uuid
+from decimal import Decimal
+
+from .cache import ReferenceManager
 
 class Marketer(models.Model):
     """משווק - מופיע בהזמנות ובמשתמשים"""
@@ -14,6 +20,8 @@ class Marketer(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='פעיל')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
     
+    objects = ReferenceManager()
+    
     class Meta:
         verbose_name = 'משווק'
         verbose_name_plural = 'משווקים'
@@ -28,6 +36,8 @@ class Event(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='פעיל')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
     
+    objects = ReferenceManager()
+    
     class Meta:
         verbose_name = 'אירוע'
         verbose_name_plural = 'אירועים'
@@ -42,6 +52,8 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='פעיל')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
     
+    objects = ReferenceManager()
+    
     class Meta:
         verbose_name = 'קטגוריה'
         verbose_name_plural = 'קטגוריות'
@@ -56,6 +68,8 @@ class Kashrut(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='פעיל')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
     
+    objects = ReferenceManager()
+    
     class Meta:
         verbose_name = 'כשרות'
         verbose_name_plural = 'כשרויות'
@@ -63,10 +77,38 @@ class Kashrut(models.Model):
     def __str__(self):
         return self.name
 
+def normalize_code(code):
+    """מק"ט / ברקוד בצורה אחידה - בלי רווחים, באותיות גדולות"""
+    return ''.join((code or '').split()).upper()
+
+def normalize_phone(phone):
+    """טלפון בספרות בלבד, בקידומת מקומית (+972-50... -> 050...)"""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    return digits
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+def normalize_name(*parts):
+    """שם בצורה אחידה - רווח אחד בין מילים, אותיות קטנות"""
+    return ' '.join(' '.join(parts).split()).lower()
+
+class ProductQuerySet(models.QuerySet):
+    def with_on_hand(self):
+        """מוסיף pending_stock - סכום תנועות המלאי שטרם קופלו, בשאילתה אחת"""
+        pending = StockMovement.objects.filter(product=models.OuterRef('pk'), compacted=False).values('product')
+        pending = pending.annotate(total=models.Sum('quantity')).values('total')
+        return self.annotate(
+            pending_stock=Coalesce(models.Subquery(pending, output_field=models.IntegerField()), 0)
+        )
+
 class Product(models.Model):
     """מוצר"""
     name = models.CharField(max_length=200, verbose_name='שם המוצר')
     slug = models.SlugField(unique=True, verbose_name='כתובת URL')
+    sku = models.CharField(max_length=32, unique=True, null=True, blank=True, verbose_name='מק"ט / ברקוד')
     description = models.TextField(verbose_name='תיאור')
     
     # קטגוריה וכשרות
@@ -83,6 +125,8 @@ class Product(models.Model):
     
     # כמות הזמנות
     total_orders = models.PositiveIntegerField(default=0, verbose_name='כמות הזמנות')
+    # ציון פופולריות דועך עם הזמן (shop/popularity.py)
+    popularity = models.FloatField(default=0, verbose_name='פופולריות')
     
     # תמונה
     image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name='תמונה')
@@ -94,13 +138,37 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך יצירה')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'מוצר'
         verbose_name_plural = 'מוצרים'
+        indexes = [
+            # רבי מכר לפי קטגוריה
+            models.Index(fields=['category', '-popularity'], name='shop_product_popularity_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # מק"ט מנורמל כמו שהסורק מחזיר אותו; ריק נשמר כ-NULL כדי לא להתנגש באינדקס הייחודי
+        self.sku = normalize_code(self.sku) or None
+        super().save(*args, **kwargs)
+    
+    @property
+    def on_hand(self):
+        """מלאי בפועל - היתרה המקופלת (stock) ועוד תנועות שטרם קופלו"""
+        pending = getattr(self, 'pending_stock', None)
+        if pending is None and self.pk is None:
+            pending = 0
+        elif pending is None:
+            pending = self.stock_movements.filter(compacted=False).aggregate(
+                total=models.Sum('quantity')
+            )['total'] or 0
+            self.pending_stock = pending
+        return self.stock + pending
+    
     @property
     def available(self):
         """בדיקה אם המוצר זמין"""
@@ -108,18 +176,128 @@ class Product(models.Model):
             return False
         if self.unlimited_stock:
             return True
-        return self.stock > 0
+        return self.on_hand > 0
     
     def reduce_stock(self, quantity):
-        """הפחתת מלאי"""
-        if not self.unlimited_stock and self.stock >= quantity:
-            self.stock -= quantity
-            self.save()
+        """הפחתת מלאי - נרשמת כתנועת מלאי"""
+        if self.unlimited_stock:
             return True
-        elif self.unlimited_stock:
+        if self.on_hand >= quantity:
+            StockMovement.objects.create(product=self, kind='sale', quantity=-quantity)
+            self.pending_stock = None
             return True
         return False
 
+class RelatedProduct(models.Model):
+    """מוצר שנקנה יחד עם מוצר אחר - מחושב מראש מהיסטוריית ההזמנות (shop/recommendations.py)"""
+    product = models.ForeignKey(Product, related_name='related_products', on_delete=models.CASCADE, verbose_name='מוצר')
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE, verbose_name='מוצר קשור')
+    rank = models.PositiveSmallIntegerField(verbose_name='דירוג')
+    score = models.FloatField(verbose_name='ציון')
+    
+    class Meta:
+        ordering = ['product', 'rank']
+        verbose_name = 'מוצר קשור'
+        verbose_name_plural = 'מוצרים קשורים'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='shop_relatedproduct_rank_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.product} -> {self.related}'
+
+class JobState(models.Model):
+    """מצב משימת רקע - עד איזה מזהה כבר עובד (לעיבוד מצטבר)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name='משימה')
+    last_id = models.BigIntegerField(default=0, verbose_name='מזהה אחרון שעובד')
+    # למשימות שמתקדמות לפי זמן עדכון (shop/export.py)
+    last_timestamp = models.DateTimeField(null=True, blank=True, verbose_name='זמן עדכון אחרון שעובד')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')
+    
+    class Meta:
+        verbose_name = 'מצב משימה'
+        verbose_name_plural = 'מצב משימות'
+    
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+class StockMovement(models.Model):
+    """תנועת מלאי - רק נוספות, אף פעם לא מתעדכנות (מלבד סימון הקיפול)"""
+    KIND_CHOICES = [
+        ('sale', 'מכירה'),
+        ('cancel', 'ביטול הזמנה'),
+        ('restock', 'חידוש מלאי'),
+        ('adjustment', 'תיקון מלאי'),
+    ]
+    
+    product = models.ForeignKey(Product, related_name='stock_movements', on_delete=models.CASCADE, verbose_name='מוצר')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='סוג')
+    quantity = models.IntegerField(verbose_name='כמות', help_text='חיובי: כניסה למלאי, שלילי: יציאה')
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name='הזמנה')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='בוצע על ידי')
+    note = models.CharField(max_length=200, blank=True, verbose_name='הערה')
+    
+    # קופל לתוך Product.stock (compact_stock)
+    compacted = models.BooleanField(default=False, verbose_name='קופל')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך')
+    
+    class Meta:
+        verbose_name = 'תנועת מלאי'
+        verbose_name_plural = 'תנועות מלאי'
+        indexes = [
+            models.Index(fields=['product'], condition=models.Q(compacted=False), name='shop_stock_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.product} {self.quantity:+d} ({self.get_kind_display()})'
+
+class Promotion(models.Model):
+    """מבצע - הנחה על שורות בעגלה"""
+    KIND_CHOICES = [
+        ('quantity', 'הנחת כמות'),
+        ('event', 'הנחת אירוע'),
+        ('marketer', 'הנחת משווק'),
+        ('coupon', 'קופון'),
+    ]
+    
+    name = models.CharField(max_length=100, verbose_name='שם המבצע')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='סוג')
+    
+    # גובה ההנחה - אחוז מהשורה או סכום ליחידה
+    percent_off = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name='אחוז הנחה')
+    amount_off = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='הנחה ליחידה')
+    
+    # תנאים
+    min_quantity = models.PositiveIntegerField(default=1, verbose_name='כמות מינימלית בשורה')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, verbose_name='מוצר', help_text='ריק: כל המוצרים')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, verbose_name='קטגוריה', help_text='ריק: כל הקטגוריות')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, null=True, blank=True, verbose_name='אירוע')
+    marketer = models.ForeignKey(Marketer, on_delete=models.CASCADE, null=True, blank=True, verbose_name='משווק')
+    code = models.CharField(max_length=30, blank=True, db_index=True, verbose_name='קוד קופון')
+    
+    # תוקף
+    is_active = models.BooleanField(default=True, verbose_name='פעיל')
+    starts_at = models.DateTimeField(null=True, blank=True, verbose_name='מתחיל')
+    ends_at = models.DateTimeField(null=True, blank=True, verbose_name='מסתיים')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הוספה')
+    
+    class Meta:
+        verbose_name = 'מבצע'
+        verbose_name_plural = 'מבצעים'
+    
+    def __str__(self):
+        return self.name
+    
+    def discount_for(self, quantity, unit_price):
+        """הנחה לשורה בכמות ובמחיר הנתונים"""
+        line_total = quantity * unit_price
+        discount = Decimal('0')
+        if self.percent_off:
+            discount = line_total * self.percent_off / 100
+        elif self.amount_off:
+            discount = quantity * self.amount_off
+        return min(discount, line_total).quantize(Decimal('0.01'))
+
 class CartItem(models.Model):
     """פריט בעגלת קניות"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='משתמש')
@@ -138,6 +316,22 @@ class CartItem(models.Model):
     def get_total_price(self):
         return self.quantity * self.product.price
 
+class OrderQuerySet(models.QuerySet):
+    def donated_by(self, user):
+        """הזמנות שהמשתמש תרם בעצמו - בלי מכירות קופה ישנות שנרשמו על שם המשווק שהזין אותן"""
+        return self.filter(user=user).exclude(marketer__user=user)
+    
+    @staticmethod
+    def _no_donor_account():
+        return models.Q(user__username=settings.POS_WALK_IN_USERNAME) | models.Q(marketer__user=models.F('user'))
+    
+    def without_donor_account(self):
+        """מכירות קופה שאינן רשומות על חשבון התורם - של תורם מזדמן, או ישנות שנרשמו על שם המשווק"""
+        return self.filter(self._no_donor_account())
+    
+    def with_donor_account(self):
+        return self.exclude(self._no_donor_account())
+
 class Order(models.Model):
     """הזמנה"""
     ORDER_STATUS_CHOICES = [
@@ -176,6 +370,11 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='סכום כולל')
     total_items = models.PositiveIntegerField(default=0, verbose_name='כמות פריטים')
     
+    # תמחור ברגע ההזמנה (shop/pricing.py)
+    subtotal_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='סכום לפני הנחות')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='הנחה')
+    coupon_code = models.CharField(max_length=30, blank=True, verbose_name='קוד קופון')
+    
     # סטטוס
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending', verbose_name='סטטוס הזמנה')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending', verbose_name='מצב תשלום')
@@ -184,22 +383,66 @@ class Order(models.Model):
     marketer = models.ForeignKey(Marketer, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='משווק')
     event = models.ForeignKey(Event, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='אירוע')
     
+    # פרטי קשר מנורמלים לחיפוש הזמנות (shop/lookup.py) - מתעדכנים ב-save, האינדקסים ב-Meta
+    phone_normalized = models.CharField(max_length=20, blank=True, editable=False, verbose_name='טלפון מנורמל')
+    email_normalized = models.CharField(max_length=254, blank=True, editable=False, verbose_name='אימייל מנורמל')
+    name_normalized = models.CharField(max_length=101, blank=True, editable=False, verbose_name='שם מנורמל')
+    
     # תאריכים
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הזמנה')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='תאריך עדכון')
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'הזמנה'
         verbose_name_plural = 'הזמנות'
+        indexes = [
+            # פורטל המשווקים - כל השאילתות מסוננות לפי משווק
+            models.Index(fields=['marketer', '-created_at'], name='shop_order_marketer_idx'),
+            models.Index(fields=['marketer', 'event'], name='shop_order_marketer_event_idx'),
+            # הייצוא המצטבר לקבצי Parquet סורק לפי זמן עדכון (shop/export.py)
+            models.Index(fields=['updated_at'], name='shop_order_updated_idx'),
+            # חיפוש הזמנות לפי תחילית וערך מדויק (shop/lookup.py); חיפוש בתוך הערך - אינדקסי trigram במיגרציה 0016
+            models.Index(fields=['phone_normalized'], name='shop_order_phone_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['email_normalized'], name='shop_order_email_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['name_normalized'], name='shop_order_name_norm_idx', opclasses=['varchar_pattern_ops']),
+            # חיפוש לפי תחילית מספר הזמנה (ORD-...) - LIKE שהאינדקס הייחודי אינו משרת מחוץ ל-collation C
+            models.Index(fields=['order_number'], name='shop_order_number_pattern_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return f'הזמנה {self.order_number}'
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # הערכים כפי שנטענו מהמסד - לזיהוי שינויים (shop/signals.py)
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        if 'marketer_id' in field_names:
+            instance._loaded_marketer_id = values[field_names.index('marketer_id')]
+        if 'event_id' in field_names and 'total_amount' in field_names:
+            instance._loaded_event_id = values[field_names.index('event_id')]
+            instance._loaded_total_amount = values[field_names.index('total_amount')]
+        return instance
+    
+    @staticmethod
+    def new_order_number():
+        # יצירת מספר הזמנה יניק
+        return f'ORD-{uuid.uuid4().hex[:8].upper()}'
+    
+    def normalize_contact(self):
+        # גם bulk_create קורא לזה (shop/orders.py) - הוא לא עובר דרך save
+        self.phone_normalized = normalize_phone(self.phone)
+        self.email_normalized = normalize_email(self.email)
+        self.name_normalized = normalize_name(self.first_name, self.last_name)
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # יצירת מספר הזמנה יניק
-            self.order_number = f'ORD-{uuid.uuid4().hex[:8].upper()}'
+            self.order_number = self.new_order_number()
+        self.normalize_contact()
         super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
@@ -208,6 +451,8 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='מוצר')
     quantity = models.PositiveIntegerField(verbose_name='כמות')
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='מחיר ברגע ההזמנה')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='הנחה')
+    promotion_name = models.CharField(max_length=100, blank=True, verbose_name='מבצע')
     
     class Meta:
         verbose_name = 'פריט בהזמנה'
@@ -217,4 +462,61 @@ class OrderItem(models.Model):
         return f'{self.order.order_number} - {self.product.name}'
     
     def get_total_price(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price - self.discount_amount
+
+class DonationReceipt(models.Model):
+    """קבלה על תרומה (סעיף 46) - להזמנה ששולמה או סיכום שנתי לתורם"""
+    KIND_CHOICES = [
+        ('order', 'הזמנה'),
+        ('annual', 'סיכום שנתי'),
+    ]
+    
+    # מספור רץ ללא חורים (shop/receipts.py)
+    number = models.PositiveIntegerField(unique=True, verbose_name='מספר קבלה')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='סוג')
+    # ריק בקבלה על מכירת קופה בלי חשבון תורם - הקבלה על שם איש הקשר בהזמנה
+    user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='donation_receipts', verbose_name='תורם')
+    order = models.ForeignKey(Order, on_delete=models.PROTECT, null=True, blank=True, related_name='receipts', verbose_name='הזמנה')
+    year = models.PositiveSmallIntegerField(verbose_name='שנה')
+    donor_name = models.CharField(max_length=101, verbose_name='שם התורם')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='סכום')
+    
+    # הקובץ נשמר לפי גיבוב התוכן - תוכן זהה נכתב פעם אחת
+    file = models.FileField(upload_to='receipts/', verbose_name='קובץ')
+    content_hash = models.CharField(max_length=64, verbose_name='גיבוב התוכן')
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך הפקה')
+    
+    class Meta:
+        ordering = ['-number']
+        verbose_name = 'קבלה על תרומה'
+        verbose_name_plural = 'קבלות על תרומות'
+        constraints = [
+            models.UniqueConstraint(fields=['order'], condition=models.Q(kind='order'), name='shop_receipt_order_uniq'),
+            models.UniqueConstraint(fields=['user', 'year'], condition=models.Q(kind='annual'), name='shop_receipt_annual_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'קבלה {self.number} - {self.donor_name}'
+
+class SlowQuery(models.Model):
+    """שאילתה איטית שנתפסה (shop/slow_queries.py) - נשמרות רק האחרונות"""
+    # גיבוב ה-SQL בלי ערכים - שאילתות מאותו מקום בקוד מקבלות אותו גיבוב
+    fingerprint = models.CharField(max_length=32, db_index=True, verbose_name='טביעת אצבע')
+    sql = models.TextField(verbose_name='SQL')
+    params = models.JSONField(null=True, blank=True, verbose_name='פרמטרים')
+    duration_ms = models.FloatField(verbose_name='משך (מ"ש)')
+    view = models.CharField(max_length=200, blank=True, verbose_name='תצוגה')
+    location = models.CharField(max_length=300, blank=True, verbose_name='מיקום בקוד')
+    request_id = models.CharField(max_length=64, blank=True, verbose_name='מזהה בקשה')
+    # EXPLAIN (ANALYZE, BUFFERS) לחלק מהשאילתות, ב-PostgreSQL בלבד
+    plan = models.TextField(blank=True, verbose_name='תוכנית ביצוע')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='תאריך')
+    
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'שאילתה איטית'
+        verbose_name_plural = 'שאילתות איטיות'
+    
+    def __str__(self):
+        return f'{self.duration_ms:.0f}ms {self.view or self.location}'
@@ -0,0 +1,230 @@
+# shop/orders.py
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from accounts.models import UserProfile
+
+from campaigns.counters import record_orders
+from levshomea.metrics import POS_ORDERS, STOCK_OUTS, track_checkout
+from .inventory import OutOfStock, on_hand_map, record_sale, record_sales
+from .marketers import invalidate_summary
+from .models import CartItem, Marketer, Order, OrderItem, Product, normalize_email, normalize_phone
+from .popularity import record_order_lines
+from .pricing import PricedLine, applicable_promotions, price_cart, price_lines
+
+# שדות פרטי הלקוח שנשמרים בהזמנה
+CUSTOMER_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'address', 'city', 'postal_code')
+REQUIRED_CUSTOMER_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def missing_customer_fields(customer):
+    """Return the required customer fields that are empty"""
+    return [field for field in REQUIRED_CUSTOMER_FIELDS if not customer.get(field)]
+
+
+@track_checkout
+def place_order(user, customer, coupon_code='', event=None, marketer=None):
+    """
+    Create an order from the user's cart, record its stock movements and
+    clear the cart.
+
+    Shared by the storefront checkout and the API. Prices and promotions come
+    from shop.pricing and are snapshotted onto the order and its items.
+    Raises ValueError when the cart is empty, OutOfStock (a ValueError)
+    when a product does not have enough stock.
+    """
+    pricing = price_cart(user, event=event, marketer=marketer, coupon_code=coupon_code)
+
+    if not pricing:
+        raise ValueError('העגלה שלך ריקה')
+
+    with transaction.atomic():
+        on_hand = on_hand_map([line.product.pk for line in pricing.lines if not line.product.unlimited_stock])
+        for line in pricing.lines:
+            if line.product.pk in on_hand and on_hand[line.product.pk] < line.quantity:
+                raise OutOfStock(f'מוצר {line.product.name} אינו זמין במלאי מספיק')
+
+        # Create order
+        order = Order.objects.create(
+            user=user,
+            subtotal_amount=pricing.subtotal,
+            discount_amount=pricing.discount,
+            coupon_code=pricing.coupon_code if pricing.coupon_applied else '',
+            total_amount=pricing.total,
+            total_items=pricing.total_items,
+            event=event,
+            marketer=marketer,
+            **{field: customer.get(field, '') for field in CUSTOMER_FIELDS}
+        )
+
+        # Create order items
+        OrderItem.objects.bulk_create(_order_items(order, pricing))
+
+        # Stock ledger (compacted into Product.stock by compact_stock)
+        record_sale(order, [(line.product, line.quantity) for line in pricing.lines])
+
+        # Best sellers (counted in memory, written in batches)
+        product_ids = [line.product.pk for line in pricing.lines]
+        transaction.on_commit(lambda: record_order_lines(product_ids))
+
+        # Clear cart
+        CartItem.objects.filter(user=user).delete()
+
+    return order
+
+
+def _order_items(order, pricing):
+    return [
+        OrderItem(
+            order=order,
+            product=line.product,
+            quantity=line.quantity,
+            price=line.unit_price,
+            discount_amount=line.discount,
+            promotion_name=line.promotion.name if line.promotion else '',
+        )
+        for line in pricing.lines
+    ]
+
+
+def walk_in_user():
+    """The inactive user that owns POS orders of donors without an account"""
+    user, created = User.objects.get_or_create(
+        username=settings.POS_WALK_IN_USERNAME, defaults={'first_name': 'תורם', 'last_name': 'מזדמן', 'is_active': False}
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def pos_owners(orders):
+    """
+    The user each POS order belongs to, in order: the active account whose
+    profile phone or email matches the donor's, else walk_in_user().
+    Marketers' own accounts are never picked, so a marketer who types their
+    own phone doesn't end up owning the sale.
+    """
+    phones = {normalize_phone(data.get('phone')) for data in orders} - {''}
+    emails = {normalize_email(data.get('email')) for data in orders} - {''}
+    marketer_users = Marketer.objects.filter(user__isnull=False).values('user_id')
+
+    by_phone = {}
+    profiles = UserProfile.objects.filter(
+        Q(phone_normalized__in=phones) | Q(phone2_normalized__in=phones), user__is_active=True,
+    ).exclude(user_id__in=marketer_users).select_related('user').order_by('pk')
+    for profile in profiles:
+        for phone in (profile.phone_normalized, profile.phone2_normalized):
+            by_phone.setdefault(phone, profile.user)
+
+    by_email = {}
+    users = User.objects.annotate(email_lower=Lower('email')).filter(
+        email_lower__in=emails, is_active=True,
+    ).exclude(pk__in=marketer_users).order_by('pk')
+    for donor in users:
+        by_email.setdefault(donor.email_lower, donor)
+
+    walk_in = None
+    owners = []
+    for data in orders:
+        owner = by_phone.get(normalize_phone(data.get('phone'))) or by_email.get(normalize_email(data.get('email')))
+        if owner is None:
+            walk_in = walk_in or walk_in_user()
+            owner = walk_in
+        owners.append(owner)
+    return owners
+
+
+def place_bulk_orders(orders, event=None, marketer=None):
+    """
+    Create a batch of orders typed in at an event (POS entry).
+
+    Each order belongs to its donor (see pos_owners), not to whoever entered
+    it; the marketer is recorded in Order.marketer.
+
+    orders: list of dicts with the CUSTOMER_FIELDS and 'items', a list of
+    {'product': id, 'quantity': n}. Stock for the whole batch is checked with
+    one query and allocated in batch order; orders that can't be filled are
+    skipped. The rest are created with bulk_create (Order.save() and the
+    post_save signals don't run, so everything they do is done here).
+
+    Returns one (order, error) pair per input order, in input order.
+    """
+    product_ids = {item['product'] for data in orders for item in data['items']}
+    products = Product.objects.filter(pk__in=product_ids, is_active=True).with_on_hand().in_bulk()
+    remaining = {pk: product.on_hand for pk, product in products.items() if not product.unlimited_stock}
+
+    results = [(None, None)] * len(orders)
+    accepted = []
+    for index, data in enumerate(orders):
+        quantities = {}
+        for item in data['items']:
+            quantities[item['product']] = quantities.get(item['product'], 0) + item['quantity']
+
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            results[index] = (None, f'מוצר לא נמצא: {", ".join(map(str, missing))}')
+            POS_ORDERS.labels('failed').inc()
+            continue
+        short = [products[pk].name for pk, quantity in quantities.items() if remaining.get(pk, quantity) < quantity]
+        if short:
+            results[index] = (None, f'אין מספיק מלאי: {", ".join(short)}')
+            POS_ORDERS.labels('failed').inc()
+            STOCK_OUTS.labels('pos').inc()
+            continue
+
+        for pk, quantity in quantities.items():
+            if pk in remaining:
+                remaining[pk] -= quantity
+        accepted.append((index, data, [PricedLine(products[pk], quantity) for pk, quantity in quantities.items()]))
+
+    if not accepted:
+        return results
+
+    promotions = applicable_promotions(
+        [line for _, _, lines in accepted for line in lines], event=event, marketer=marketer
+    )
+
+    owners = pos_owners([data for _, data, _ in accepted])
+    with transaction.atomic():
+        created = []
+        for (index, data, lines), owner in zip(accepted, owners):
+            pricing = price_lines(lines, promotions)
+            order = Order(
+                order_number=Order.new_order_number(),
+                user=owner,
+                subtotal_amount=pricing.subtotal,
+                discount_amount=pricing.discount,
+                total_amount=pricing.total,
+                total_items=pricing.total_items,
+                event=event,
+                marketer=marketer,
+                **{field: data.get(field, '') for field in CUSTOMER_FIELDS}
+            )
+            order.normalize_contact()
+            created.append((index, order, pricing))
+
+        Order.objects.bulk_create([order for _, order, _ in created])
+        OrderItem.objects.bulk_create([
+            item for _, order, pricing in created for item in _order_items(order, pricing)
+        ])
+        record_sales([
+            (order, [(line.product, line.quantity) for line in pricing.lines]) for _, order, pricing in created
+        ])
+        record_orders([order for _, order, _ in created])
+
+        def count_popularity():
+            for _, _, pricing in created:
+                record_order_lines([line.product.pk for line in pricing.lines])
+        transaction.on_commit(count_popularity)
+
+        if marketer is not None:
+            transaction.on_commit(lambda: invalidate_summary(marketer.pk))
+        transaction.on_commit(lambda: POS_ORDERS.labels('created').inc(len(created)))
+
+    for index, order, _ in created:
+        results[index] = (order, None)
+    return results
@@ -0,0 +1,183 @@
+# shop/popularity.py
+"""
+Product popularity: Product.total_orders and a time-decayed score.
+
+Orders add to a per-process counter in memory; a background thread writes
+the counts with one bulk UPDATE every POPULARITY_FLUSH_SECONDS (and
+gunicorn's worker_exit hook flushes what is left), so counting costs no
+write per request.
+
+The decayed score uses a fixed epoch instead of periodically decaying every
+row: an order at time t adds 2 ** ((t - epoch) / half-life), so an order
+from one half-life ago counts half as much as one now. Ranking by this
+score is the same as ranking by the decayed score today, and old rows
+never need to be touched. Doubles cover several decades of weeks past the
+epoch.
+
+best_sellers() is the top products of every category, built with one
+window query and served from the shared cache.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.db.models import Case, F, FloatField, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Category, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+POPULARITY_FLUSH_SECONDS = 30
+POPULARITY_HALF_LIFE_DAYS = 14
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+BEST_SELLERS_PER_CATEGORY = 4
+BEST_SELLERS_CACHE_KEY = 'best-sellers'
+BEST_SELLERS_CACHE_SECONDS = 10 * 60
+
+REBUILD_BATCH_SIZE = 500
+
+
+def order_weight(when=None):
+    """Score of one order at time when (default now)"""
+    when = when or timezone.now()
+    half_lives = (when - POPULARITY_EPOCH).total_seconds() / (POPULARITY_HALF_LIFE_DAYS * 86400)
+    return 2.0 ** half_lives
+
+
+def _per_product(values, output_field, default):
+    """CASE pk WHEN ... THEN value - one UPDATE for many products"""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        default=Value(default), output_field=output_field,
+    )
+
+
+class PopularityCounter:
+    """Pending per-product counts of this process"""
+
+    def __init__(self, interval=POPULARITY_FLUSH_SECONDS):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, product_ids):
+        """Count one order of each of these products"""
+        weight = order_weight()
+        with self._lock:
+            for product_id in product_ids:
+                orders, score = self._pending.get(product_id, (0, 0.0))
+                self._pending[product_id] = (orders + 1, score + weight)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='popularity-flush', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write the pending counts with one UPDATE; returns the number of products updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            Product.objects.filter(pk__in=pending).update(
+                total_orders=F('total_orders') + _per_product(
+                    {pk: orders for pk, (orders, _) in pending.items()}, IntegerField(), 0
+                ),
+                popularity=F('popularity') + _per_product(
+                    {pk: score for pk, (_, score) in pending.items()}, FloatField(), 0.0
+                ),
+            )
+        except Exception:
+            # keep the counts for the next flush
+            with self._lock:
+                for pk, (orders, score) in pending.items():
+                    pending_orders, pending_score = self._pending.get(pk, (0, 0.0))
+                    self._pending[pk] = (pending_orders + orders, pending_score + score)
+            raise
+        return len(pending)
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.interval)
+                close_old_connections()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning('popularity flush failed: %s', e)
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            connection.close()
+
+
+counter = PopularityCounter()
+
+
+def record_order_lines(product_ids):
+    """Count an order's products (call after commit)"""
+    counter.record(set(product_ids))
+
+
+def rebuild():
+    """
+    Recompute total_orders and the score of every product from OrderItem.
+
+    One pass over the order lines, then one UPDATE per REBUILD_BATCH_SIZE
+    products. Cancelled orders don't count.
+    """
+    totals = {}
+    lines = OrderItem.objects.exclude(order__status='cancelled').values_list('product_id', 'order__created_at')
+    for product_id, created_at in lines.iterator(chunk_size=5000):
+        orders, score = totals.get(product_id, (0, 0.0))
+        totals[product_id] = (orders + 1, score + order_weight(created_at))
+
+    Product.objects.exclude(pk__in=totals).update(total_orders=0, popularity=0)
+    product_ids = list(totals)
+    for start in range(0, len(product_ids), REBUILD_BATCH_SIZE):
+        batch = {pk: totals[pk] for pk in product_ids[start:start + REBUILD_BATCH_SIZE]}
+        Product.objects.filter(pk__in=batch).update(
+            total_orders=_per_product({pk: orders for pk, (orders, _) in batch.items()}, IntegerField(), 0),
+            popularity=_per_product({pk: score for pk, (_, score) in batch.items()}, FloatField(), 0.0),
+        )
+    cache.delete(BEST_SELLERS_CACHE_KEY)
+    return len(totals)
+
+
+def build_best_sellers(per_category=BEST_SELLERS_PER_CATEGORY):
+    """[(category, [products])] for the active categories, best first"""
+    ranked = (
+        Product.objects.filter(is_active=True, category__is_active=True, total_orders__gt=0)
+        .annotate(rank=Window(RowNumber(), partition_by=F('category_id'), order_by=[F('popularity').desc(), F('pk')]))
+        .filter(rank__lte=per_category)
+        .only('name', 'slug', 'price', 'image', 'category_id')
+        .order_by('category_id', 'rank')
+    )
+    by_category = {}
+    for product in ranked:
+        by_category.setdefault(product.category_id, []).append(product)
+    return [
+        (category, by_category[category.pk])
+        for category in Category.objects.active()
+        if category.pk in by_category
+    ]
+
+
+def best_sellers():
+    """build_best_sellers() through the shared cache"""
+    result = cache.get(BEST_SELLERS_CACHE_KEY)
+    if result is None:
+        result = build_best_sellers()
+        cache.set(BEST_SELLERS_CACHE_KEY, result, BEST_SELLERS_CACHE_SECONDS)
+    return result
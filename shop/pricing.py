@@ -0,0 +1,150 @@
+# shop/pricing.py
+"""
+Cart pricing and promotions.
+
+price_cart() prices a whole cart with two queries whatever its size: one
+annotated query returns the lines together with the cart subtotal and item
+count (window aggregates), and one query loads every promotion that could
+apply to any of those lines. Each line then gets the single best applicable
+promotion in one pass in Python.
+
+price_lines() does the same for lines that are not in a cart (bulk POS
+entry, see orders.place_bulk_orders).
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Window
+from django.utils import timezone
+
+from .models import CartItem, Promotion
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class PricedLine:
+    """שורה מתומחרת בעגלה"""
+
+    def __init__(self, product, quantity, line_total=None, cart_item=None):
+        self.cart_item = cart_item
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = product.price
+        self.line_total = line_total if line_total is not None else product.price * quantity
+        self.discount = Decimal('0')
+        self.promotion = None
+
+    @property
+    def total(self):
+        return self.line_total - self.discount
+
+
+class CartPricing:
+    """תמחור עגלה - שורות, סכומים והנחות"""
+
+    def __init__(self, lines, subtotal, total_items, coupon_code='', coupon_applied=False, coupon_valid=False):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.total_items = total_items
+        self.discount = sum((line.discount for line in lines), Decimal('0'))
+        self.total = subtotal - self.discount
+        self.coupon_code = coupon_code
+        self.coupon_applied = coupon_applied
+        # הקופון תקף לעגלה גם אם מבצע משתלם יותר גבר עליו
+        self.coupon_valid = coupon_valid or coupon_applied
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def priced_cart_queryset(user):
+    """Cart lines with line_total, cart_subtotal and cart_items in one query"""
+    line_total = ExpressionWrapper(F('quantity') * F('product__price'), output_field=MONEY)
+    return (
+        CartItem.objects.filter(user=user)
+        .select_related('product')
+        .annotate(
+            line_total=line_total,
+            cart_subtotal=Window(Sum(line_total), output_field=MONEY),
+            cart_items=Window(Sum('quantity')),
+        )
+        .order_by('created_at', 'pk')
+    )
+
+
+def applicable_promotions(lines, event=None, marketer=None, coupon_code=''):
+    """All promotions that could apply to these lines, in one query"""
+    now = timezone.now()
+    product_ids = {line.product.pk for line in lines}
+    category_ids = {line.product.category_id for line in lines}
+
+    kinds = Q(kind='quantity')
+    if event is not None:
+        kinds |= Q(kind='event', event=event)
+    if marketer is not None:
+        kinds |= Q(kind='marketer', marketer=marketer)
+    if coupon_code:
+        kinds |= Q(kind='coupon', code__iexact=coupon_code)
+
+    return list(
+        Promotion.objects.filter(kinds, is_active=True)
+        .filter(Q(starts_at__isnull=True) | Q(starts_at__lte=now))
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .filter(Q(product__isnull=True) | Q(product_id__in=product_ids))
+        .filter(Q(category__isnull=True) | Q(category_id__in=category_ids))
+    )
+
+
+def _matches(promotion, line):
+    return (
+        line.quantity >= promotion.min_quantity
+        and promotion.product_id in (None, line.product.pk)
+        and promotion.category_id in (None, line.product.category_id)
+    )
+
+
+def apply_promotions(lines, promotions):
+    """Give every line its best promotion out of promotions; returns True if a coupon was used"""
+    coupon_applied = False
+    for line in lines:
+        for promotion in promotions:
+            if not _matches(promotion, line):
+                continue
+            discount = promotion.discount_for(line.quantity, line.unit_price)
+            if discount > line.discount:
+                line.discount, line.promotion = discount, promotion
+        coupon_applied |= bool(line.promotion and line.promotion.kind == 'coupon')
+    return coupon_applied
+
+
+def price_lines(lines, promotions):
+    """CartPricing for lines built outside a cart, with promotions already loaded"""
+    apply_promotions(lines, promotions)
+    return CartPricing(
+        lines,
+        subtotal=sum((line.line_total for line in lines), Decimal('0')),
+        total_items=sum(line.quantity for line in lines),
+    )
+
+
+def price_cart(user, event=None, marketer=None, coupon_code=''):
+    """Price the user's cart; every line gets its best applicable promotion"""
+    coupon_code = coupon_code.strip()
+    cart_items = list(priced_cart_queryset(user))
+    lines = [PricedLine(item.product, item.quantity, item.line_total, cart_item=item) for item in cart_items]
+    if not lines:
+        return CartPricing([], Decimal('0'), 0, coupon_code)
+
+    promotions = applicable_promotions(lines, event, marketer, coupon_code)
+    coupon_applied = apply_promotions(lines, promotions)
+    coupon_valid = any(
+        promotion.kind == 'coupon' and _matches(promotion, line) for promotion in promotions for line in lines
+    )
+
+    return CartPricing(
+        lines,
+        subtotal=cart_items[0].cart_subtotal,
+        total_items=cart_items[0].cart_items,
+        coupon_code=coupon_code,
+        coupon_applied=coupon_applied,
+        coupon_valid=coupon_valid,
+    )
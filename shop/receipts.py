@@ -0,0 +1,212 @@
+# shop/receipts.py
+"""
+Donation receipts (Section 46) - one per paid order and an annual summary
+per donor.
+
+POS orders without a donor account (Order.objects.without_donor_account():
+walk-in donors, and old sales recorded under the marketer who entered them)
+get only their order receipt, made out to the contact on the order and
+linked to no user. They are left out of the annual summaries, which are
+per account.
+
+Receipt numbers must run without gaps, so they come from a counter row
+(JobState 'donation-receipts') that is locked for the whole batch: the
+candidates are selected, numbered, rendered and inserted in one
+transaction, and a crash rolls the numbers back with the rows. Every
+batch commits on its own, so an interrupted run resumes where it stopped -
+candidates are simply the orders/donors that have no receipt yet.
+
+Rendering runs in a process pool; each worker compiles the receipt
+template once (the pool initializer) and returns the HTML with its sha256.
+Files are stored under their hash, so a batch re-rendered after a rollback
+produces the same files and nothing is written twice.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import DonationReceipt, JobState, Order
+
+COUNTER_NAME = 'donation-receipts'
+RECEIPT_TEMPLATE = 'shop/receipts/receipt.html'
+RECEIPT_BATCH_SIZE = 500
+
+_template = None
+
+
+def _init_worker():
+    """Pool initializer: set up Django if the worker was spawned, compile the template once"""
+    global _template
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    _template = get_template(RECEIPT_TEMPLATE)
+
+
+def render_receipt(context):
+    """(sha256, html bytes) of one receipt"""
+    if _template is None:
+        _init_worker()
+    content = _template.render(context).encode('utf-8')
+    return hashlib.sha256(content).hexdigest(), content
+
+
+@contextmanager
+def _renderer(workers=None):
+    """map() over render_receipt - in a pool unless there is one worker"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield lambda contexts: map(render_receipt, contexts)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield lambda contexts: pool.map(render_receipt, contexts, chunksize=16)
+
+
+def _store(content_hash, content):
+    name = f'receipts/{content_hash[:2]}/{content_hash}.html'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def _money(amount):
+    return f'{amount:,.2f}'
+
+
+def _issue(render, select):
+    """
+    Number, render and save one batch in one transaction.
+
+    select() returns [(DonationReceipt without number/file, template context)]
+    and runs after the counter is locked. Returns the number of receipts.
+    """
+    with transaction.atomic():
+        counter, _ = JobState.objects.select_for_update().get_or_create(name=COUNTER_NAME)
+        pending = select()
+        if not pending:
+            return 0
+        issued_on = timezone.localdate().strftime('%d/%m/%Y')
+        for offset, (receipt, context) in enumerate(pending, start=1):
+            receipt.number = counter.last_id + offset
+            context.update(
+                number=receipt.number,
+                issued_on=issued_on,
+                organization_name=settings.RECEIPT_ORGANIZATION_NAME,
+                organization_number=settings.RECEIPT_ORGANIZATION_NUMBER,
+            )
+        receipts = [receipt for receipt, _ in pending]
+        for receipt, (content_hash, content) in zip(receipts, render([context for _, context in pending])):
+            receipt.content_hash = content_hash
+            receipt.file.name = _store(content_hash, content)
+        DonationReceipt.objects.bulk_create(receipts)
+        counter.last_id += len(receipts)
+        counter.save(update_fields=['last_id', 'updated_at'])
+    return len(receipts)
+
+
+def paid_orders():
+    return Order.objects.filter(payment_status='paid').exclude(status='cancelled')
+
+
+def _order_batch(batch_size):
+    def select():
+        orders = (
+            paid_orders()
+            .filter(~Exists(DonationReceipt.objects.filter(order=OuterRef('pk'))))
+            .only('user_id', 'order_number', 'first_name', 'last_name', 'email', 'total_amount', 'created_at')
+            .order_by('pk')[:batch_size]
+        )
+        no_account = set(
+            Order.objects.without_donor_account().filter(pk__in=[order.pk for order in orders]).values_list('pk', flat=True)
+        )
+        pending = []
+        for order in orders:
+            created = timezone.localtime(order.created_at)
+            donor_name = f'{order.first_name} {order.last_name}'.strip()
+            pending.append((
+                DonationReceipt(
+                    kind='order', user_id=None if order.pk in no_account else order.user_id,
+                    order=order, year=created.year,
+                    donor_name=donor_name, amount=order.total_amount,
+                ),
+                {
+                    'kind': 'order', 'donor_name': donor_name, 'email': order.email,
+                    'amount': _money(order.total_amount),
+                    'orders': [(order.order_number, created.strftime('%d/%m/%Y'), _money(order.total_amount))],
+                },
+            ))
+        return pending
+    return select
+
+
+def _annual_batch(year, batch_size):
+    def select():
+        has_receipt = DonationReceipt.objects.filter(kind='annual', year=year, user=OuterRef('user_id'))
+        year_orders = paid_orders().filter(created_at__year=year).with_donor_account()
+        donors = list(
+            year_orders.filter(~Exists(has_receipt))
+            .values('user_id', 'user__first_name', 'user__last_name', 'user__email')
+            .annotate(amount=Sum('total_amount'), orders=Count('pk'))
+            .order_by('user_id')[:batch_size]
+        )
+        if not donors:
+            return []
+        lines = {}
+        for row in (
+            year_orders.filter(user_id__in=[donor['user_id'] for donor in donors])
+            .values('user_id', 'order_number', 'created_at', 'total_amount', 'first_name', 'last_name')
+            .order_by('created_at')
+        ):
+            lines.setdefault(row['user_id'], []).append(row)
+
+        pending = []
+        for donor in donors:
+            orders = lines[donor['user_id']]
+            donor_name = (
+                f"{donor['user__first_name']} {donor['user__last_name']}".strip()
+                or f"{orders[-1]['first_name']} {orders[-1]['last_name']}".strip()
+            )
+            pending.append((
+                DonationReceipt(
+                    kind='annual', user_id=donor['user_id'], year=year,
+                    donor_name=donor_name, amount=donor['amount'],
+                ),
+                {
+                    'kind': 'annual', 'year': year, 'donor_name': donor_name, 'email': donor['user__email'],
+                    'amount': _money(donor['amount']),
+                    'orders': [
+                        (row['order_number'], timezone.localtime(row['created_at']).strftime('%d/%m/%Y'), _money(row['total_amount']))
+                        for row in orders
+                    ],
+                },
+            ))
+        return pending
+    return select
+
+
+def issue_order_receipts(batch_size=RECEIPT_BATCH_SIZE, workers=None):
+    """Receipts for every paid order that has none; returns how many were issued"""
+    total = 0
+    with _renderer(workers) as render:
+        while issued := _issue(render, _order_batch(batch_size)):
+            total += issued
+    return total
+
+
+def issue_annual_receipts(year, batch_size=RECEIPT_BATCH_SIZE, workers=None):
+    """Annual summaries of year for every donor that has none; returns how many were issued"""
+    total = 0
+    with _renderer(workers) as render:
+        while issued := _issue(render, _annual_batch(year, batch_size)):
+            total += issued
+    return total
@@ -0,0 +1,139 @@
+# shop/recommendations.py
+"""
+"Frequently bought together" from OrderItem co-occurrence.
+
+The order lines are loaded as two integer arrays (order id, product id) and
+turned into a sparse orders x products basket matrix B; B.T @ B is then the
+product x product co-occurrence matrix. Scores are cosine similarities
+(co-occurrences / sqrt(orders of a * orders of b)), pairs bought together
+fewer than min_count times are dropped, and the top_k of every product are
+stored as RelatedProduct rows, which product_detail reads with one query
+on the (product, rank) index.
+
+refresh() is incremental: it only recomputes the products that appear in
+orders newer than the last run (JobState 'recommendations'), using every
+order that contains one of them. Scores of the other products drift a
+little as order counts change, and cancellations are only picked up by a
+full rebuild - run one nightly (build_recommendations --full).
+"""
+import itertools
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from scipy import sparse
+
+from .models import JobState, Order, OrderItem, RelatedProduct
+
+JOB_NAME = 'recommendations'
+TOP_K = 8
+MIN_COUNT = 2
+WRITE_BATCH_SIZE = 5000
+
+
+def load_lines(lines):
+    """(order ids, product ids) of an OrderItem queryset as int64 arrays"""
+    rows = lines.values_list('order_id', 'product_id').order_by().iterator(chunk_size=20000)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    return flat[0::2], flat[1::2]
+
+
+def cooccurrence(order_ids, product_ids):
+    """
+    Returns (products, counts, support).
+
+    products: the distinct product ids (matrix index -> id), counts: sparse
+    co-occurrence matrix without the diagonal, support: number of orders
+    per product in these lines.
+    """
+    orders, order_index = np.unique(order_ids, return_inverse=True)
+    products, product_index = np.unique(product_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(order_index), dtype=np.float32), (order_index, product_index)),
+        shape=(len(orders), len(products)),
+    )
+    baskets.data[:] = 1  # the same product twice in an order counts once
+    counts = (baskets.T @ baskets).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    support = np.asarray(baskets.sum(axis=0)).ravel()
+    return products, counts, support
+
+
+def top_related(products, counts, support, rows, top_k=TOP_K, min_count=MIN_COUNT):
+    """RelatedProduct rows (unsaved) for the given matrix rows"""
+    related = []
+    for row in rows:
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        columns, values = counts.indices[start:end], counts.data[start:end]
+        keep = values >= min_count
+        columns, values = columns[keep], values[keep]
+        if not len(columns):
+            continue
+        scores = values / np.sqrt(support[row] * support[columns])
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            columns, scores = columns[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        related.extend(
+            RelatedProduct(
+                product_id=int(products[row]), related_id=int(products[column]),
+                rank=rank, score=float(score),
+            )
+            for rank, (column, score) in enumerate(zip(columns[order], scores[order]), start=1)
+        )
+    return related
+
+
+def refresh(full=False, top_k=TOP_K, min_count=MIN_COUNT):
+    """Recompute the related products; returns the number of products recomputed"""
+    state, _ = JobState.objects.get_or_create(name=JOB_NAME)
+    last_id = Order.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+    lines = OrderItem.objects.filter(order_id__lte=last_id).exclude(order__status='cancelled')
+
+    if full or not state.last_id:
+        affected = None
+    else:
+        affected = set(
+            lines.filter(order_id__gt=state.last_id).values_list('product_id', flat=True).distinct()
+        )
+        if not affected:
+            state.last_id = last_id
+            state.save(update_fields=['last_id', 'updated_at'])
+            return 0
+        lines = lines.filter(order_id__in=OrderItem.objects.filter(product_id__in=affected).values('order_id'))
+
+    products, counts, support = cooccurrence(*load_lines(lines))
+    if affected is None:
+        rows = range(len(products))
+    else:
+        # a product's order count over all orders, not just the loaded ones
+        totals = dict(
+            OrderItem.objects.filter(order_id__lte=last_id, product_id__in=products.tolist())
+            .exclude(order__status='cancelled')
+            .values('product_id').annotate(orders=Count('order_id', distinct=True))
+            .values_list('product_id', 'orders')
+        )
+        support = np.array([totals.get(int(product_id), 0) for product_id in products], dtype=np.float64)
+        rows = np.flatnonzero(np.isin(products, list(affected)))
+
+    related = top_related(products, counts, support, rows, top_k, min_count)
+
+    with transaction.atomic():
+        if affected is None:
+            RelatedProduct.objects.all().delete()
+        else:
+            RelatedProduct.objects.filter(product_id__in=affected).delete()
+        RelatedProduct.objects.bulk_create(related, batch_size=WRITE_BATCH_SIZE)
+        state.last_id = last_id
+        state.save(update_fields=['last_id', 'updated_at'])
+    return len(rows)
+
+
+def related_products(product, limit=TOP_K):
+    """The precomputed related products of a product, best first (one query)"""
+    return [
+        row.related for row in
+        RelatedProduct.objects.filter(product=product, related__is_active=True)
+        .select_related('related').order_by('rank')[:limit]
+    ]
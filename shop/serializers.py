@@ -0,0 +1,156 @@
+# shop/serializers.py
+from rest_framework import serializers
+
+from .models import Category, Product, CartItem, Order, OrderItem, Event, Marketer
+
+# מספר ההזמנות המרבי בהזנה מרוכזת אחת
+POS_MAX_BATCH = 500
+
+
+class SparseFieldsetMixin:
+    """
+    Limit the serialized fields with ?fields=a,b,c.
+
+    Unknown field names are ignored; nested serializers are not affected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or (self.parent is not None and not isinstance(self.parent, serializers.ListSerializer)):
+            return
+        requested = request.query_params.get('fields')
+        if not requested:
+            return
+        allowed = {name.strip() for name in requested.split(',') if name.strip()}
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug']
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # category/kashrut come from select_related in the view, no extra queries
+    category = CategorySerializer(read_only=True)
+    kashrut = serializers.StringRelatedField()
+    available = serializers.BooleanField(read_only=True)
+    stock = serializers.IntegerField(source='on_hand', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'sku', 'description', 'category', 'kashrut', 'supplier',
+            'price', 'stock', 'unlimited_stock', 'available', 'image', 'updated_at',
+        ]
+
+
+class CartProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'slug', 'price']
+
+
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    product = CartProductSerializer(read_only=True)
+    product_id = serializers.PrimaryKeyRelatedField(
+        source='product', queryset=Product.objects.filter(is_active=True), write_only=True
+    )
+    quantity = serializers.IntegerField(min_value=1)
+    total_price = serializers.DecimalField(
+        source='get_total_price', max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'product_id', 'quantity', 'total_price', 'created_at']
+        # the (user, product) pair is handled by the view as an upsert
+        validators = []
+
+    def validate(self, attrs):
+        product = attrs.get('product') or self.instance.product
+        if attrs.get('quantity', 0) > product.on_hand:
+            raise serializers.ValidationError('אין מספיק מלאי')
+        return attrs
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = CartProductSerializer(read_only=True)
+    total_price = serializers.DecimalField(
+        source='get_total_price', max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'quantity', 'price', 'discount_amount', 'promotion_name', 'total_price']
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # items/products come from prefetch_related in the view
+    items = OrderItemSerializer(many=True, read_only=True)
+    marketer = serializers.StringRelatedField()
+    event = serializers.StringRelatedField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_number', 'first_name', 'last_name', 'email', 'phone',
+            'address', 'city', 'postal_code', 'subtotal_amount', 'discount_amount',
+            'coupon_code', 'total_amount', 'total_items',
+            'status', 'payment_status', 'marketer', 'event', 'items',
+            'created_at', 'updated_at',
+        ]
+
+
+class OrderLookupSerializer(serializers.ModelSerializer):
+    marketer = serializers.StringRelatedField()
+    event = serializers.StringRelatedField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_number', 'first_name', 'last_name', 'email', 'phone', 'city',
+            'total_amount', 'status', 'payment_status', 'marketer', 'event', 'created_at',
+        ]
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """פרטי הלקוח לביצוע הזמנה - אותם שדות כמו בטופס הקופה (orders.CUSTOMER_FIELDS)"""
+    first_name = serializers.CharField(max_length=50)
+    last_name = serializers.CharField(max_length=50)
+    email = serializers.EmailField()
+    phone = serializers.CharField(max_length=20)
+    address = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    city = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    postal_code = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    coupon_code = serializers.CharField(max_length=30, required=False, allow_blank=True)
+
+
+class ScanSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class PosItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class PosOrderSerializer(CheckoutSerializer):
+    """הזמנה אחת בהזנה מרוכזת - פרטי לקוח ופריטים"""
+    coupon_code = None
+    items = PosItemSerializer(many=True, allow_empty=False)
+
+
+class PosBatchSerializer(serializers.Serializer):
+    """
+    Bulk POS entry: a batch of orders for one event.
+
+    The orders are validated one by one in the view (PosOrderSerializer), so
+    one bad row doesn't reject the whole batch.
+    """
+    event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all(), required=False, allow_null=True)
+    marketer = serializers.PrimaryKeyRelatedField(queryset=Marketer.objects.all(), required=False, allow_null=True)
+    orders = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=POS_MAX_BATCH)
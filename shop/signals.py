@@ -1,7 +1,19 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_migrate, post_migrate
 from django.dispatch import receiver
+from django.db import connections, transaction
 from django.contrib.auth.models import User, Group
 
+from campaigns.counters import contribution, record_order_change
+from levshomea.metrics import ORDER_STATUS_CHANGES
+from levshomea.schema import reset_lock_timeout, set_migration_lock_timeout
+
+from .cache import invalidate
+from .inventory import record_cancel
+from .marketers import invalidate_summary
+from .models import Category, Kashrut, Event, Marketer, Order, Product
+from .slow_queries import install as install_slow_query_capture
+
 @receiver(post_save, sender=User)
 def assign_user_groups(sender, instance, **kwargs):
     """Auto-assign users to groups based on their status"""
@@ -19,4 +31,77 @@ def assign_user_groups(sender, instance, **kwargs):
             instance.groups.add(admin_group)
             
     except Exception:
-        pass  # Groups will be created when needed
\ No newline at end of file
+        pass  # Groups will be created when needed
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Kashrut)
+@receiver(post_delete, sender=Kashrut)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Marketer)
+@receiver(post_delete, sender=Marketer)
+def invalidate_reference_cache(sender, **kwargs):
+    """Bump the cache version of a reference table when a row changes"""
+    # after commit, so no other process re-caches the old rows under the new version
+    transaction.on_commit(lambda: invalidate(sender))
+
+@receiver(post_save, sender=Order)
+def count_status_change(sender, instance, created, **kwargs):
+    """Order status changes for /metrics (runs before _loaded_status is reset below)"""
+    previous, current = getattr(instance, '_loaded_status', None), instance.status
+    if not created and previous is not None and previous != current:
+        transaction.on_commit(lambda: ORDER_STATUS_CHANGES.labels(previous, current).inc())
+
+def _loaded_contribution(order):
+    """What the order counted for in the campaigns as loaded/last saved; False when unknown"""
+    if not hasattr(order, '_loaded_event_id') or not hasattr(order, '_loaded_status'):
+        return False
+    return contribution(order._loaded_event_id, order._loaded_status, order._loaded_total_amount)
+
+@receiver(post_save, sender=Order)
+def count_towards_campaigns(sender, instance, created, **kwargs):
+    """Keep the campaign meters in step with the order's event, status and amount"""
+    before = None if created else _loaded_contribution(instance)
+    if before is not False:
+        record_order_change(instance, before, contribution(instance.event_id, instance.status, instance.total_amount))
+
+@receiver(post_delete, sender=Order)
+def uncount_deleted_order(sender, instance, **kwargs):
+    record_order_change(instance, contribution(instance.event_id, instance.status, instance.total_amount), None)
+
+@receiver(post_save, sender=Order)
+def return_cancelled_stock(sender, instance, created, **kwargs):
+    """Return the stock of an order when its status changes to cancelled"""
+    if not created and instance.status == 'cancelled' and getattr(instance, '_loaded_status', None) != 'cancelled':
+        record_cancel(instance)
+    # the saved values are the loaded ones from now on (the receivers above compare with them)
+    instance._loaded_status = instance.status
+    instance._loaded_event_id = instance.event_id
+    instance._loaded_total_amount = instance.total_amount
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_marketer_summary(sender, instance, **kwargs):
+    """Drop the cached portal numbers of the order's marketer (and the previous one)"""
+    marketer_ids = {instance.marketer_id, getattr(instance, '_loaded_marketer_id', None)}
+    transaction.on_commit(lambda: invalidate_summary(*marketer_ids))
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, **kwargs):
+    """Rebuild the cached SKU map (shop/barcodes.py) after catalog changes"""
+    transaction.on_commit(lambda: invalidate(sender))
+
+@receiver(connection_created)
+def capture_slow_queries(sender, connection, **kwargs):
+    install_slow_query_capture(connection)
+
+@receiver(pre_migrate)
+def limit_migration_lock_waits(sender, using, **kwargs):
+    """DDL that cannot get its lock fails after MIGRATION_LOCK_TIMEOUT instead of queueing"""
+    set_migration_lock_timeout(connections[using])
+
+@receiver(post_migrate)
+def restore_lock_waits(sender, using, **kwargs):
+    reset_lock_timeout(connections[using])
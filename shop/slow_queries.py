@@ -0,0 +1,321 @@
+# shop/slow_queries.py
+"""
+Slow-query capture.
+
+install() (run for every new DB connection, see shop/signals.py) adds
+capture() to the connection's execute_wrappers, so every query - ORM or
+raw, in requests, commands and workers - is timed. A query that takes
+SLOW_QUERY_MS or more is captured with the first frame of project code that
+ran it and, in a request, the request id and URL name. Captures made during
+a request are kept aside and handed over by slow_query_middleware once the
+response is ready; others are handed over at once. Either way they go on a
+queue, and one background thread per process saves them - on its own
+connection, so nothing runs in the caller's transaction or adds to its
+latency. The queue is drained at exit; when it is full, captures are
+dropped.
+
+Stored parameters are redacted (emails, phones, password hashes); the
+real ones are only kept in memory until the plan is taken.
+
+On PostgreSQL, SLOW_QUERY_EXPLAIN_RATE of the captured SELECTs (one per
+fingerprint per save) are run again under EXPLAIN (ANALYZE, BUFFERS) and
+the plan is stored with them. Only plain SELECTs - ANALYZE executes the
+statement, so locking reads (FOR UPDATE / FOR SHARE) are never explained.
+
+SlowQuery is a ring buffer: beyond SLOW_QUERY_KEEP rows the oldest are
+deleted. replay_slow_queries runs the worst fingerprints against another
+database to check an index fix.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.db.models import Avg, Count, Max, Sum
+from django.utils.decorators import sync_and_async_middleware
+
+from levshomea.log import REDACTED, redact, request_id_var
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_TIMEOUT_MS = 10000
+SAVE_QUEUE_SIZE = 1000
+
+_pending = contextvars.ContextVar('slow_queries_pending', default=None)
+_paused = contextvars.ContextVar('slow_queries_paused', default=False)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+LOCKING_READ = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b', re.I)
+# Django password hashes (algorithm$...$...) and unusable passwords ('!' + 40 characters)
+PASSWORD_HASH = re.compile(r'^(?:[\w-]+\$[^$\s]*\$\S+|!\w{40})$')
+_PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+
+
+def fingerprint(sql):
+    """The same for every run of a query, whatever its parameters and IN list length"""
+    normalized = NUMBER.sub('N', IN_LIST.sub('IN (...)', sql))
+    return hashlib.md5(normalized.encode(), usedforsecurity=False).hexdigest()
+
+
+def is_select(sql):
+    return sql.lstrip().upper().startswith('SELECT')
+
+
+def is_explainable(sql):
+    """A SELECT that EXPLAIN ANALYZE can run again without side effects (no row locks)"""
+    return is_select(sql) and not LOCKING_READ.search(sql)
+
+
+@contextmanager
+def paused():
+    """No capturing inside (our own queries, replays)"""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def _location():
+    """'path:line in function' of the innermost project frame outside this module"""
+    for frame, lineno in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and filename != __file__ and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, settings.BASE_DIR)}:{lineno} in {frame.f_code.co_name}'[:300]
+    return ''
+
+
+def _redact_param(value):
+    if isinstance(value, str) and PASSWORD_HASH.match(value):
+        return REDACTED
+    if isinstance(value, (list, tuple)):
+        return [_redact_param(item) for item in value]
+    return redact(value)
+
+
+def _jsonable(params):
+    """params as stored: JSON types, with personal data redacted"""
+    if params is None:
+        return None
+    params = json.loads(json.dumps(params, default=str))
+    if isinstance(params, dict):
+        return {key: _redact_param(value) for key, value in params.items()}
+    return [_redact_param(value) for value in params]
+
+
+def has_redacted(params):
+    """True when stored params lost a value to redaction - replaying them matches other rows"""
+    if isinstance(params, dict):
+        params = list(params.values())
+    if isinstance(params, (list, tuple)):
+        return any(has_redacted(value) for value in params)
+    return isinstance(params, str) and any(marker in params for marker in (REDACTED, '[email]', '[phone]'))
+
+
+def capture(execute, sql, params, many, context):
+    """execute_wrapper: time the query and capture it when slow"""
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS > 0 and not _paused.get():
+        entry = SlowQuery(
+            fingerprint=fingerprint(sql), sql=sql, params=None if many else _jsonable(params),
+            duration_ms=round(duration_ms, 2), location=_location(), request_id=request_id_var.get() or '',
+        )
+        # what EXPLAIN needs; not stored
+        entry.alias, entry.raw_params = context['connection'].alias, None if many else params
+        pending = _pending.get()
+        if pending is None:
+            enqueue([entry])
+        else:
+            pending.append(entry)
+    return result
+
+
+def install(connection):
+    if capture not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture)
+
+
+def explain(alias, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) text of a SELECT, '' when it fails"""
+    connection = connections[alias]
+    try:
+        with paused(), transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute(f'SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}')
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+    except DatabaseError as e:
+        logger.warning('EXPLAIN failed: %s', e)
+        return ''
+
+
+def save(entries, view=''):
+    """
+    Store captured queries (with sampled plans) and drop the oldest beyond
+    SLOW_QUERY_KEEP. Runs on the saver thread (see enqueue).
+    """
+    explained = set()
+    for entry in entries:
+        entry.view = view[:200]
+        if (
+            entry.fingerprint not in explained
+            and connections[entry.alias].vendor == 'postgresql'
+            and is_explainable(entry.sql) and entry.raw_params is not None
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+        ):
+            entry.plan = explain(entry.alias, entry.sql, entry.raw_params)
+            explained.add(entry.fingerprint)
+    try:
+        with paused(), transaction.atomic():
+            SlowQuery.objects.bulk_create(entries)
+            cutoff = SlowQuery.objects.order_by('-pk').values_list('pk', flat=True)[settings.SLOW_QUERY_KEEP:].first()
+            if cutoff:
+                SlowQuery.objects.filter(pk__lte=cutoff).delete()
+    except DatabaseError as e:
+        # e.g. during migrate, before the table exists
+        logger.warning('could not save %s slow queries: %s', len(entries), e)
+
+
+class _Saver:
+    """One thread per process that saves what enqueue() is given, on its own DB connection"""
+
+    def __init__(self):
+        self.queue = queue.Queue(SAVE_QUEUE_SIZE)
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, entries, view):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait((entries, view))
+        except queue.Full:
+            self.dropped += len(entries)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked worker inherits the parent's queue but not its thread
+            self.queue = queue.Queue(SAVE_QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._run, name='slow-query-saver', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            try:
+                with paused():
+                    save(*item)
+            except Exception:
+                logger.exception('saving slow queries failed')
+            finally:
+                self.queue.task_done()
+            if self.queue.empty():
+                # honour CONN_MAX_AGE / health checks like a request would
+                close_old_connections()
+        connections.close_all()
+
+    def flush(self):
+        """Wait until everything queued so far is saved"""
+        if self._pid == os.getpid():
+            self.queue.join()
+
+    def stop(self, timeout=5):
+        """Save what is queued and stop the thread"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+            self._pid = None
+
+
+_saver = _Saver()
+
+
+def enqueue(entries, view=''):
+    """Hand captured queries to the saver thread"""
+    _saver.put(entries, view)
+
+
+def flush():
+    """Wait for the saver thread to store everything captured so far (tests, commands)"""
+    _saver.flush()
+
+
+def _view_name(request):
+    match = request.resolver_match
+    return match.view_name if match else request.path
+
+
+@sync_and_async_middleware
+def slow_query_middleware(get_response):
+    """Collect the request's slow queries and save them with its URL name"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            pending = []
+            token = _pending.set(pending)
+            try:
+                response = await get_response(request)
+            finally:
+                _pending.reset(token)
+            if pending:
+                enqueue(pending, _view_name(request))
+            return response
+    else:
+        def middleware(request):
+            pending = []
+            token = _pending.set(pending)
+            try:
+                response = get_response(request)
+            finally:
+                _pending.reset(token)
+            if pending:
+                enqueue(pending, _view_name(request))
+            return response
+    return middleware
+
+
+def top_offenders(limit=10, since=None):
+    """Fingerprints by total captured time: [{fingerprint, count, total_ms, avg_ms, sample}]"""
+    queries = SlowQuery.objects.all()
+    if since:
+        queries = queries.filter(created_at__gte=since)
+    groups = list(
+        queries.values('fingerprint')
+        .annotate(count=Count('id'), total_ms=Sum('duration_ms'), avg_ms=Avg('duration_ms'), latest=Max('id'))
+        .order_by('-total_ms')[:limit]
+    )
+    samples = SlowQuery.objects.in_bulk([group['latest'] for group in groups])
+    return [
+        {
+            'fingerprint': group['fingerprint'],
+            'count': group['count'],
+            'total_ms': round(group['total_ms'], 1),
+            'avg_ms': round(group['avg_ms'], 1),
+            'sample': samples[group['latest']],
+        }
+        for group in groups
+    ]
@@ -0,0 +1,155 @@
+# shop/staff_views.py
+"""Staff-only pages outside the admin"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+
+from .forecasting import events_with_sales, restock_plan
+from .fulfillment import FORMATS, build_documents, zip_stream
+from .live import LIVE_BATCH_SIZE, AsyncSubscriber, Subscriber, feed, order_payload, sse_message
+from .models import Event, Order
+
+SSE_KEEPALIVE_SECONDS = 15
+# how often a dashboard beyond LIVE_MAX_WSGI_STREAMS reconnects for an update
+SSE_POLL_RETRY_MS = 5000
+
+# open streams under WSGI - each one holds a gunicorn thread
+_wsgi_streams = threading.BoundedSemaphore(settings.LIVE_MAX_WSGI_STREAMS)
+# open streams under ASGI - Django 4.2 does not watch for disconnects while
+# streaming, so the stream of a closed tab lives until LIVE_MAX_STREAM_SECONDS
+_asgi_streams = threading.BoundedSemaphore(settings.LIVE_MAX_ASGI_STREAMS)
+
+
+@staff_member_required
+def sales_dashboard(request):
+    """Live sales dashboard - new orders and today's totals per event/marketer"""
+    return render(request, 'shop/sales_dashboard.html')
+
+
+def _catch_up(last_event_id, snapshot):
+    """The orders after the client's Last-Event-ID, up to the snapshot"""
+    if not last_event_id.isdigit():
+        return
+    orders = (
+        Order.objects.filter(pk__gt=int(last_event_id), pk__lte=snapshot['last_id']).exclude(status='cancelled')
+        .select_related('event', 'marketer').order_by('-pk')[:LIVE_BATCH_SIZE]
+    )
+    for order in reversed(orders):
+        yield sse_message('order', order_payload(order), id=order.pk)
+
+
+def _poll(last_event_id):
+    """
+    One update for a dashboard that could not get a stream: the orders since
+    its last update and a fresh snapshot, then the connection closes and
+    EventSource reconnects after SSE_POLL_RETRY_MS, sending the id back.
+    """
+    snapshot = feed.snapshot()
+    yield f'retry: {SSE_POLL_RETRY_MS}\n\n'
+    yield from _catch_up(last_event_id, snapshot)
+    yield sse_message('snapshot', snapshot, id=snapshot['last_id'])
+
+
+def _start(last_event_id, subscriber):
+    """The first messages of a stream; the orders it missed while reconnecting come first"""
+    snapshot = feed.subscribe(subscriber)
+    return [*_catch_up(last_event_id, snapshot), sse_message('snapshot', snapshot, id=snapshot['last_id'])]
+
+
+def _stream(last_event_id):
+    # decided when the response starts, so a stream that never starts holds nothing
+    if not _wsgi_streams.acquire(blocking=False):
+        yield from _poll(last_event_id)
+        return
+    subscriber = Subscriber()
+    try:
+        yield from _start(last_event_id, subscriber)
+        deadline = time.monotonic() + settings.LIVE_MAX_STREAM_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = subscriber.get(min(SSE_KEEPALIVE_SECONDS, remaining))
+            yield message if message is not None else ': keepalive\n\n'
+    finally:
+        feed.unsubscribe(subscriber)
+        _wsgi_streams.release()
+
+
+async def _astream(last_event_id):
+    if not _asgi_streams.acquire(blocking=False):
+        for message in await sync_to_async(list)(_poll(last_event_id)):
+            yield message
+        return
+    subscriber = AsyncSubscriber()
+    try:
+        for message in await sync_to_async(_start)(last_event_id, subscriber):
+            yield message
+        deadline = time.monotonic() + settings.LIVE_MAX_STREAM_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await subscriber.get(min(SSE_KEEPALIVE_SECONDS, remaining))
+            yield message if message is not None else ': keepalive\n\n'
+    finally:
+        feed.unsubscribe(subscriber)
+        _asgi_streams.release()
+
+
+@staff_member_required
+def sales_stream(request):
+    """
+    Server-Sent Events stream for the dashboard.
+
+    Under ASGI the stream lives on the event loop. Under WSGI every open
+    stream holds one of the gunicorn threads. Only LIVE_MAX_ASGI_STREAMS /
+    LIVE_MAX_WSGI_STREAMS dashboards per process get a stream; the others
+    are updated by reconnecting every SSE_POLL_RETRY_MS (see _poll). A
+    stream ends after LIVE_MAX_STREAM_SECONDS, since a closed tab is not
+    noticed until a write fails; EventSource reconnects with the id of the
+    last message and gets the orders it missed. Prefer SERVER_MODE=asgi on
+    event nights.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if settings.SERVER_MODE == 'asgi':
+        stream = _astream(last_event_id)
+    else:
+        stream = _stream(last_event_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _int_param(request, name, default):
+    value = request.GET.get(name, '')
+    return int(value) if value.isdigit() else default
+
+
+@staff_member_required
+def restock_report(request):
+    """Restock suggestions per supplier (shop/forecasting.py)"""
+    horizon = _int_param(request, 'horizon', 14)
+    lead_time = _int_param(request, 'lead_time', 7)
+    event_ids = [int(pk) for pk in request.GET.getlist('event') if pk.isdigit()]
+    return render(request, 'shop/restock_report.html', {
+        'plans': restock_plan(horizon, lead_time, event_ids),
+        'events': events_with_sales(),
+        'selected_events': event_ids,
+        'horizon': horizon,
+        'lead_time': lead_time,
+    })
+
+
+@staff_member_required
+def fulfillment_documents(request, event_id):
+    """
+    Zip of the event's purchase orders and pick lists (shop/fulfillment.py).
+
+    ?format=csv or ?format=html for one format only.
+    """
+    event = get_object_or_404(Event, pk=event_id)
+    formats = [fmt for fmt in request.GET.getlist('format') if fmt in FORMATS] or FORMATS
+    response = StreamingHttpResponse(zip_stream(build_documents(event, formats)), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="fulfillment-{event.pk}.zip"'
+    return response
@@ -1,3 +1,353 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from levshomea.testing import SimpleTestCase, TestCase
+from . import cache as reference_cache, export, inventory, receipts, slow_queries, staff_views
+from .lookup import search_orders
+from .orders import walk_in_user
+from .models import CartItem, Category, DonationReceipt, Event, JobState, Marketer, Order, OrderItem, Product, Promotion
+
+
+def make_order(user, amount=100, **kwargs):
+    fields = dict(first_name='ישראל', last_name='ישראלי', email='donor@example.com', phone='050-1234567')
+    fields.update(kwargs)
+    return Order.objects.create(user=user, total_amount=Decimal(amount), **fields)
+
+
+class SalesStreamTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+        self.streams = staff_views._wsgi_streams
+        # every stream slot taken
+        staff_views._wsgi_streams = threading.BoundedSemaphore(1)
+        staff_views._wsgi_streams.acquire()
+
+    def tearDown(self):
+        staff_views._wsgi_streams = self.streams
+
+    def test_beyond_the_cap_the_dashboard_polls(self):
+        first = make_order(self.staff)
+        response = self.client.get(reverse('shop:sales_stream'))
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith(f'retry: {staff_views.SSE_POLL_RETRY_MS}'))
+        self.assertIn(f'id: {first.pk}\nevent: snapshot', body)
+        self.assertNotIn('event: order', body)
+
+        second = make_order(self.staff, 50)
+        response = self.client.get(reverse('shop:sales_stream'), HTTP_LAST_EVENT_ID=str(first.pk))
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: order'), 1)
+        self.assertIn(second.order_number, body)
+        self.assertIn(f'id: {second.pk}\nevent: snapshot', body)
+
+
+class AsyncSalesStreamTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.streams = staff_views._asgi_streams
+        staff_views._asgi_streams = threading.BoundedSemaphore(1)
+
+    def tearDown(self):
+        staff_views._asgi_streams = self.streams
+
+    def stream(self, last_event_id=''):
+        async def drain():
+            return ''.join([message async for message in staff_views._astream(last_event_id)])
+        return async_to_sync(drain)()
+
+    @override_settings(LIVE_MAX_STREAM_SECONDS=0)
+    def test_stream_ends_and_lets_go_of_its_slot(self):
+        first = make_order(self.staff)
+        second = make_order(self.staff, 50)
+        body = self.stream(str(first.pk))
+        self.assertEqual(body.count('event: order'), 1)
+        self.assertIn(f'id: {second.pk}\nevent: order', body)
+        self.assertIn(f'id: {second.pk}\nevent: snapshot', body)
+        self.assertFalse(staff_views.feed._subscribers)
+        self.assertTrue(staff_views._asgi_streams.acquire(blocking=False))
+
+    def test_beyond_the_cap_the_dashboard_polls(self):
+        staff_views._asgi_streams.acquire()
+        body = self.stream()
+        self.assertTrue(body.startswith(f'retry: {staff_views.SSE_POLL_RETRY_MS}'))
+        self.assertIn('event: snapshot', body)
+
+
+class CheckoutCouponTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('donor', password='pw')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='כללי', slug='general')
+        product = Product.objects.create(name='מוצר', slug='product', description='-', category=category, supplier='ספק', price=Decimal(100))
+        CartItem.objects.create(user=self.user, product=product, quantity=2)
+        Promotion.objects.create(name='קופון', kind='coupon', code='SAVE5', percent_off=Decimal(5))
+
+    def messages(self, coupon):
+        response = self.client.get(reverse('shop:checkout'), {'coupon': coupon})
+        return [str(message) for message in response.context['messages']]
+
+    def test_unknown_coupon_is_invalid(self):
+        self.assertEqual(self.messages('NOPE'), ['קוד הקופון אינו תקף'])
+
+    def test_coupon_that_lost_to_a_better_promotion_is_not_called_invalid(self):
+        self.assertEqual(self.messages('SAVE5'), [])
+        Promotion.objects.create(name='כמות', kind='quantity', min_quantity=2, percent_off=Decimal(20))
+        self.assertEqual(self.messages('SAVE5'), ['הקופון תקף, אך מבצע משתלם יותר כבר חל על העגלה'])
+
+
+class ProductDetailETagTests(TestCase):
+    def test_a_sale_changes_the_etag(self):
+        category = Category.objects.create(name='כללי', slug='general')
+        product = Product.objects.create(
+            name='מוצר', slug='product', description='-', category=category, supplier='ספק',
+            price=Decimal(100), stock=10, unlimited_stock=False,
+        )
+        url = reverse('api:product_detail', args=[product.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        inventory.record(product, 'sale', -1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CartQuantityLimitTests(TestCase):
+    def test_the_limit_is_the_quantity_on_hand(self):
+        user = User.objects.create_user('donor', password='pw')
+        self.client.force_login(user)
+        category = Category.objects.create(name='כללי', slug='general')
+        product = Product.objects.create(
+            name='מוצר', slug='product', description='-', category=category, supplier='ספק',
+            price=Decimal(100), stock=10, unlimited_stock=False,
+        )
+        CartItem.objects.create(user=user, product=product, quantity=1)
+        inventory.record(product, 'sale', -3)
+        self.assertContains(self.client.get(reverse('shop:cart_detail')), 'max="7"')
+
+        inventory.compact()
+        inventory.compact()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 7)
+
+
+class PosOwnershipTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', password='pw', email='seller@example.com')
+        self.seller.userprofile.phone = '052-7654321'
+        self.seller.userprofile.save()
+        self.marketer = Marketer.objects.create(first_name='משווק', user=self.seller)
+        self.donor = User.objects.create_user('donor', password='pw', email='Donor@Example.com')
+        self.donor.userprofile.phone = '+972-50-1234567'
+        self.donor.userprofile.save()
+        category = Category.objects.create(name='כללי', slug='general')
+        self.product = Product.objects.create(name='מוצר', slug='product', description='-', category=category, supplier='ספק', price=Decimal(100))
+        self.client.force_login(self.seller)
+
+    def sell(self, **contact):
+        order = dict(first_name='ישראל', last_name='ישראלי', email='someone@example.com', phone='054-0000000')
+        order.update(contact, items=[{'product': self.product.pk, 'quantity': 1}])
+        response = self.client.post(reverse('api:pos_orders'), {'orders': [order]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(order_number=response.json()['results'][0]['order_number'])
+
+    def test_orders_belong_to_the_donor_not_the_seller(self):
+        self.assertEqual(self.sell(phone='0501234567').user, self.donor)
+        self.assertEqual(self.sell(email='donor@example.com ').user, self.donor)
+
+        order = self.sell(phone='052-7654321', email='seller@example.com')
+        self.assertEqual(order.user.username, settings.POS_WALK_IN_USERNAME)
+        self.assertFalse(order.user.is_active)
+        self.assertEqual(order.marketer, self.marketer)
+
+    def test_legacy_orders_entered_by_a_marketer_are_not_theirs(self):
+        make_order(self.seller, 300, marketer=self.marketer)
+        own = make_order(self.seller, 50)
+        response = self.client.get(reverse('shop:user_profile'))
+        self.assertEqual(list(response.context['orders']), [own])
+        self.assertEqual(response.context['total_donations'], 50)
+
+
+class FulfillmentDocumentsTests(TestCase):
+    def test_view_renders_in_process_with_unique_entry_names(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        event = Event.objects.create(name='ערב התרמה')
+        category = Category.objects.create(name='כללי', slug='general')
+        for n, (supplier, city) in enumerate([('ספק א', 'תל אביב'), ('ספק/א', 'תל-אביב'), ('ספק:א', 'תל אביב ')] * 3):
+            product = Product.objects.create(name=f'מוצר {n}', slug=f'product-{n}', description='-', category=category, supplier=supplier, price=Decimal(10))
+            order = make_order(staff, event=event, city=f'{city}{n % 3}')
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+        with mock.patch('shop.fulfillment.ProcessPoolExecutor', side_effect=AssertionError('no pool in a request')):
+            response = self.client.get(reverse('shop:fulfillment_documents', args=[event.pk]))
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn('purchase-orders/ספק_א.csv', names)
+        self.assertIn('purchase-orders/ספק_א-2.csv', names)
+        self.assertIn('purchase-orders/ספק_א-3.csv', names)
+
+
+class PosReceiptTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.seller = User.objects.create_user('seller')
+        self.marketer = Marketer.objects.create(first_name='משווק', user=self.seller)
+        self.donor = User.objects.create_user('donor', first_name='דנה')
+
+    def test_pos_orders_without_an_account_get_contact_receipts_only(self):
+        walk_in = make_order(walk_in_user(), 100, marketer=self.marketer, first_name='אורח', payment_status='paid')
+        legacy = make_order(self.seller, 200, marketer=self.marketer, first_name='ותיק', payment_status='paid')
+        attributed = make_order(self.donor, 300, marketer=self.marketer, payment_status='paid')
+        online = make_order(self.donor, 400, payment_status='paid')
+
+        self.assertEqual(receipts.issue_order_receipts(workers=1), 4)
+        by_order = {receipt.order_id: receipt for receipt in DonationReceipt.objects.filter(kind='order')}
+        self.assertIsNone(by_order[walk_in.pk].user)
+        self.assertEqual(by_order[walk_in.pk].donor_name, 'אורח ישראלי')
+        self.assertIsNone(by_order[legacy.pk].user)
+        self.assertEqual(by_order[attributed.pk].user, self.donor)
+
+        self.assertEqual(receipts.issue_annual_receipts(timezone.localdate().year, workers=1), 1)
+        annual = DonationReceipt.objects.get(kind='annual')
+        self.assertEqual((annual.user, annual.amount), (self.donor, attributed.total_amount + online.total_amount))
+
+
+class SlowQueryCaptureTests(SimpleTestCase):
+    def test_locking_reads_are_never_explained(self):
+        self.assertTrue(slow_queries.is_explainable('SELECT * FROM shop_order WHERE id = %s'))
+        for sql in ('SELECT * FROM shop_order FOR UPDATE', 'SELECT 1 FROM t FOR NO KEY UPDATE OF t', 'select 1 from t for share'):
+            with self.subTest(sql=sql):
+                self.assertFalse(slow_queries.is_explainable(sql))
+
+    def test_stored_params_are_redacted(self):
+        params = ['dana@example.com', 'pbkdf2_sha256$600000$salt$hash=', '050-1234567', ['0501234567', 7], 42, 'פרטי']
+        self.assertEqual(
+            slow_queries._jsonable(params),
+            ['[email]', '[redacted]', '[phone]', ['[phone]', 7], 42, 'פרטי'],
+        )
+
+
+class ReplaySlowQueriesTests(TestCase):
+    def replay(self, params):
+        offender = {
+            'fingerprint': 'f' * 32, 'count': 3, 'total_ms': 3000, 'avg_ms': 1000, 'view': 'lookup', 'location': '',
+            'sql': 'SELECT id FROM shop_order WHERE email_normalized = %s', 'params': params,
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump([offender], f)
+            f.flush()
+            out = io.StringIO()
+            call_command('replay_slow_queries', f.name, runs=1, stdout=out)
+        return out.getvalue()
+
+    def test_redacted_params_are_not_reported_as_a_fix(self):
+        self.assertTrue(slow_queries.has_redacted([['[phone]'], 3]))
+        self.assertFalse(slow_queries.has_redacted(['ORD-1', 3, None]))
+        self.assertIn('not comparable', self.replay(['[email]']))
+        self.assertNotIn('not comparable', self.replay(['dana@example.com']))
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=5, REFERENCE_CACHE_TIMEOUT=30)
+class ReferenceCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(reference_cache.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.builds = 0
+
+    def lookup(self):
+        def build():
+            self.builds += 1
+            return self.builds
+        return reference_cache.cached(Category, 'test', build)
+
+    def test_local_copy_is_kept_while_the_shared_entry_lives(self):
+        self.assertEqual(self.lookup(), 1)
+        self.now += 10
+        self.assertEqual(self.lookup(), 1)
+
+    def test_local_copy_goes_with_the_shared_entry(self):
+        self.lookup()
+        # tier 2 expired, or this process never saw the version bump (locmem)
+        reference_cache.cache.delete(reference_cache._prefix(Category) + 'test:v1')
+        self.now += 10
+        self.assertEqual(self.lookup(), 2)
+
+    def test_local_copy_never_outlives_the_timeout(self):
+        self.lookup()
+        reference_cache.cache.set(reference_cache._prefix(Category) + 'test:v1', 'rebuilt elsewhere')
+        self.now += 10
+        self.assertEqual(self.lookup(), 1)
+        self.now += 21
+        self.assertEqual(self.lookup(), 'rebuilt elsewhere')
+
+
+class OrderLookupTests(TestCase):
+    def test_phone_matches_orders_and_profiles_without_a_subquery(self):
+        donor = User.objects.create_user('donor')
+        donor.userprofile.phone2 = '052-7654321'
+        donor.userprofile.save()
+        by_profile = make_order(donor, phone='03-1111111')
+        by_order = make_order(User.objects.create_user('other'), phone='052-7654321')
+        make_order(User.objects.create_user('third'), phone='054-9999999')
+
+        orders = search_orders('0527654321')
+        self.assertNotIn('SELECT', str(orders.query).split('WHERE', 1)[1])
+        self.assertEqual(set(orders), {by_profile, by_order})
+        self.assertEqual(set(search_orders('4321')), {by_profile, by_order})
+
+
+class AnalyticsExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('donor')
+        product = Product.objects.create(
+            name='מוצר', slug='product', description='-', category=Category.objects.create(name='כללי', slug='general'),
+            supplier='ספק', price=Decimal(100),
+        )
+        order = make_order(user)
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=Decimal(100))
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Order.objects.update(created_at=hour_ago, updated_at=hour_ago)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+
+    def files(self, table):
+        return sorted(path.name for path in (self.root / table).rglob('*.parquet'))
+
+    def test_a_failed_full_run_keeps_the_old_history(self):
+        self.assertEqual(export.run(self.root)['orders'], 1)
+        orders, items = self.files('orders'), self.files('order_items')
+        marks = list(JobState.objects.order_by('name').values_list('last_timestamp', 'last_id'))
+
+        with mock.patch.object(export, 'export_order_items', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                export.run(self.root, full=True)
+        self.assertEqual((self.files('orders'), self.files('order_items')), (orders, items))
+        self.assertEqual(list(JobState.objects.order_by('name').values_list('last_timestamp', 'last_id')), marks)
+
+        self.assertEqual(export.run(self.root, full=True)['orders'], 1)
+        self.assertEqual(len(self.files('orders')), 1)
+        self.assertNotEqual(self.files('orders'), orders)
+        self.assertEqual([path.name for path in self.root.iterdir() if path.name.startswith('.')], [])
@@ -1,19 +1,36 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, staff_views, marketer_views
+
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
 
 app_name = 'shop'
 
 urlpatterns = [
     path('', views.home, name='home'),
-    path('products/', views.product_list, name='product_list'),
-    path('product/<int:id>/<slug:slug>/', views.product_detail, name='product_detail'),
-    path('cart/', views.cart_detail, name='cart_detail'),
+    path('products/', read_views.product_list, name='product_list'),
+    path('product/<int:id>/<slug:slug>/', read_views.product_detail, name='product_detail'),
+    path('cart/', read_views.cart_detail, name='cart_detail'),
     path('cart/add/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/update/<int:item_id>/', views.update_cart_quantity, name='update_cart_quantity'),
     path('checkout/', views.checkout, name='checkout'),
     path('process-order/', views.process_order, name='process_order'),
     path('order-confirmation/<str:order_number>/', views.order_confirmation, name='order_confirmation'),
-    path('profile/', views.user_profile, name='user_profile'),
-    path('order/<str:order_number>/', views.order_detail, name='order_detail')
+    path('profile/', read_views.user_profile, name='user_profile'),
+    path('order/<str:order_number>/', views.order_detail, name='order_detail'),
+    path('receipt/<int:number>/', views.donation_receipt, name='donation_receipt'),
+
+    # Marketers
+    path('marketer/', marketer_views.marketer_portal, name='marketer_portal'),
+    path('marketer/pos/', marketer_views.marketer_pos, name='marketer_pos'),
+
+    # Staff
+    path('staff/live/', staff_views.sales_dashboard, name='sales_dashboard'),
+    path('staff/live/stream/', staff_views.sales_stream, name='sales_stream'),
+    path('staff/restock/', staff_views.restock_report, name='restock_report'),
+    path('staff/fulfillment/<int:event_id>/', staff_views.fulfillment_documents, name='fulfillment_documents'),
 ]
\ No newline at end of file
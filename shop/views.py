@@ -1,18 +1,28 @@
+import logging
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import FileResponse
 from django.views.decorators.http import require_POST
 from .models import Product, Category, CartItem
-from django.db import transaction
-from .models import Order, OrderItem
-from django.db.models import Sum
+from .models import DonationReceipt, Order
+from levshomea.metrics import CART_ADDS, STOCK_OUTS
+from .marketers import marketer_for_user
+from .orders import CUSTOMER_FIELDS, missing_customer_fields, place_order
+from .popularity import best_sellers
+from .pricing import price_cart
+from .recommendations import related_products
+from django.db.models import Prefetch, Sum
+
+logger = logging.getLogger(__name__)
 
 def home(request):
-    return render(request, 'shop/home.html')
+    return render(request, 'shop/home.html', {'best_sellers': best_sellers()})
 
 def product_list(request):
-    products = Product.objects.filter(available=True)
-    categories = Category.objects.all()
+    products = Product.objects.filter(is_active=True).with_on_hand()
+    categories = Category.objects.active()
     
     return render(request, 'shop/product_list.html', {
         'products': products,
@@ -20,8 +30,11 @@ def product_list(request):
     })
 
 def product_detail(request, id, slug):
-    product = get_object_or_404(Product, id=id, slug=slug, available=True)
-    return render(request, 'shop/product_detail.html', {'product': product})
+    product = get_object_or_404(Product.objects.with_on_hand(), id=id, slug=slug, is_active=True)
+    return render(request, 'shop/product_detail.html', {
+        'product': product,
+        'related_products': related_products(product),
+    })
 
 
 @login_required
@@ -32,7 +45,9 @@ def add_to_cart(request):
     
     product = get_object_or_404(Product, id=product_id)
     
-    if product.stock < quantity:
+    if product.on_hand < quantity:
+        CART_ADDS.labels('out_of_stock').inc()
+        STOCK_OUTS.labels('cart').inc()
         messages.error(request, 'אין מספיק מלאי')
         return redirect('shop:product_detail', id=product.id, slug=product.slug)
     
@@ -44,18 +59,24 @@ def add_to_cart(request):
     
     if not created:
         new_quantity = cart_item.quantity + quantity
-        if new_quantity > product.stock:
+        if new_quantity > product.on_hand:
+            CART_ADDS.labels('out_of_stock').inc()
+            STOCK_OUTS.labels('cart').inc()
             messages.error(request, 'אין מספיק מלאי')
             return redirect('shop:cart_detail')
         cart_item.quantity = new_quantity
         cart_item.save()
     
+    CART_ADDS.labels('added').inc()
     messages.success(request, f'{product.name} נוסף לעגלה')
     return redirect('shop:cart_detail')
 
 @login_required
 def cart_detail(request):
-    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
+    # on_hand for the quantity limits, as update_cart_quantity checks it
+    cart_items = CartItem.objects.filter(user=request.user).prefetch_related(
+        Prefetch('product', queryset=Product.objects.with_on_hand())
+    )
     total = sum(item.quantity * item.product.price for item in cart_items)
     return render(request, 'shop/cart_detail.html', {
         'cart_items': cart_items,
@@ -76,7 +97,7 @@ def update_cart_quantity(request, item_id):
         cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
         quantity = int(request.POST.get('quantity', 1))
         
-        if quantity > cart_item.product.stock:
+        if quantity > cart_item.product.on_hand:
             messages.error(request, 'אין מספיק מלאי')
         elif quantity > 0:
             cart_item.quantity = quantity
@@ -91,18 +112,22 @@ def update_cart_quantity(request, item_id):
 @login_required
 def checkout(request):
     """Display checkout form"""
-    cart_items = CartItem.objects.filter(user=request.user)
+    coupon_code = request.GET.get('coupon', '').strip()
+    pricing = price_cart(request.user, coupon_code=coupon_code)
     
-    if not cart_items.exists():
+    if not pricing:
         messages.error(request, 'העגלה שלך ריקה')
-        return redirect('shop:cart')
+        return redirect('shop:cart_detail')
     
-    # Calculate total
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    if coupon_code and not pricing.coupon_valid:
+        messages.error(request, 'קוד הקופון אינו תקף')
+    elif coupon_code and not pricing.coupon_applied:
+        messages.info(request, 'הקופון תקף, אך מבצע משתלם יותר כבר חל על העגלה')
     
     context = {
-        'cart_items': cart_items,
-        'total': total,
+        'cart_items': pricing.lines,
+        'pricing': pricing,
+        'total': pricing.total,
     }
     return render(request, 'shop/checkout.html', context)
 
@@ -114,83 +139,31 @@ def process_order(request):
     if request.method != 'POST':
         return redirect('shop:checkout')
     
-    cart_items = CartItem.objects.filter(user=request.user)
-    
-    if not cart_items.exists():
+    if not CartItem.objects.filter(user=request.user).exists():
         messages.error(request, 'העגלה שלך ריקה')
         return redirect('shop:cart_detail')  # Fixed: was 'shop:cart'
     
     # Get form data
-    first_name = request.POST.get('first_name', '').strip()
-    last_name = request.POST.get('last_name', '').strip()
-    email = request.POST.get('email', '').strip()
-    phone = request.POST.get('phone', '').strip()
-    address = request.POST.get('address', '').strip()
-    city = request.POST.get('city', '').strip()
-    postal_code = request.POST.get('postal_code', '').strip()
+    customer = {field: request.POST.get(field, '').strip() for field in CUSTOMER_FIELDS}
     
     # Basic validation
-    required_fields = {
-        'first_name': first_name,
-        'last_name': last_name,
-        'email': email,
-        'phone': phone,
-    }
-    
-    missing_fields = [field for field, value in required_fields.items() if not value]
-    
-    if missing_fields:
+    if missing_customer_fields(customer):
         messages.error(request, 'אנא מלא את כל השדות הנדרשים')
         return redirect('shop:checkout')
     
     try:
-        with transaction.atomic():
-            # Calculate total
-            total = sum(item.product.price * item.quantity for item in cart_items)
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                phone=phone,
-                address=address,
-                city=city,
-                postal_code=postal_code,
-                total_amount=total
-            )
-            
-            # Create order items and update stock
-            for cart_item in cart_items:
-                if cart_item.product.stock < cart_item.quantity:
-                    raise ValueError(f'מוצר {cart_item.product.name} אינו זמין במלאי מספיק')
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
-                
-                # Update stock
-                cart_item.product.stock -= cart_item.quantity
-                cart_item.product.save()
-            
-            # Clear cart
-            cart_items.delete()
-            
-            messages.success(request, f'ההזמנה נוצרה בהצלחה! מספר הזמנה: {order.order_number}')
-            return redirect('shop:order_confirmation', order_number=order.order_number)
-            
+        order = place_order(request.user, customer, coupon_code=request.POST.get('coupon_code', ''))
     except ValueError as e:
         messages.error(request, str(e))
-        print(e)
+        logger.info('checkout rejected: %s', e, extra={'user_id': request.user.pk})
         return redirect('shop:checkout')
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('checkout failed', extra={'user_id': request.user.pk})
         messages.error(request, 'אירעה שגיאה בעיבוד ההזמנה. אנא נסה שוב.')
         return redirect('shop:checkout')
+    
+    messages.success(request, f'ההזמנה נוצרה בהצלחה! מספר הזמנה: {order.order_number}')
+    return redirect('shop:order_confirmation', order_number=order.order_number)
 
 @login_required
 def order_confirmation(request, order_number):
@@ -206,7 +179,7 @@ def order_confirmation(request, order_number):
 @login_required
 def user_profile(request):
     """Display user profile with order history"""
-    orders = Order.objects.filter(user=request.user).prefetch_related('items__product').order_by('-created')
+    orders = Order.objects.donated_by(request.user).prefetch_related('items__product').order_by('-created_at')
     
     # Calculate total donations for stats
     total_amount = orders.aggregate(total_amount__sum=Sum('total_amount'))['total_amount__sum'] or 0
@@ -214,6 +187,8 @@ def user_profile(request):
     context = {
         'orders': orders,
         'total_donations': total_amount,
+        'marketer': marketer_for_user(request.user),
+        'receipts': DonationReceipt.objects.filter(user=request.user).only('number', 'kind', 'year', 'amount', 'created_at'),
     }
     return render(request, 'shop/user_profile.html', context)
 
@@ -223,4 +198,11 @@ def order_detail(request, order_number):
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
     return render(request, 'shop/order_detail.html', {
         'order': order
-    })
\ No newline at end of file
+    })
+
+@login_required
+def donation_receipt(request, number):
+    """A donation receipt of the user (staff may open any)"""
+    receipts = DonationReceipt.objects.all() if request.user.is_staff else DonationReceipt.objects.filter(user=request.user)
+    receipt = get_object_or_404(receipts, number=number)
+    return FileResponse(receipt.file.open('rb'), content_type='text/html; charset=utf-8')